@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: gzip vs zstd (with and without a trained dictionary) on archived raw pages.
+"""
+import argparse
+import gzip
+import random
+import time
+
+import zstandard
+
+from raw_store import list_pages, read_raw
+
+
+def measure(name, pages, compress, decompress, on_disk=None):
+    start = time.perf_counter()
+    blobs = [compress(page) for page in pages]
+    compress_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for blob in blobs:
+        decompress(blob)
+    decompress_time = time.perf_counter() - start
+
+    raw = sum(len(page) for page in pages)
+    packed = sum(len(blob) for blob in blobs)
+    n = len(pages)
+    line = (f"{name:>16}: {packed / 1024 / 1024:8.2f} MB  ratio {raw / packed:5.1f}x  "
+            f"compress {compress_time / n * 1000:6.2f} ms/page  decompress {decompress_time / n * 1000:5.2f} ms/page")
+    if on_disk is not None:
+        line += f"  (files on disk: {on_disk / 1024 / 1024:.2f} MB)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw page compression benchmark")
+    parser.add_argument("--dir", required=True, help="Raw data directory (e.g. data/tesco_raw)")
+    parser.add_argument("--pages", type=int, default=500, help="Pages to compress (random sample)")
+    parser.add_argument("--train", type=int, default=200, help="Pages used for dictionary training (disjoint from the test pages)")
+    parser.add_argument("--dict-size", type=int, default=112 * 1024, help="Dictionary size in bytes")
+    args = parser.parse_args()
+
+    sources = list_pages(args.dir)
+    random.shuffle(sources)
+    train_sources = sources[:args.train]
+    test_sources = sources[args.train:args.train + args.pages]
+    if not test_sources:
+        parser.error(f"Need more than {args.train} pages in {args.dir}")
+
+    pages = [read_raw(source) for source in test_sources]
+    on_disk = None
+    if all(isinstance(s, str) and s.endswith('.gz') for s in test_sources):
+        on_disk = sum(len(open(s, 'rb').read()) for s in test_sources)
+    print(f"{len(pages)} test pages, {sum(len(p) for p in pages) / 1024 / 1024:.2f} MB uncompressed, "
+          f"dictionary trained on {len(train_sources)} other pages")
+
+    measure("gzip-9 (current)", pages, lambda d: gzip.compress(d, 9), gzip.decompress, on_disk)
+    measure("gzip-6", pages, lambda d: gzip.compress(d, 6), gzip.decompress)
+
+    for level in (3, 9, 19):
+        cctx = zstandard.ZstdCompressor(level=level)
+        dctx = zstandard.ZstdDecompressor()
+        measure(f"zstd-{level}", pages, cctx.compress, dctx.decompress)
+
+    start = time.perf_counter()
+    zdict = zstandard.train_dictionary(args.dict_size, [read_raw(s) for s in train_sources])
+    print(f"Dictionary training: {time.perf_counter() - start:.2f}s")
+    for level in (3, 9, 19):
+        cctx = zstandard.ZstdCompressor(level=level, dict_data=zdict)
+        dctx = zstandard.ZstdDecompressor(dict_data=zdict)
+        measure(f"zstd-{level}+dict", pages, cctx.compress, dctx.decompress)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: thread vs async Kupi crawl engine against the local stub server.
+"""
+import argparse
+import tempfile
+import time
+
+from kupi.crawler import KupiCrawler
+from kupi.crawler_async import AsyncKupiCrawler
+from kupi.stub_server import StubKupiServer, StubKupiSite
+from kupi.rate_controller import AIMDRateController, FixedRateController
+
+
+class QuietConsole:
+    def __init__(self):
+        self.total = 0
+
+    def log(self, msg, notice=False): pass
+    def update(self, *a, **kw): pass
+
+
+def bench_engine(engine, args):
+    site = StubKupiSite(categories=args.categories, products_per_category=args.products)
+    max_limit = args.connections if engine == "async" else args.workers
+    if args.rate == "fixed":
+        controller = FixedRateController(initial_limit=args.concurrency)
+    else:
+        controller = AIMDRateController(initial_limit=args.concurrency, max_limit=max_limit)
+
+    with StubKupiServer(site, latency=args.latency, capacity=args.capacity) as server, tempfile.TemporaryDirectory() as tmp:
+        if engine == "async":
+            crawler = AsyncKupiCrawler(base_dir=tmp, start_url=server.start_url, rate_controller=controller,
+                                       connections=args.connections)
+            workers = None
+        else:
+            crawler = KupiCrawler(base_dir=tmp, start_url=server.start_url, rate_controller=controller)
+            workers = args.workers
+
+        start = time.perf_counter()
+        crawler.run(console=QuietConsole(), workers=workers)
+        elapsed = time.perf_counter() - start
+
+    pages = len(crawler.visited)
+    print(f"{engine:>6}: {pages} pages, {server.requests} requests ({server.rejected} rejected) "
+          f"in {elapsed:.2f}s ({pages / elapsed:.1f} pages/s) | {controller.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kupi crawl engine benchmark")
+    parser.add_argument("--engine", choices=["thread", "async", "both"], default="both")
+    parser.add_argument("--categories", type=int, default=20, help="Stub categories")
+    parser.add_argument("--products", type=int, default=50, help="Stub products per category")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response latency (seconds)")
+    parser.add_argument("--workers", type=int, default=8, help="Thread engine worker threads")
+    parser.add_argument("--connections", type=int, default=64, help="Async engine concurrent connections")
+    parser.add_argument("--rate", choices=["aimd", "fixed"], default="aimd", help="Rate controller")
+    parser.add_argument("--concurrency", type=int, default=4, help="Initial (aimd) or constant (fixed) per-host limit")
+    parser.add_argument("--capacity", type=int, default=None, help="Stub rejects requests beyond this concurrency with 429")
+    args = parser.parse_args()
+
+    engines = ["thread", "async"] if args.engine == "both" else [args.engine]
+    for engine in engines:
+        bench_engine(engine, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: link extraction backends over the archived Kupi corpus.
+
+Compares the old BeautifulSoup tree walk against the streaming extractors in
+kupi/links.py and checks that every backend finds the same link set.
+"""
+import argparse
+import glob
+import gzip
+import os
+import re
+import time
+import urllib.parse
+
+from bs4 import BeautifulSoup
+
+from kupi import links
+
+
+def extract_links_soup(content, base_url):
+    """Previous implementation: full BeautifulSoup tree, then find_all('a')."""
+    soup = BeautifulSoup(content, 'html.parser')
+    found = [links.normalize_url(urllib.parse.urljoin(base_url, a.get('href'))) for a in soup.find_all('a', href=True)]
+    return list(set(found))
+
+
+def load_corpus(data_dir, limit):
+    files = sorted(glob.glob(os.path.join(data_dir, '*.html.gz')))
+    if limit:
+        files = files[:limit]
+    pages = []
+    for filepath in files:
+        with gzip.open(filepath, 'rb') as f:
+            content = f.read()
+        m = re.search(rb"<!-- origin_url: (.*?) -->", content[:1000])
+        base_url = m.group(1).decode('utf-8') if m else "https://www.kupi.cz/slevy"
+        pages.append((content, base_url))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kupi link extraction benchmark")
+    parser.add_argument("--dir", default="data/kupi_raw", help="Raw Kupi archive directory")
+    parser.add_argument("--limit", type=int, default=0, help="Max number of pages (0 = all)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.dir, args.limit)
+    if not pages:
+        print(f"No .html.gz files found in {args.dir}")
+        return
+    total_mb = sum(len(c) for c, _ in pages) / 1e6
+    print(f"Corpus: {len(pages)} pages, {total_mb:.1f} MB uncompressed")
+
+    backends = [("beautifulsoup", extract_links_soup)]
+    for name in ("html.parser", "lxml"):
+        if name == "lxml" and links.etree is None:
+            continue
+        backends.append((name, lambda c, u, name=name: links.extract_links(c, u, backend=name)))
+
+    reference = None
+    baseline = None
+    for name, func in backends:
+        start = time.perf_counter()
+        results = [set(func(content, url)) for content, url in pages]
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference, baseline = results, elapsed
+            mismatches = 0
+        else:
+            mismatches = sum(1 for a, b in zip(reference, results) if a != b)
+
+        print(f"{name:>14}: {elapsed:.2f}s ({len(pages) / elapsed:.0f} pages/s, "
+              f"{baseline / elapsed:.1f}x) mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
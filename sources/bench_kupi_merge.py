@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Kupi product merge on a synthetic heavy-merge corpus.
+
+Compares the old pairwise offer deduplication against the indexed merge in
+kupi/merge.py, both sequentially and as a tree reduce over file chunks (as the
+parse workers run it), and checks that all variants produce identical products.
+"""
+import argparse
+import json
+import random
+import time
+
+from kupi.merge import ProductMerger, reduce_items
+
+STORES = ["Albert", "Billa", "Globus", "Kaufland", "Lidl", "Penny", "Tesco", "Makro", "Norma", "Terno"]
+
+
+def merge_pairwise(item_lists):
+    """Previous implementation: each new offer compared with every offer of its product."""
+    product_map = {}
+    for parsed_items in item_lists:
+        for item in parsed_items:
+            name = item['name']
+            if name not in product_map:
+                product_map[name] = {
+                    'name': name,
+                    'brand': item.get('brand'),
+                    'image_url': item['image_url'],
+                    'categories': item.get('categories', []),
+                    'prices': []
+                }
+            existing = product_map[name]
+            if not existing.get('product_url') and item.get('product_url'):
+                existing['product_url'] = item['product_url']
+            if not existing.get('brand') and item.get('brand'):
+                existing['brand'] = item['brand']
+            if not existing['image_url'] and item['image_url']:
+                existing['image_url'] = item['image_url']
+            if not existing.get('categories') and item.get('categories'):
+                existing['categories'] = item['categories']
+            for new_price in item['prices']:
+                is_duplicate = False
+                for p in existing['prices']:
+                    if new_price.get('discount_id') and p.get('discount_id'):
+                        if new_price['discount_id'] == p['discount_id']:
+                            is_duplicate = True
+                            break
+                    elif p['store_name'] == new_price['store_name'] and p['price'] == new_price['price']:
+                        is_duplicate = True
+                        break
+                if not is_duplicate:
+                    existing['prices'].append(new_price)
+    return list(product_map.values())
+
+
+def merge_indexed(item_lists):
+    merger = ProductMerger()
+    for items in item_lists:
+        merger.add_all(items)
+    return merger.result()
+
+
+def merge_tree(item_lists, chunk_size):
+    """Partial merge per chunk of files (the workers), full merge at the root."""
+    merger = ProductMerger()
+    for i in range(0, len(item_lists), chunk_size):
+        merger.add_all(reduce_items(item_lists[i:i + chunk_size]))
+    return merger.result()
+
+
+def make_corpus(files, products, offers, seed):
+    """
+    Returns one item list per file. Every product has a pool of distinct offers (some
+    without discount_id); files repeat offers from the pool, so most offers seen are
+    exact or fallback-key duplicates.
+    """
+    rng = random.Random(seed)
+    pools = []
+    for p in range(products):
+        pool = []
+        for o in range(offers):
+            pool.append({
+                'store_name': rng.choice(STORES),
+                'price': round(rng.uniform(10, 200), 1),
+                'discount_id': f"{p}-{o}" if rng.random() < 0.7 else None,
+                'validity': f"offer {o}",
+            })
+        pools.append(pool)
+
+    item_lists = []
+    for _ in range(files):
+        items = []
+        for p in rng.sample(range(products), min(products, 5)):
+            items.append({
+                'name': f"Product {p}",
+                'brand': f"Brand {p}" if rng.random() < 0.5 else None,
+                'product_url': f"https://www.kupi.cz/sleva/product-{p}" if rng.random() < 0.5 else None,
+                'image_url': f"https://img.kupi.cz/{p}.jpg" if rng.random() < 0.8 else None,
+                'categories': ["Potraviny", f"Kategorie {p % 20}"] if rng.random() < 0.6 else [],
+                'prices': [dict(offer) for offer in rng.sample(pools[p], min(offers, 40))],
+            })
+        item_lists.append(items)
+    return item_lists
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kupi product merge benchmark")
+    parser.add_argument("--files", type=int, default=4000, help="Number of synthetic parsed files")
+    parser.add_argument("--products", type=int, default=200, help="Number of distinct products")
+    parser.add_argument("--offers", type=int, default=400, help="Distinct offers per product")
+    parser.add_argument("--chunk", type=int, default=32, help="Files per partial merge (tree reduce)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    item_lists = make_corpus(args.files, args.products, args.offers, args.seed)
+    total_offers = sum(len(item['prices']) for items in item_lists for item in items)
+    print(f"Corpus: {args.files} files, {args.products} products, {total_offers} offers")
+
+    variants = [
+        ("pairwise", merge_pairwise, ()),
+        ("indexed", merge_indexed, ()),
+        (f"tree/{args.chunk}", merge_tree, (args.chunk,)),
+    ]
+    reference = None
+    base = None
+    for name, func, extra in variants:
+        products, elapsed = timed(func, item_lists, *extra)
+        encoded = json.dumps(products, ensure_ascii=False)
+        if reference is None:
+            reference, base = encoded, elapsed
+            status = "reference"
+        else:
+            status = "identical" if encoded == reference else "DIFFERENT"
+        kept = sum(len(p['prices']) for p in products)
+        print(f"  {name:10s} {elapsed:8.2f}s  {base / elapsed if elapsed else 0:7.1f}x  {kept} offers kept  {status}")
+
+
+if __name__ == "__main__":
+    main()
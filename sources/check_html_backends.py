@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Golden check: verifies that every HTML backend produces exactly the same output as
+html.parser (the reference).
+
+Modes:
+1. --golden: runs the full parsers (run(), one worker, no parse cache) once per
+   backend over the checked-in fixture corpus (sources/fixtures/<source>_raw) and
+   compares the written *.result.json files byte for byte (the generated_at
+   timestamp is blanked). Runs in CI; exits with status 1 on any difference.
+2. --dir: parses a raw data directory file by file with every backend, reports each
+   file whose records differ and the parse throughput of each backend (single
+   process, so pages/s is per core). Use it on a real archive before switching
+   --html-backend for a source.
+
+Usage:
+    python sources/check_html_backends.py --golden
+    python sources/check_html_backends.py --source tesco --dir data/tesco_raw
+    python sources/check_html_backends.py --source wolt --dir data/albert_raw --store Albert
+"""
+import argparse
+import contextlib
+import difflib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from html_backend import DEFAULT_BACKEND, available_backends
+from raw_store import list_pages, source_name
+
+SOURCES = ["kupi", "tesco", "wolt"]
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GENERATED_AT_RE = re.compile(rb'"generated_at": "[^"]*"')
+
+
+def parse_function(source, store_name):
+    """
+    Returns parse(file, backend) -> records for a source.
+    """
+    if source == "kupi":
+        from kupi.parser import parse_file_worker
+        return parse_file_worker
+    if source == "tesco":
+        from tesco.parser import parse_product_file
+        return parse_product_file
+    from wolt.parser import parse_file
+    return lambda f, backend: parse_file(f, store_name, backend)
+
+
+def run_parser(source, data_dir, backend, store_name, work_dir):
+    """
+    Runs the source's full parser over data_dir inside work_dir (the parsers write
+    to data/*.result.json) and returns the result file's bytes, generated_at blanked.
+    """
+    # Import before changing directory (sys.path may hold a relative entry)
+    if source == "kupi":
+        from kupi.parser import KupiParser
+        run, output = lambda: KupiParser(data_dir, use_cache=False, html_backend=backend).run(workers=1), "data/kupi.result.json"
+    elif source == "tesco":
+        from tesco.parser import TescoParser
+        run, output = lambda: TescoParser(data_dir, use_cache=False, html_backend=backend).run(workers=1), "data/tesco.result.json"
+    else:
+        from wolt.parser import WoltParser
+        output = "data/wolt.result.json"
+        run = lambda: WoltParser(data_dir, store_name, output, use_cache=False, html_backend=backend).run(workers=1)
+
+    os.makedirs(os.path.join(work_dir, "data"), exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        with open(output, 'rb') as f:
+            data = f.read()
+    finally:
+        os.chdir(cwd)
+    return GENERATED_AT_RE.sub(b'"generated_at": null', data)
+
+
+def check_golden(sources, fixtures_dir, store_name, show):
+    """
+    Compares the *.result.json of every backend with html.parser's for each source.
+    Returns the number of differing source/backend pairs.
+    """
+    backends = [DEFAULT_BACKEND] + [b for b in available_backends() if b != DEFAULT_BACKEND]
+    if len(backends) == 1:
+        print(f"Only {DEFAULT_BACKEND} is available, nothing to compare (install lxml)")
+    failures = 0
+    for source in sources:
+        data_dir = os.path.join(fixtures_dir, f"{source}_raw")
+        reference = None
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as work_dir:
+                result = run_parser(source, data_dir, backend, store_name, work_dir)
+            if reference is None:
+                reference = result
+                total = json.loads(result)["metadata"]["total_products"]
+                print(f"  {source:6s} {backend:12s} {total} products ({len(result)} bytes)")
+                if not total:
+                    print(f"DIFFERENT: {source} fixtures produced no products")
+                    failures += 1
+            elif result != reference:
+                failures += 1
+                print(f"DIFFERENT: {source} {source}.result.json with {backend} differs from {DEFAULT_BACKEND}")
+                diff = difflib.unified_diff(reference.decode('utf-8').splitlines(), result.decode('utf-8').splitlines(),
+                                            DEFAULT_BACKEND, backend, lineterm="")
+                for line in list(diff)[:show * 20]:
+                    print(line)
+            else:
+                print(f"  {source:6s} {backend:12s} identical")
+    return failures
+
+
+def check_files(source, directory, store_name, limit, show):
+    """
+    Compares the records of every file per backend and reports the throughput.
+    Returns the number of differing file/backend pairs.
+    """
+    files = list_pages(directory, recursive=source == "kupi")
+    files.sort(key=source_name)
+    if limit:
+        files = files[:limit]
+    if not files:
+        print(f"No pages found in {directory}")
+        return 0
+
+    parse = parse_function(source, store_name)
+    backends = [DEFAULT_BACKEND] + [b for b in available_backends() if b != DEFAULT_BACKEND]
+    timings = {backend: 0.0 for backend in backends}
+    mismatches = []
+
+    for f in files:
+        reference = None
+        for backend in backends:
+            start = time.perf_counter()
+            records = parse(f, backend)
+            timings[backend] += time.perf_counter() - start
+            encoded = json.dumps(records, ensure_ascii=False, sort_keys=True)
+            if reference is None:
+                reference = encoded
+            elif encoded != reference:
+                mismatches.append((source_name(f), backend, reference, encoded))
+
+    print(f"Corpus: {len(files)} files from {directory} ({source})")
+    base = timings[DEFAULT_BACKEND]
+    for backend in backends:
+        elapsed = timings[backend]
+        rate = len(files) / elapsed if elapsed else 0
+        speedup = base / elapsed if elapsed else 0
+        print(f"  {backend:12s} {elapsed:8.2f}s  {rate:8.1f} files/s  {speedup:5.2f}x")
+
+    if not mismatches:
+        print(f"OK: all backends produce identical records for {len(files)} files")
+        return 0
+
+    print(f"DIFFERENT: {len(mismatches)} file/backend pairs differ from {DEFAULT_BACKEND}")
+    for name, backend, reference, encoded in mismatches[:show]:
+        print(f"--- {name} ({DEFAULT_BACKEND})\n{reference}\n+++ {name} ({backend})\n{encoded}")
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML backend golden-output check")
+    parser.add_argument("--golden", action="store_true", help="Compare the *.result.json of full parser runs over the fixture corpus")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixture corpus with <source>_raw directories (--golden)")
+    parser.add_argument("--source", choices=SOURCES, help="Parser to run (--golden: default all)")
+    parser.add_argument("--dir", help="Raw data directory to check file by file")
+    parser.add_argument("--store", default="Albert", help="Store name for the Wolt parser")
+    parser.add_argument("--limit", type=int, default=0, help="Max number of files (0 = all)")
+    parser.add_argument("--show", type=int, default=3, help="Print the records of this many differing files")
+    args = parser.parse_args()
+
+    if args.golden:
+        sources = [args.source] if args.source else SOURCES
+        failures = check_golden(sources, os.path.abspath(args.fixtures), args.store, args.show)
+        if not failures:
+            print(f"OK: all backends write identical results for {', '.join(sources)}")
+    else:
+        if not args.source or not args.dir:
+            parser.error("--source and --dir are required without --golden")
+        failures = check_files(args.source, args.dir, args.store, args.limit, args.show)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,54 @@
 #!/usr/bin/env python3
 import argparse
 from kupi.crawler import KupiCrawler
+from kupi.rate_controller import AIMDRateController, FixedRateController
+from raw_store import PackStore, open_codec
 from console import Console
 
 def main():
     parser = argparse.ArgumentParser(description="Kupi Crawler")
     parser.add_argument("--color", action="store_true", help="Show ANSI progress bar")
-    parser.add_argument("--workers", type=int, help="Number of worker threads (default: CPU*2)")
+    parser.add_argument("--workers", type=int, help="Max worker threads, i.e. requests in flight (default: the rate controller's max limit, 64 for aimd)")
+    parser.add_argument("--engine", type=str, default="thread", choices=["thread", "async"], help="Crawl engine")
+    parser.add_argument("--connections", type=int, default=64, help="Concurrent connections for the async engine")
+    parser.add_argument("--max-age", type=float, default=None, help="Revalidate saved pages older than this many hours (default: never)")
+    parser.add_argument("--rate", type=str, default="aimd", choices=["aimd", "fixed"], help="Per-host rate controller")
+    parser.add_argument("--concurrency", type=int, default=4, help="Initial (aimd) or constant (fixed) requests in flight per host")
+    parser.add_argument("--schedule", action="store_true", help="Revalidate saved pages when their offers expire or they are due to change, most urgent first")
+    parser.add_argument("--time-budget", type=float, default=None, help="Stop claiming new URLs after this many minutes (the rest resumes next run)")
+    parser.add_argument("--raw-store", type=str, default="files", choices=["files", "pack"], help="Save pages as loose .gz files or into segment packs")
+    parser.add_argument("--fresh", action="store_true", help="Discard an interrupted crawl's frontier and start over")
+    parser.add_argument("--compression", type=str, default="gzip", choices=["gzip", "zstd"], help="Page compression (zstd trains a per-source dictionary on existing pages)")
     args = parser.parse_args()
 
+    max_age = args.max_age * 3600 if args.max_age is not None else None
+    time_budget = args.time_budget * 60 if args.time_budget is not None else None
+
+    if args.rate == "fixed":
+        rate_controller = FixedRateController(initial_limit=args.concurrency)
+    else:
+        max_limit = args.connections if args.engine == "async" else 64
+        rate_controller = AIMDRateController(initial_limit=args.concurrency, max_limit=max_limit)
+
+    codec = open_codec("data/kupi_raw", args.compression)
+    raw_store = PackStore("data/kupi_raw", codec=codec) if args.raw_store == "pack" else None
+
     console = Console(total=0, use_colors=args.color)
     console.start()
     
     try:
         # KupiCrawler init currently takes base_dir, defaulting to data/kupi_raw. 
         # Leaving default for now as it wasn't exposed in original main either.
-        crawler = KupiCrawler()
-        crawler.run(console=console, workers=args.workers)
+        if args.engine == "async":
+            from kupi.crawler_async import AsyncKupiCrawler
+            crawler = AsyncKupiCrawler(max_age=max_age, rate_controller=rate_controller, schedule=args.schedule,
+                                       time_budget=time_budget, raw_store=raw_store, codec=codec,
+                                       connections=args.connections)
+            crawler.run(console=console, fresh=args.fresh)
+        else:
+            crawler = KupiCrawler(max_age=max_age, rate_controller=rate_controller, schedule=args.schedule,
+                                  time_budget=time_budget, raw_store=raw_store, codec=codec)
+            crawler.run(console=console, workers=args.workers, fresh=args.fresh)
     finally:
         console.finish()
 
@@ -0,0 +1,185 @@
+"""
+Crawl State: Journaled crawler state shared by the Tesco and Wolt crawlers.
+
+Overview:
+The state is a few sets of processed items (product or category URLs), optional
+key/value maps (e.g. crawl checkpoints) and the category tree. Instead of re-reading,
+merging and rewriting the whole JSON file on every save, each change is appended as
+one JSON line to `<state file>.journal`. The JSON file itself is a snapshot, rewritten
+only when the journal is compacted.
+
+Key Features:
+1. Sets in Memory: membership checks and marks are O(1); marks only touch memory
+   under a short lock.
+2. Single Writer: save() appends the records pending since the last save in one
+   write. Disk I/O is serialized by its own lock, so workers marking items never
+   wait on another worker's write.
+3. Compaction: after `compact_every` journal records (and on close) the snapshot is
+   rewritten atomically and the journal truncated. A crash in between only replays
+   records already in the snapshot, which is harmless.
+4. Fast Resume: load reads the snapshot (also the old full-JSON format) and replays
+   the journal, skipping a torn last line.
+
+The journal assumes one crawler process per state file.
+"""
+import json
+import os
+import threading
+
+TREE = "tree"
+
+
+class JournaledState:
+    """
+    State with named sets, maps and a category tree, persisted as snapshot + journal.
+    `data[name]` is a set for every name in sets, a dict for every name in maps, and
+    `data["tree"]` a nested dict.
+    """
+    def __init__(self, filepath, sets=(), maps=(), compact_every=10000):
+        self.filepath = filepath
+        self.journal_path = filepath + ".journal"
+        self.sets = tuple(sets)
+        self.maps = tuple(maps)
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.pending = []
+        self.journal_records = 0
+        self.data = self.load()
+        # Also when the journal holds only a torn line: truncating it keeps the next
+        # save from appending onto that line
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+            self.compact()
+
+    def load(self):
+        """
+        Loads the snapshot and replays the journal on top of it.
+        """
+        data = {name: set() for name in self.sets}
+        data.update({name: {} for name in self.maps})
+        data[TREE] = {}
+        if os.path.exists(self.filepath):
+            try:
+                with open(self.filepath, 'r') as f:
+                    snapshot = json.load(f)
+                for name in self.sets:
+                    data[name].update(snapshot.get(name, []))
+                for name in self.maps:
+                    data[name].update(snapshot.get(name, {}))
+                data[TREE] = snapshot.get(TREE, {})
+            except (OSError, ValueError):
+                pass
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        name, value = json.loads(line)
+                    except ValueError:
+                        # Torn write from an interrupted run
+                        continue
+                    if name == TREE:
+                        add_tree_path(data[TREE], value)
+                    elif name in self.maps:
+                        key, item = value
+                        if item is None:
+                            data[name].pop(key, None)
+                        else:
+                            data[name][key] = item
+                    elif name in data:
+                        data[name].add(value)
+                    self.journal_records += 1
+        return data
+
+    def add(self, name, item):
+        """
+        Adds item to the named set. Returns False if it was already there.
+        """
+        with self.lock:
+            items = self.data[name]
+            if item in items:
+                return False
+            items.add(item)
+            self.pending.append((name, item))
+            return True
+
+    def set_item(self, name, key, value):
+        """
+        Sets key in the named map; a value of None removes the key.
+        """
+        with self.lock:
+            items = self.data[name]
+            if items.get(key) == value:
+                return
+            if value is None:
+                items.pop(key, None)
+            else:
+                items[key] = value
+            self.pending.append((name, [key, value]))
+
+    def add_path(self, names):
+        """
+        Adds a category path (list of names, top-level first) to the tree.
+        """
+        if not names:
+            return
+        with self.lock:
+            if add_tree_path(self.data[TREE], names):
+                self.pending.append((TREE, list(names)))
+
+    def save(self):
+        """
+        Appends the changes since the last save to the journal, compacting it when it
+        has grown past compact_every records.
+        """
+        with self.write_lock:
+            with self.lock:
+                records, self.pending = self.pending, []
+            if records:
+                lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+                with open(self.journal_path, 'a') as f:
+                    f.write(lines)
+                self.journal_records += len(records)
+            if self.journal_records >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        """
+        Rewrites the snapshot with the full state and truncates the journal.
+        """
+        with self.write_lock:
+            self._compact()
+
+    def _compact(self):
+        with self.lock:
+            # Everything pending is in memory, so the snapshot covers it
+            self.pending = []
+            snapshot = {name: sorted(self.data[name]) for name in self.sets}
+            snapshot.update({name: self.data[name] for name in self.maps})
+            snapshot[TREE] = self.data[TREE]
+            text = json.dumps(snapshot, ensure_ascii=False)
+
+        temp_path = self.filepath + ".tmp"
+        with open(temp_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_path, self.filepath)
+        with open(self.journal_path, 'w'):
+            pass
+        self.journal_records = 0
+
+    def close(self):
+        self.compact()
+
+
+def add_tree_path(tree, names):
+    """
+    Inserts a path of names into a nested dict tree. Returns True if a node was added.
+    """
+    added = False
+    curr = tree
+    for name in names:
+        if name not in curr:
+            curr[name] = {}
+            added = True
+        curr = curr[name]
+    return added
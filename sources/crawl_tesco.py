@@ -7,8 +7,12 @@ from functools import partial
 
 
 from tesco.crawler import CATEGORIES, CrawlerState, GlobalCounter, run_worker
-from drivers import create_driver
+from tesco.work_queue import WorkQueue
+from drivers import create_driver, network_stats
 from console import Console
+from waits import set_default_timeout, wait_stats
+from raw_store import PackStore, open_codec
+from page_writer import PageWriter
 
 def main():
     """
@@ -20,7 +24,18 @@ def main():
     parser.add_argument("--color", action="store_true", help="Show ANSI progress bar")
     parser.add_argument("--limit", type=int, default=0, help="Global limit of products to crawl")
     parser.add_argument("--browser", type=str, default="chrome", choices=["chrome", "firefox"], help="Browser to use")
+    parser.add_argument("--raw-store", type=str, default="files", choices=["files", "pack"], help="Save pages as loose .gz files or into segment packs")
+    parser.add_argument("--compression", type=str, default="gzip", choices=["gzip", "zstd"], help="Page compression (zstd trains a per-source dictionary on existing pages)")
+    parser.add_argument("--listing", action="store_true", help="Capture products from category pages; open product pages only for incomplete data")
+    parser.add_argument("--pages-per-unit", type=int, default=5, help="Listing pages per work unit when splitting a category between workers")
+    parser.add_argument("--block-resources", action=argparse.BooleanOptionalAction, default=True, help="Block images, fonts, media and trackers (drivers.BLOCK_PROFILES)")
+    parser.add_argument("--wait-timeout", type=float, default=5.0, help="Seconds an event-driven wait (DOM settled, element shown/closed) may take")
+    parser.add_argument("--driver-max-pages", type=int, default=2000, help="Restart a browser after it saved this many pages (0 = never)")
+    parser.add_argument("--driver-max-rss", type=int, default=0, help="Restart a browser whose processes use more than this many MB (0 = never)")
+    parser.add_argument("--fragments", action="store_true", help="Save only the page fragments the parser reads (Apollo product entity, JSON-LD, heading, breadcrumbs, brand and price) instead of the full page")
+    parser.add_argument("--writer-threads", type=int, default=2, help="Background threads compressing and writing pages (0 = write on the browser's thread)")
     args = parser.parse_args()
+    set_default_timeout(args.wait_timeout)
 
     # Ensure output dir exists
     if not os.path.exists("data/tesco_raw"):
@@ -40,17 +55,33 @@ def main():
     console.update(total_prod, stats=f"Cats: --/{len(CATEGORIES)}")
     
     global_counter = GlobalCounter(args.limit)
-    driver_factory = partial(create_driver, headless=args.headless, browser_type=args.browser)
+    queue = WorkQueue(pending, pages_per_unit=args.pages_per_unit)
+    driver_factory = partial(create_driver, headless=args.headless, browser_type=args.browser,
+                             block_profile="tesco" if args.block_resources else None)
     
     from drivers import DriverPool
-    pool = DriverPool(driver_factory)
+    pool = DriverPool(driver_factory, max_size=args.workers, max_pages=args.driver_max_pages,
+                      max_rss_mb=args.driver_max_rss)
+    console.log(f"Started {pool.prewarm(args.workers)} browsers")
+    codec = open_codec("data/tesco_raw", args.compression)
+    raw_store = PackStore("data/tesco_raw", codec=codec) if args.raw_store == "pack" else None
+    writer = PageWriter("data/tesco_raw", raw_store, codec, threads=args.writer_threads, log_func=console.log)
 
     try:
         with ThreadPoolExecutor(max_workers=args.workers) as executor:
-            executor.map(lambda x: run_worker(x[1], state, console, pool, global_counter, x[0], args.limit), enumerate(pending))
+            executor.map(lambda i: run_worker(queue, state, console, pool, global_counter, i, args.limit, raw_store, codec, args.listing, args.fragments, writer), range(args.workers))
     finally:
         pool.quit_all()
+        # Queued pages are written (and marked) before the state is compacted
+        writer.close()
+        state.close()
+        if raw_store is not None:
+            raw_store.close()
         console.finish()
+        console.log(network_stats.summary())
+        console.log(pool.stats())
+        console.log(writer.stats())
+        console.log(wait_stats.summary())
         console.log("All workers finished.")
 
 if __name__ == "__main__":
@@ -3,8 +3,9 @@ import argparse
 from functools import partial
 
 from wolt.crawler import WoltCrawler, VENUES
-from drivers import create_driver
+from drivers import create_driver, network_stats
 from console import Console
+from waits import set_default_timeout, wait_stats
 
 def run(store_name=None):
     parser = argparse.ArgumentParser(description="Wolt Crawler")
@@ -16,7 +17,20 @@ def run(store_name=None):
     parser.add_argument("--color", action="store_true", help="Show ANSI progress bar")
     parser.add_argument("--limit", type=int, default=0, help="Global limit of products to crawl")
     parser.add_argument("--browser", type=str, default="chrome", choices=["chrome", "firefox"], help="Browser to use")
+    parser.add_argument("--raw-store", type=str, default="files", choices=["files", "pack"], help="Save pages as loose .gz files or into segment packs")
+    parser.add_argument("--compression", type=str, default="gzip", choices=["gzip", "zstd"], help="Page compression (zstd trains a per-source dictionary on existing pages)")
+    parser.add_argument("--block-resources", action=argparse.BooleanOptionalAction, default=True, help="Block images, fonts, media and trackers (drivers.BLOCK_PROFILES)")
+    parser.add_argument("--wait-timeout", type=float, default=5.0, help="Seconds an event-driven wait (DOM settled, element shown/closed) may take")
+    parser.add_argument("--driver-max-pages", type=int, default=2000, help="Restart a browser after it saved this many pages (0 = never)")
+    parser.add_argument("--driver-max-rss", type=int, default=0, help="Restart a browser whose processes use more than this many MB (0 = never)")
+    parser.add_argument("--capture", action="store_true", help="Save the venue's JSON API responses per category instead of product pages (Chrome only)")
+    parser.add_argument("--max-age", type=float, default=None, help="Re-capture products captured more than this many hours ago (default: never); a changed card price always re-captures")
+    parser.add_argument("--fragments", action="store_true", help="Save only the product modal (and active category links) instead of the full page")
+    parser.add_argument("--writer-threads", type=int, default=2, help="Background threads compressing and writing pages (0 = write on the browser's thread)")
     args = parser.parse_args()
+    if args.capture and args.browser != "chrome":
+        parser.error("--capture needs Chrome (performance log)")
+    set_default_timeout(args.wait_timeout)
 
     # Determine URL and directory
     start_url = args.url
@@ -36,7 +50,8 @@ def run(store_name=None):
         parser.error("You must specify --store or both --url and --dir")
 
     # Create driver factory
-    driver_factory = partial(create_driver, headless=args.headless, browser_type=args.browser)
+    driver_factory = partial(create_driver, headless=args.headless, browser_type=args.browser,
+                             block_profile="wolt" if args.block_resources else None)
 
     # Initialize console
     console = Console(total=0, use_colors=args.color)
@@ -49,11 +64,21 @@ def run(store_name=None):
             driver_factory=driver_factory,
             workers=args.workers,
             limit=args.limit,
-            console=console
+            console=console,
+            raw_store=args.raw_store,
+            compression=args.compression,
+            driver_max_pages=args.driver_max_pages,
+            driver_max_rss_mb=args.driver_max_rss,
+            capture=args.capture,
+            max_age=args.max_age * 3600 if args.max_age is not None else None,
+            fragments=args.fragments,
+            writer_threads=args.writer_threads
         )
         crawler.run()
     finally:
         console.finish()
+        console.log(network_stats.summary())
+        console.log(wait_stats.summary())
         console.log("All workers finished.")
 
 if __name__ == "__main__":
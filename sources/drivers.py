@@ -1,4 +1,5 @@
 
+import json
 import os
 import random
 import threading
@@ -58,9 +59,50 @@ def _get_or_install_driver(browser_type):
             else:
                 raise e
 
-def create_driver(headless=False, browser_type='chrome'):
+# Resources the crawlers never read: they only use the DOM and embedded JSON, so
+# images, fonts, media and trackers are blocked. Scripts, XHR/fetch and stylesheets
+# (needed for hydration and for clickable layout) are kept.
+COMMON_BLOCKED_URLS = [
+    # Images (src attributes stay in the DOM, only the downloads are skipped)
+    "*.jpg", "*.jpg?*", "*.jpeg", "*.jpeg?*", "*.png", "*.png?*", "*.gif", "*.gif?*",
+    "*.webp", "*.webp?*", "*.avif", "*.avif?*", "*.ico",
+    # Fonts
+    "*.woff", "*.woff2", "*.woff2?*", "*.ttf", "*.otf",
+    # Media
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    # Analytics, ads and session replay
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googleadservices.com*",
+    "*facebook.net*", "*facebook.com/tr*", "*hotjar.com*", "*bat.bing.com*", "*clarity.ms*",
+    "*criteo.*", "*tiktok.com*", "*sentry.io*", "*newrelic.com*", "*nr-data.net*",
+]
+
+BLOCK_PROFILES = {
+    "tesco": COMMON_BLOCKED_URLS + [
+        "*digitalcontent.api.tesco.com*",  # product images
+        "*omtrdc.net*", "*demdex.net*", "*adobedtm.com*", "*everesttech.net*",  # Adobe analytics
+    ],
+    "wolt": COMMON_BLOCKED_URLS + [
+        "*imageproxy.wolt.com*",  # menu images
+        "*braze.com*", "*segment.io*", "*amplitude.com*",
+    ],
+}
+
+# Firefox has no URL pattern blocking via prefs: block by content type and use the
+# built-in strict tracking protection instead
+FIREFOX_BLOCK_PREFS = {
+    "permissions.default.image": 2,
+    "gfx.downloadable_fonts.enabled": False,
+    "media.autoplay.default": 5,
+    "media.mp4.enabled": False,
+    "browser.contentblocking.category": "strict",
+    "privacy.trackingprotection.enabled": True,
+}
+
+def create_driver(headless=False, browser_type='chrome', block_profile=None):
     """
     Creates and configures a WebDriver instance.
+    block_profile names an entry of BLOCK_PROFILES whose requests are blocked
+    (None loads everything); see record_page for the resulting network usage.
     """
     if browser_type.lower() == 'firefox':
         # Use a unique local tmp directory for each driver to avoid conflicts
@@ -70,6 +112,9 @@ def create_driver(headless=False, browser_type='chrome'):
         options = webdriver.FirefoxOptions()
         if headless:
             options.add_argument("--headless")
+        if block_profile:
+            for key, value in FIREFOX_BLOCK_PREFS.items():
+                options.set_preference(key, value)
         
         # Must copy environment to preserve PATH
         env = os.environ.copy()
@@ -82,6 +127,7 @@ def create_driver(headless=False, browser_type='chrome'):
             options=options
         )
         driver.set_window_size(1280, 1024)
+        driver.network_report = "resource_timing"
         return driver
     
     # Default to Chrome
@@ -98,6 +144,9 @@ def create_driver(headless=False, browser_type='chrome'):
     y = random.randint(0, 500)
     options.add_argument(f"--window-position={x},{y}")
     options.add_argument("user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36")
+    # Network events for record_page
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
     
     executable_path = _get_or_install_driver('chrome')
 
@@ -108,82 +157,353 @@ def create_driver(headless=False, browser_type='chrome'):
     driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
         "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
     })
+    if block_profile:
+        # Fetch-domain interception would need an event loop on our side;
+        # setBlockedURLs is handled entirely in the browser
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCK_PROFILES[block_profile]})
+    driver.network_report = "performance_log"
     return driver
 
 
+# Sums transferred bytes of the resources the page loaded so far, then clears the buffer
+RESOURCE_TIMING_SCRIPT = """
+var entries = performance.getEntriesByType('resource');
+var bytes = 0;
+for (var i = 0; i < entries.length; i++) { bytes += entries[i].transferSize || 0; }
+performance.clearResourceTimings();
+return [entries.length, bytes];
+"""
+
+class NetworkStats:
+    """
+    Network usage of the pages saved by all workers (see record_page).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = 0
+
+    def add(self, requests, bytes_, blocked):
+        with self.lock:
+            self.pages += 1
+            self.requests += requests
+            self.bytes += bytes_
+            self.blocked += blocked
+
+    def summary(self):
+        with self.lock:
+            if not self.pages:
+                return "Network: no pages recorded"
+            return (f"Network: {self.pages} pages, per page {self.requests / self.pages:.0f} requests "
+                    f"({self.blocked / self.pages:.0f} blocked), {self.bytes / self.pages / 1024:.0f} KB transferred")
+
+network_stats = NetworkStats()
+
+def page_network_usage(driver):
+    """
+    Returns (requests, bytes transferred, requests blocked) since the previous call.
+    Chrome reads the Network events of the performance log (exact, includes blocked
+    requests); Firefox only has Resource Timing (cross-origin sizes may read as 0,
+    blocked requests are not visible).
+    """
+    mode = getattr(driver, "network_report", None)
+    if mode == "resource_timing":
+        requests, bytes_ = driver.execute_script(RESOURCE_TIMING_SCRIPT)
+        return requests, bytes_, 0
+    if mode != "performance_log":
+        return 0, 0, 0
+
+    drain_network_log(driver)
+    usage, driver.network_pending = driver.network_pending, [0, 0, 0]
+    return tuple(usage)
+
+def drain_network_log(driver):
+    """
+    Reads the pending Chrome performance log and returns its Network events as
+    (method, params). Request, byte and blocked counts are kept on the driver for the
+    next page_network_usage call, so capture mode (wolt/capture.py) and the network
+    stats can both consume the log.
+    """
+    usage = getattr(driver, "network_pending", None) or [0, 0, 0]
+    events = []
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        method = message.get("method", "")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            usage[0] += 1
+        elif method == "Network.loadingFinished":
+            usage[1] += params.get("encodedDataLength", 0)
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            usage[2] += 1
+        events.append((method, params))
+    driver.network_pending = usage
+    return events
+
+def record_page(driver):
+    """
+    Adds the network usage since the previous saved page to network_stats, and counts
+    the page towards the driver's recycling limit (DriverPool max_pages).
+    Compare the summary of a run with --no-block-resources to see what blocking saves.
+    """
+    driver.pages_loaded = getattr(driver, "pages_loaded", 0) + 1
+    try:
+        network_stats.add(*page_network_usage(driver))
+    except Exception as e:
+        logger.debug(f"Network usage unavailable: {e}")
+
+
 import queue
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds a quit() may take before the driver's processes are killed
+QUIT_TIMEOUT = 30
+
+def run_in_thread(func, *args):
+    """
+    Runs func on its own daemon thread. Probes and quits never share threads, so a
+    zombie session blocked in Selenium's HTTP timeout only ties up its own thread.
+    Returns (thread, outcome); outcome["error"] is set if func raised.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            func(*args)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, name="driver-probe", daemon=True)
+    thread.start()
+    return thread, outcome
+
+def process_tree_pids(pid):
+    """
+    A process and all its descendants (read from /proc), parents before children.
+    Returns None where /proc isn't available.
+    """
+    pids = []
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            try:
+                for tid in os.listdir(f"/proc/{current}/task"):
+                    with open(f"/proc/{current}/task/{tid}/children") as f:
+                        pending.extend(int(child) for child in f.read().split())
+            except FileNotFoundError:
+                # Process exited meanwhile
+                continue
+            pids.append(current)
+    except OSError:
+        return None
+    return pids
+
+def process_tree_rss(pid):
+    """
+    Resident memory (bytes) of a process and all its descendants, read from /proc.
+    Returns None where /proc isn't available.
+    """
+    pids = process_tree_pids(pid)
+    if pids is None:
+        return None
+    total = 0
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return total
+
+def kill_driver_processes(driver):
+    """
+    Kills the driver service process and the browser processes below it.
+    """
+    try:
+        pid = driver.service.process.pid
+    except Exception:
+        return
+    for current in process_tree_pids(pid) or [pid]:
+        try:
+            os.kill(current, signal.SIGKILL)
+        except OSError:
+            pass
+
+def driver_rss(driver):
+    """
+    Memory of the browser behind a driver (driver service and browser processes).
+    """
+    try:
+        return process_tree_rss(driver.service.process.pid)
+    except Exception:
+        return None
 
 class DriverPool:
-    def __init__(self, factory_func, max_size=0):
+    def __init__(self, factory_func, max_size=0, max_pages=0, max_rss_mb=0, probe_timeout=10):
         """
         Thread-safe pool for reusing WebDriver instances.
         
         Args:
             factory_func: Function to create a new driver instance.
-            max_size: Maximum number of drivers to hold in the pool (0 = unlimited).
+            max_size: Maximum number of drivers alive at once (0 = unlimited). acquire()
+                blocks once that many are in use.
+            max_pages: Retire a driver after it saved this many pages (0 = never).
+            max_rss_mb: Retire a driver whose browser processes use more memory (0 = never).
+            probe_timeout: Seconds the liveness probe on acquire may take.
         """
         self.factory_func = factory_func
         self.max_size = max_size
-        self._pool = queue.Queue(maxsize=max_size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.probe_timeout = probe_timeout
+        self._pool = queue.Queue()
         self._created_count = 0
+        self._retired_count = 0
         self._lock = threading.Lock()
         self._active_drivers = set()
 
-    def acquire(self):
+    def prewarm(self, count):
         """
-        Retrieves a driver from the pool or creates a new one if empty.
+        Starts up to count drivers in parallel and puts them in the pool, so workers
+        don't wait for cold browser starts. Returns the number started.
         """
+        if self.max_size:
+            count = min(count, self.max_size - len(self._active_drivers))
+        count = max(count, 0)
+        with ThreadPoolExecutor(max_workers=max(count, 1)) as executor:
+            results = list(executor.map(lambda _: self._try_create(), range(count)))
+        started = 0
+        for driver in results:
+            if driver is not None:
+                self._pool.put(driver)
+                started += 1
+        return started
+
+    def _try_create(self):
+        try:
+            return self._create()
+        except Exception as e:
+            logger.warning(f"Failed to start driver: {e}")
+            return None
+
+    def _create(self):
+        """
+        Creates a driver, or returns None if the size cap is reached.
+        """
+        with self._lock:
+            if self.max_size and len(self._active_drivers) >= self.max_size:
+                return None
+            self._created_count += 1
+            # Reserve the slot while the browser starts
+            placeholder = object()
+            self._active_drivers.add(placeholder)
+        driver = None
         try:
-            # Try to get an idle driver (non-blocking)
-            driver = self._pool.get_nowait()
-            # Optional: Check if driver is still alive?
-            # For now, assume it is. If it crashed, usage will raise exception and we handle it.
-            return driver
-        except queue.Empty:
-            # Create new driver
-            with self._lock:
-                self._created_count += 1
             driver = self.factory_func()
+        finally:
             with self._lock:
-                self._active_drivers.add(driver)
-            return driver
+                self._active_drivers.discard(placeholder)
+                if driver is not None:
+                    self._active_drivers.add(driver)
+        return driver
+
+    def _is_alive(self, driver):
+        """
+        Cheap liveness probe: a trivial script round trip within probe_timeout.
+        """
+        thread, outcome = run_in_thread(driver.execute_script, "return document.readyState")
+        thread.join(self.probe_timeout)
+        if thread.is_alive():
+            logger.warning("Driver did not answer the liveness probe, discarding it")
+            return False
+        return "error" not in outcome
+
+    def _should_retire(self, driver):
+        if self.max_pages and getattr(driver, "pages_loaded", 0) >= self.max_pages:
+            return True
+        if self.max_rss_mb:
+            rss = driver_rss(driver)
+            if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                return True
+        return False
+
+    def acquire(self):
+        """
+        Returns a live idle driver, or creates one while under max_size. At the cap,
+        blocks until another worker releases a driver.
+        """
+        while True:
+            try:
+                driver = self._pool.get_nowait()
+            except queue.Empty:
+                driver = self._create()
+                if driver is not None:
+                    return driver
+                # At the cap. Backpressure: wait for a released driver, re-checking
+                # now and then in case a discarded one freed a slot
+                try:
+                    driver = self._pool.get(timeout=1)
+                except queue.Empty:
+                    continue
+
+            if self._is_alive(driver):
+                return driver
+            self._discard(driver)
 
     def release(self, driver):
         """
-        Returns a driver to the pool for reuse.
+        Returns a driver to the pool for reuse, or retires it if it served max_pages
+        pages or grew past max_rss_mb.
         """
         if driver is None:
             return
 
+        if self._should_retire(driver):
+            with self._lock:
+                self._retired_count += 1
+            logger.info(f"Retiring driver after {getattr(driver, 'pages_loaded', 0)} pages")
+            self._discard(driver)
+            return
+
         try:
-            # Reset driver state if possible (clear cookies, etc)
-            # This is important for some sites, but for maintaining session (if desired) we might not want to.
-            # User note: "drivers will be kept alive and reused". 
-            # We'll just delete cookies to be safe/clean per task?
-            # User didn't specify, but usually "reuse" for scraping implies reusing the *browser instance*.
-            # If we want to simulate "fresh" user, we clear cookies.
-            # If we want to keep session, we don't. 
-            # Given we are scraping public data, clearing cookies is safer to avoid tracking accumulation.
+            # Clear cookies so each task starts as a fresh user and tracking state
+            # doesn't accumulate over a long-lived browser
             driver.delete_all_cookies()
         except:
             # If driver is dead, don't return to pool
             self._discard(driver)
             return
 
-        try:
-            self._pool.put_nowait(driver)
-        except queue.Full:
-            # If pool is full (shouldn't happen if unlimited), just close it
-            self._discard(driver)
+        self._pool.put(driver)
 
     def _discard(self, driver):
         with self._lock:
-            if driver in self._active_drivers:
-                self._active_drivers.remove(driver)
-        try:
-            driver.quit()
-        except:
-            pass
+            self._active_drivers.discard(driver)
+        # Quitting a hung session can take long; don't hold up the worker
+        run_in_thread(self._quit, driver)
+
+    @staticmethod
+    def _quit(driver):
+        """
+        Quits a driver; if quit() hangs past QUIT_TIMEOUT, kills its processes.
+        """
+        thread, _ = run_in_thread(driver.quit)
+        thread.join(QUIT_TIMEOUT)
+        if thread.is_alive():
+            logger.warning("Driver quit timed out, killing its processes")
+            kill_driver_processes(driver)
+
+    def stats(self):
+        with self._lock:
+            return f"Drivers: {self._created_count} started, {self._retired_count} retired, {len(self._active_drivers)} alive"
 
     def quit_all(self):
         """
@@ -193,17 +513,15 @@ class DriverPool:
         while not self._pool.empty():
             try:
                 driver = self._pool.get_nowait()
-                self._discard(driver)
+                with self._lock:
+                    self._active_drivers.discard(driver)
+                self._quit(driver)
             except:
                 pass
         
-        # Close active drivers? 
-        # We can't force close active drivers easily without tracking them and potentially disrupting threads.
-        # But we track them in _active_drivers.
+        # Close drivers still held by workers (tracked in _active_drivers)
         with self._lock:
-            for driver in list(self._active_drivers):
-                try:
-                    driver.quit()
-                except:
-                    pass
+            drivers = [d for d in self._active_drivers if hasattr(d, "quit")]
             self._active_drivers.clear()
+        for driver in drivers:
+            self._quit(driver)
@@ -0,0 +1,64 @@
+"""
+Fragments: Saves only the parts of a rendered page the parsers read.
+
+Overview:
+`driver.page_source` is megabytes of scripts and markup, while each parser only looks
+at a few subtrees (Wolt: the product modal; Tesco: Apollo cache, JSON-LD, heading,
+breadcrumbs, brand panel and price block). In fragment mode the crawler extracts
+these in the browser with one execute_script and saves them as a small HTML
+envelope: the usual META_JSON header (with "fragment": true) followed by the
+fragments' outerHTML. The parsers' selectors match the envelope exactly as they
+match the full page, so both kinds of file parse the same way.
+
+Selectors are per source (see FRAGMENT_SELECTORS in the crawlers). An element inside
+an already extracted element is skipped, so overlapping selectors don't duplicate
+markup (which would e.g. produce two Clubcard offers).
+"""
+
+# Returns the outerHTML of every element matching the selectors, in selector order,
+# skipping elements contained in one taken before
+FRAGMENT_SCRIPT = """
+var selectors = arguments[0];
+var taken = [], html = [];
+selectors.forEach(function (selector) {
+    document.querySelectorAll(selector).forEach(function (el) {
+        for (var i = 0; i < taken.length; i++) {
+            if (taken[i] === el || taken[i].contains(el)) return;
+        }
+        taken.push(el);
+        html.push(el.outerHTML);
+    });
+});
+return html;
+"""
+
+# Text of the first <script> containing the marker (e.g. the embedded app state)
+SCRIPT_TEXT_SCRIPT = """
+var marker = arguments[0];
+var scripts = document.getElementsByTagName('script');
+for (var i = 0; i < scripts.length; i++) {
+    if (scripts[i].textContent.indexOf(marker) !== -1) return scripts[i].textContent;
+}
+return null;
+"""
+
+
+def extract_fragments(driver, selectors):
+    """
+    Returns the HTML of the page's fragments matching selectors (one per line).
+    """
+    return "\n".join(driver.execute_script(FRAGMENT_SCRIPT, list(selectors)) or [])
+
+
+def script_text(driver, marker):
+    """
+    Returns the text of the first script element containing marker, or None.
+    """
+    return driver.execute_script(SCRIPT_TEXT_SCRIPT, marker)
+
+
+def json_script(data_json):
+    """
+    Wraps JSON text in a script element, escaping "</" so it can't close the element.
+    """
+    return '<script type="application/json">' + data_json.replace("</", "<\\/") + '</script>'
@@ -0,0 +1,41 @@
+"""
+HTML Backend: Selects the tree builder the parsers' BeautifulSoup runs on.
+
+Overview:
+All parsers query pages with BeautifulSoup CSS selectors and navigation
+(select_one, find_all(string=...), next_siblings, ...). Building the tree is most of
+a parse, and the stdlib `html.parser` builder is the slowest. With `lxml`, libxml2
+tokenizes the page in C while the selector logic stays exactly the same.
+
+Backends:
+1. html.parser: stdlib, always available (default).
+2. lxml: needs the `lxml` package (optional dependency, as for kupi/links.py).
+
+Run `sources/check_html_backends.py` over a raw data directory before switching a
+source: it parses every file with both backends and reports any file whose records
+differ, plus the throughput of each.
+"""
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+except ImportError:
+    lxml = None
+
+BACKENDS = ("html.parser", "lxml")
+DEFAULT_BACKEND = "html.parser"
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != "lxml" or lxml is not None]
+
+
+def make_soup(content, backend=DEFAULT_BACKEND):
+    """
+    Returns the BeautifulSoup tree of content built with the given backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown HTML backend: {backend}")
+    if backend == "lxml" and lxml is None:
+        raise ValueError("lxml backend requested but lxml is not installed")
+    return BeautifulSoup(content, backend)
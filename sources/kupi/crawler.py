@@ -7,53 +7,97 @@ main 'slevy' page and recursively explores product detail pages and category lis
 within a defined scope.
 
 Key Features & Steps:
-1. Concurrency Control: Uses ThreadPoolExecutor with a network semaphore to balance 
-   speed and politeness.
-2. Robustness: Implements requests.Session with exponential backoff retries for 
-   reliability against server errors.
-3. Space Efficiency: Saves raw HTML content using Gzip compression (.gz).
-4. Link Caching: Saves extracted links to .links.txt files to bypass expensive 
-   HTML parsing on subsequent runs.
+1. Concurrency Control: Uses ThreadPoolExecutor with a per-host rate controller
+   (AIMD by default, see rate_controller.py) to balance speed and politeness.
+2. Robustness: Retries 429/5xx and connection errors; the rate controller applies
+   exponential backoff or the server's Retry-After before the next attempt.
+3. Space Efficiency: Saves raw HTML content using Gzip compression (.gz), or zstd
+   with a trained dictionary (.zst, see raw_codec.py).
+4. Link Caching: Extracts links with a streaming parser (links.py, no DOM) and saves
+   them to .links.txt files to bypass HTML parsing on subsequent runs.
 5. Normalization: Standardizes URLs and strips tracking parameters to avoid 
    duplicate crawls.
 6. Scope Filtering: Targets specific paths (/slevy, /sleva) and filters out 
    unwanted brand-specific or deep-nested URLs.
+7. Revalidation: Stores ETag/Last-Modified validators in .meta.json files next to
+   each page. Pages older than max_age are re-requested conditionally; a 304 keeps
+   the archived body and its cached links.
+8. Resumable Frontier: The crawl queue lives in SQLite (frontier.sqlite in base_dir).
+   A killed crawl continues where it stopped; a finished one starts over.
+9. Recrawl Scheduling (optional): A RecrawlScheduler (scheduler.py) tracks how often
+   each page changes and when its offers expire. Saved pages are revalidated only when
+   due, URLs are claimed most urgent first, and a time budget stops the run once spent
+   (the remaining frontier is resumed next time).
+10. Packed Archive (optional): With a raw_store.PackStore, pages and their .links.txt /
+   .meta.json sidecars go into segment packs instead of loose files. Loose files from
+   earlier runs are still read.
 """
 import requests
-from bs4 import BeautifulSoup
 import os
 from fake_useragent import UserAgent
 import urllib.parse
-from collections import deque
 
-import gzip
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import concurrent.futures
-import threading
+import json
+import time
+
+from . import links
+from .frontier import Frontier, FAILED
+from .rate_controller import AIMDRateController, ERROR_STATUSES
+from .scheduler import RecrawlScheduler
+import raw_codec
+
+
+class DummyConsole:
+    """
+    Fallback console used when the crawler is run without one.
+    """
+    def __init__(self):
+        self.total = 0
+
+    def log(self, msg, notice=False): print(msg)
+    def update(self, *a, **kw): pass
+    def start(self): pass
+    def finish(self): pass
 
 
 class KupiCrawler:
-    def __init__(self, base_dir="data/kupi_raw"):
-        self.start_url = "https://www.kupi.cz/slevy"
+    def __init__(self, base_dir="data/kupi_raw", start_url=None, max_age=None, rate_controller=None, retries=5,
+                 link_backend=links.DEFAULT_BACKEND, schedule=False, time_budget=None, raw_store=None,
+                 codec=None):
+        self.start_url = start_url or "https://www.kupi.cz/slevy"
+        # Seconds after which a saved page is revalidated (None = reuse forever)
+        self.max_age = max_age
+        self.not_modified_count = 0
         self.scope_prefix = "https://www.kupi.cz/slevy"
         self.ua = UserAgent()
         self.base_dir = base_dir
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
+        # PackStore for pages and sidecars (None = one loose file each)
+        self.raw_store = raw_store
+        self.codec = codec or raw_codec.RawCodec(self.base_dir)
         
+        # URLs processed during this run
         self.visited = set()
-        self.queue = deque([self.start_url])
+        self.frontier = Frontier(os.path.join(self.base_dir, "frontier.sqlite"))
+        # Change-frequency history (same SQLite file) and run time budget in seconds
+        self.scheduler = RecrawlScheduler(self.frontier.filepath) if schedule else None
+        self.time_budget = time_budget
+        self.deadline = None
+        self.budget_spent = False
         
-        # Configure Retries
+        # Retries are driven by fetch() so the rate controller sees every failure
         self.session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries, pool_connections=20, pool_maxsize=20)
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=64)
         self.session.mount('https://', adapter)
         self.session.mount('http://', adapter)
+        self.retries = retries
+        self.link_backend = link_backend
         
         # Concurrency control
-        self.network_sem = threading.Semaphore(4)
+        self.rate_controller = rate_controller or AIMDRateController()
 
     def get_headers(self):
         return {
@@ -65,19 +109,37 @@ class KupiCrawler:
             'Cache-Control': 'max-age=0',
         }
 
+    def fetch(self, url, headers):
+        """
+        GETs a URL through the rate controller, retrying 429/5xx and connection errors.
+        Returns the final response (which may still be an error status).
+        """
+        host = self.rate_controller.host_of(url)
+        attempt = 0
+        while True:
+            self.rate_controller.acquire(host)
+            start = time.time()
+            try:
+                response = self.session.get(url, headers=headers, timeout=10)
+            except requests.RequestException:
+                self.rate_controller.release(host)
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                continue
+
+            self.rate_controller.release(host, time.time() - start, response.status_code,
+                                         response.headers.get('Retry-After'))
+            if response.status_code in ERROR_STATUSES and attempt < self.retries:
+                attempt += 1
+                continue
+            return response
+
     def normalize_url(self, url):
         """
         Standardize URL to prevent duplicates (trailing slashes, fragments).
         """
-        parsed = urllib.parse.urlparse(url)
-        # Strip fragment
-        # Strip trailing slash from path
-        norm_path = parsed.path.rstrip('/')
-        
-        # Reconstruct
-        # parsed is namedtuple, use _replace
-        norm_parsed = parsed._replace(path=norm_path, fragment='')
-        return norm_parsed.geturl()
+        return links.normalize_url(url)
 
     def get_file_path(self, url):
         parsed = urllib.parse.urlparse(url)
@@ -98,178 +160,367 @@ class KupiCrawler:
         filename = name + ".html"
         return os.path.join(self.base_dir, filename)
 
+    def get_store_key(self, url, suffix=""):
+        return os.path.basename(self.get_file_path(url)) + suffix
+
+    def read_sidecar(self, url, suffix):
+        """
+        Returns the text of a .links.txt / .meta.json sidecar (pack first, then loose file), or None.
+        """
+        if self.raw_store is not None:
+            data = self.raw_store.get(self.get_store_key(url, suffix))
+            if data is not None:
+                return data.decode('utf-8')
+        filepath = self.get_file_path(url) + suffix
+        if os.path.exists(filepath):
+            with open(filepath, 'r') as f:
+                return f.read()
+        return None
+
+    def write_sidecar(self, url, suffix, text):
+        if self.raw_store is not None:
+            self.raw_store.put(self.get_store_key(url, suffix), text, url)
+            return
+        filepath = self.get_file_path(url) + suffix
+        temp_path = filepath + ".tmp"
+        with open(temp_path, 'w') as f:
+            f.write(text)
+        os.replace(temp_path, filepath)
+
+    def find_saved_file(self, url):
+        """
+        Path of the loose saved page (.html.gz, .html.zst or plain .html), or None.
+        """
+        filepath_base = self.get_file_path(url)
+        for filepath in (filepath_base + ".gz", filepath_base + ".zst", filepath_base):
+            if os.path.exists(filepath):
+                return filepath
+        return None
+
+    def has_saved_html(self, url):
+        if self.raw_store is not None and self.get_store_key(url) in self.raw_store:
+            return True
+        return self.find_saved_file(url) is not None
+
+    def saved_at(self, url):
+        """
+        Time the saved copy was written (pack index or file mtime), for pages without validators.
+        """
+        if self.raw_store is not None:
+            entry = self.raw_store.entry(self.get_store_key(url))
+            if entry is not None:
+                return entry.stored_at
+        return os.path.getmtime(self.find_saved_file(url))
+
     def save_html(self, content, url):
-        filepath = self.get_file_path(url) + ".gz"
         # Prepend the original URL as a comment
         comment = f"<!-- origin_url: {url} -->\n".encode('utf-8')
-        
+        if self.raw_store is not None:
+            key = self.get_store_key(url)
+            self.raw_store.put(key, comment + content, url)
+            return key
+
+        filepath = self.get_file_path(url) + self.codec.suffix
         temp_path = filepath + ".tmp"
-        with gzip.open(temp_path, 'wb') as f:
-            f.write(comment + content)
+        with open(temp_path, 'wb') as f:
+            f.write(self.codec.compress(comment + content))
         os.replace(temp_path, filepath)
         return os.path.basename(filepath)
 
     def save_links(self, links, url):
-        filepath = self.get_file_path(url) + ".links.txt"
         try:
-            temp_path = filepath + ".tmp"
-            with open(temp_path, 'w') as f:
-                f.write('\n'.join(links))
-            os.replace(temp_path, filepath)
+            self.write_sidecar(url, ".links.txt", '\n'.join(links))
         except Exception as e:
             # Non-critical error
             pass
-        return os.path.basename(filepath)
+        return self.get_store_key(url, ".links.txt")
+
+    def save_validators(self, url, headers, not_modified=False):
+        """
+        Stores the response's cache validators (ETag, Last-Modified) and the fetch time.
+        A 304 often omits validators; with not_modified, the stored ones are kept
+        wherever the response carries no new value.
+        """
+        previous = self.load_validators(url) if not_modified else {}
+        meta = {
+            "origin_url": url,
+            "etag": headers.get('ETag') or previous.get('etag'),
+            "last_modified": headers.get('Last-Modified') or previous.get('last_modified'),
+            "fetched_at": time.time()
+        }
+        try:
+            self.write_sidecar(url, ".meta.json", json.dumps(meta))
+        except Exception:
+            # Non-critical error
+            pass
+
+    def load_validators(self, url):
+        try:
+            text = self.read_sidecar(url, ".meta.json")
+            if text:
+                return json.loads(text)
+        except Exception:
+            pass
+        return {}
+
+    def is_stale(self, url):
+        """
+        True if a saved copy of the page exists and is older than max_age, or the
+        recrawl scheduler considers it due.
+        """
+        if self.max_age is None and self.scheduler is None:
+            return False
+
+        if not self.has_saved_html(url):
+            return False
+
+        if self.scheduler is not None and self.scheduler.is_due(url):
+            return True
+        if self.max_age is None:
+            return False
+
+        # Pages archived before validators existed fall back to the file mtime
+        fetched_at = self.load_validators(url).get('fetched_at') or self.saved_at(url)
+        return time.time() - fetched_at > self.max_age
+
+    def record_fetch(self, url, content):
+        """
+        Feeds a 200 response to the recrawl scheduler (change detection, offer expiry).
+        """
+        if self.scheduler is not None:
+            self.scheduler.record_fetch(url, content)
+
+    def record_not_modified(self, url):
+        if self.scheduler is not None:
+            self.scheduler.record_not_modified(url)
+
+
+    def get_conditional_headers(self, url):
+        """
+        Request headers for a conditional GET (If-None-Match / If-Modified-Since).
+        """
+        meta = self.load_validators(url)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def load_cached_links(self, url, log_func):
+        """
+        Returns the normalized links from the .links.txt cache, or None if not cached.
+        """
+        try:
+            text = self.read_sidecar(url, ".links.txt")
+        except Exception as e:
+            log_func(f"  Error reading link cache for {url}: {e}")
+            return None
+        if text is None:
+            return None
+
+        log_func(f"Loading links from cache: {url}")
+        # Normalize links from cache to ensure consistency
+        return [self.normalize_url(line.strip()) for line in text.splitlines() if line.strip()]
+
+    def load_saved_html(self, url, log_func):
+        """
+        Returns previously saved raw content for the URL (pack, .html.gz, .html.zst or
+        plain .html), or None.
+        """
+        if self.raw_store is not None:
+            content = self.raw_store.get(self.get_store_key(url))
+            if content is not None:
+                log_func(f"Loading from pack: {url}")
+                return content
+
+        filepath = self.find_saved_file(url)
+        if filepath is None:
+            return None
+
+        log_func(f"Loading from disk: {url}")
+        try:
+            return raw_codec.read_file(filepath)
+        except Exception as e:
+            log_func(f"  Error reading file {filepath}: {e}")
+        return None
+
+    def extract_links(self, content, url):
+        """
+        Collects all <a href> targets from the page, resolved against the page URL,
+        normalized and deduplicated (streaming parse, no DOM).
+        """
+        return links.extract_links(content, url, backend=self.link_backend)
+
+    def is_in_scope(self, full_url):
+        """
+        Scope check: /slevy, /slevy/<category> and /sleva/<product>, without brand filters.
+        """
+        parsed_link = urllib.parse.urlparse(full_url)
+        path = parsed_link.path.strip('/') # e.g. "slevy/alkohol"
+
+        is_in_scope = False
+
+        if path == "slevy":
+            is_in_scope = True
+        elif path.startswith("slevy/"):
+            # "slevy/alkohol" -> ["alkohol"] -> len 1 OK
+            sub_path = path[6:]
+            segments = [s for s in sub_path.split('/') if s]
+            if len(segments) <= 1:
+                is_in_scope = True
+        elif path.startswith("sleva/"):
+            # "sleva/product" -> ["product"] -> len 1 OK
+            sub_path = path[6:]
+            segments = [s for s in sub_path.split('/') if s]
+            if len(segments) <= 1:
+                is_in_scope = True
+
+        # Check for unwanted query params (Brand filters start with br...)
+        if is_in_scope:
+            query_params = urllib.parse.parse_qs(parsed_link.query)
+            if any(k.startswith('br') for k in query_params.keys()):
+                is_in_scope = False
+
+        return is_in_scope
+
+    def filter_links(self, all_found_links):
+        """
+        Applies the scope logic to a list of discovered links.
+        """
+        if not all_found_links:
+            return []
+        return [full_url for full_url in all_found_links if self.is_in_scope(full_url)]
+
+    def prepare_frontier(self, log_func, fresh=False):
+        """
+        Resumes an interrupted crawl, or seeds a new one if the frontier is finished
+        (or fresh is requested).
+        """
+        if self.time_budget is not None:
+            self.deadline = time.time() + self.time_budget
+
+        if fresh or self.frontier.is_finished():
+            self.frontier.reset()
+            self.frontier.add([self.start_url], self.link_priorities([self.start_url]))
+            log_func(f"Starting new crawl at {self.start_url}")
+        else:
+            interrupted = self.frontier.recover()
+            counts = self.frontier.counts()
+            log_func(f"Resuming crawl: {counts['pending']} pending ({interrupted} interrupted), "
+                     f"{counts['done']} done, {counts['failed']} failed")
+
+    def link_priorities(self, urls):
+        """
+        Frontier priorities for newly discovered URLs (None = FIFO without a scheduler).
+        """
+        if self.scheduler is None:
+            return None
+        return self.scheduler.priorities(urls)
+
+    def claim_urls(self, n, log_func):
+        """
+        Claims up to n URLs from the frontier, or none once the time budget is spent.
+        """
+        if self.budget_spent:
+            return []
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.budget_spent = True
+            log_func(f"Time budget spent, {self.frontier.counts()['pending']} URLs left for the next run")
+            return []
+        return self.frontier.claim(n)
+
+    def finish_message(self):
+        msg = f"Crawl finished. Visited {len(self.visited)} pages ({self.not_modified_count} not modified)."
+        if self.scheduler is not None:
+            msg += f" Fetched {self.scheduler.fetched_count}, changed {self.scheduler.changed_count}."
+        return msg
+
+    def close(self):
+        self.frontier.close()
+        if self.raw_store is not None:
+            self.raw_store.close()
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+    def update_progress(self, console):
+        counts = self.frontier.counts()
+        console.total = sum(counts.values())
+        console.update(counts['done'] + counts['failed'], f"Run:{counts['in_flight']} | {self.rate_controller.stats()}")
+
+    def complete_url(self, url, new_links, log_func):
+        """
+        Records a processed URL in the frontier. new_links is None for a transient failure.
+        """
+        if new_links is None:
+            if self.frontier.mark_failed(url) == FAILED:
+                log_func(f"Giving up on {url} after {self.frontier.max_attempts} attempts")
+        else:
+            self.frontier.mark_done(url, new_links, self.link_priorities(new_links))
 
     def process_url(self, url, log_func):
         """
         Worker function to process a single URL.
-        Returns a list of discovered URLs to be added to the queue.
+        Returns a list of discovered URLs to be added to the queue,
+        or None if fetching failed and the URL should be retried.
         """
-        extracted_links = []
-        
-        # Check for cached links first to avoid HTML parsing
-        link_cache_path = self.get_file_path(url) + ".links.txt"
+        stale = self.is_stale(url)
 
-        
-        all_found_links = None
-        
-        # Try loading from cache
-        if os.path.exists(link_cache_path):
-            log_func(f"Loading links from cache: {url}")
-            try:
-                with open(link_cache_path, 'r') as f:
-                    # Normalize links from cache to ensure consistency
-                    all_found_links = [self.normalize_url(line.strip()) for line in f if line.strip()]
-            except Exception as e:
-                log_func(f"  Error reading link cache {link_cache_path}: {e}")
+        # Check for cached links first to avoid HTML parsing
+        all_found_links = None if stale else self.load_cached_links(url, log_func)
 
         # If not in cache, load/fetch content and parse
         if all_found_links is None:
-            # Check if we have it locally (only for saveable URLs)
-            is_saveable = True
-            filepath_base = self.get_file_path(url)
-            filepath_gz = filepath_base + ".gz"
-            content = None
-            
-            if is_saveable:
-                if os.path.exists(filepath_gz):
-                    log_func(f"Loading from disk (gz): {url}")
-                    try:
-                        with gzip.open(filepath_gz, 'rb') as f:
-                            content = f.read()
-                    except Exception as e:
-                        log_func(f"  Error reading file {filepath_gz}: {e}")
-                elif os.path.exists(filepath_base):
-                    log_func(f"Loading from disk: {url}")
-                    try:
-                        with open(filepath_base, 'rb') as f:
-                            content = f.read()
-                    except Exception as e:
-                        log_func(f"  Error reading file {filepath_base}: {e}")
+            content = None if stale else self.load_saved_html(url, log_func)
             
             if content is None:
-                log_func(f"Fetching: {url}")
+                headers = self.get_headers()
+                if stale:
+                    log_func(f"Revalidating: {url}")
+                    headers.update(self.get_conditional_headers(url))
+                else:
+                    log_func(f"Fetching: {url}")
                 try:
-                    # Use session for retries
-                    with self.network_sem:
-                        # Polite small sleep inside semaphore to space out requests slightly if desired
-                        # time.sleep(0.1) 
-                        response = self.session.get(url, headers=self.get_headers(), timeout=10)
+                    response = self.fetch(url, headers)
                     
-                    if response.status_code != 200:
+                    if response.status_code == 304:
+                        log_func(f"  Not modified, keeping archived copy.")
+                        self.not_modified_count += 1
+                        self.save_validators(url, response.headers, not_modified=True)
+                        self.record_not_modified(url)
+                        all_found_links = self.load_cached_links(url, log_func)
+                        if all_found_links is None:
+                            content = self.load_saved_html(url, log_func)
+                    elif response.status_code != 200:
                         log_func(f"  Status {response.status_code}, skipping.")
                         return []
-                    
-                    content = response.content
-                    
-                    if is_saveable:
+                    else:
+                        content = response.content
+                        
                         saved_name = self.save_html(content, url)
+                        self.save_validators(url, response.headers)
+                        self.record_fetch(url, content)
                         log_func(f"  Saved to {saved_name}")
                         
                 except Exception as e:
                     log_func(f"  Error fetching {url}: {e}")
-                    return []
+                    return None
 
             # Extract links (Deep follow)
-            if content:
+            if all_found_links is None and content:
                 try:
-                    all_found_links = []
-                    soup = BeautifulSoup(content, 'html.parser')
-                    links = soup.find_all('a', href=True)
-                    
-                    for link in links:
-                        href = link.get('href')
-                        full_url = urllib.parse.urljoin(url, href)
-                        
-                        # Normalize: strip fragments and trailing slashes
-                        full_url = self.normalize_url(full_url)
-                        
-                        all_found_links.append(full_url)
-                    
-                    # Save to cache
-                    if is_saveable:
-                        self.save_links(all_found_links, url) # Save VALID unique links? or all? 
-                        # User asked for "list of unique <a> found". 
-                        # We should probably deduplicate before saving to be efficient.
-                        all_found_links = list(set(all_found_links))
-                        self.save_links(all_found_links, url)
-                        
+                    all_found_links = self.extract_links(content, url)
+                    self.save_links(all_found_links, url)
                 except Exception as e:
                     log_func(f"  Error parsing links from {url}: {e}")
                     return []
 
         # Filter links (apply scope logic to all_found_links)
-        if all_found_links:
-            for full_url in all_found_links:
-                # Scope check logic
-                parsed_link = urllib.parse.urlparse(full_url)
-                path = parsed_link.path.strip('/') # e.g. "slevy/alkohol"
-                
-                is_in_scope = False
-                
-                if path == "slevy":
-                    is_in_scope = True
-                elif path.startswith("slevy/"):
-                    # "slevy/alkohol" -> ["alkohol"] -> len 1 OK
-                    sub_path = path[6:]
-                    segments = [s for s in sub_path.split('/') if s]
-                    if len(segments) <= 1:
-                        is_in_scope = True
-                elif path.startswith("sleva/"):
-                    # "sleva/product" -> ["product"] -> len 1 OK
-                    sub_path = path[6:]
-                    segments = [s for s in sub_path.split('/') if s]
-                    if len(segments) <= 1:
-                        is_in_scope = True
-                
-                # Check for unwanted query params (Brand filters start with br...)
-                if is_in_scope:
-                    parsed_new = urllib.parse.urlparse(full_url)
-                    query_params = urllib.parse.parse_qs(parsed_new.query)
-                    if any(k.startswith('br') for k in query_params.keys()):
-                        is_in_scope = False
-
-                if is_in_scope:
-                    extracted_links.append(full_url)
-                
-        return extracted_links
-
-    def run(self, console=None, workers=None):
-        print_lock = threading.Lock()
-        futures = {} # future -> url
-        
+        return self.filter_links(all_found_links)
+
+    def run(self, console=None, workers=None, fresh=False):
         # Use passed console or fallback (silent/print) if None (though main assures it)
-        if console is None:
-             # Fallback if run without console
-             class DummyConsole:
-                 def log(self, m): print(m)
-                 def update(self, *a): pass
-                 def start(self): pass
-                 def finish(self): pass
-                 def total(self): return 0
-             console = DummyConsole()
-             console.total = 0
+        console = console or DummyConsole()
 
         def log(msg, notice=False):
             console.log(msg, notice=notice)
@@ -278,67 +529,45 @@ class KupiCrawler:
         def worker_log(msg):
             log(msg)
 
-        log(f"Starting crawl at {self.start_url}", notice=True)
+        self.prepare_frontier(lambda msg: log(msg, notice=True), fresh=fresh)
         
         console.update(0, "Init...")
         
-        # Dynamic worker count: 2 * CPU cores (defaulting to 4 if cpu_count is None)
-        if workers:
-            max_workers = workers
-        else:
-            cpu_count = os.cpu_count() or 2
-            max_workers = cpu_count * 2
+        # The pool fits the rate controller's highest limit, so AIMD can actually raise
+        # concurrency; workers caps it, and the controller is clamped to the pool
+        ceiling = self.rate_controller.ceiling()
+        max_workers = min(workers, ceiling) if workers else ceiling
+        self.rate_controller.clamp(max_workers)
             
         futures = {} # future -> url
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            
-            while self.queue or futures:
-                # Submit tasks if slots available and queue not empty
-                while self.queue and len(futures) < max_workers:
-                    url = self.queue.popleft()
-                    
-                    if url in self.visited:
-                        continue
-                    
-                    self.visited.add(url)
-                    
-                    # Update bar for visited count
-                    # Count running tasks (futures)
-                    running = len(futures)
-                    waiting = len(self.queue)
-                    total_known = len(self.visited) + waiting
-                    finished = len(self.visited) - running
-                    
-                    console.total = total_known
-                    console.update(finished, f"Run:{running}")
-                            
-                    future = executor.submit(self.process_url, url, worker_log)
-                    futures[future] = url
-                
-                # Wait for at least one future to complete (or if queue empty and all slots full)
-                if futures:
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while True:
+                    # Submit tasks if slots available and frontier has pending URLs
+                    for url in self.claim_urls(max_workers - len(futures), log):
+                        self.visited.add(url)
+                        future = executor.submit(self.process_url, url, worker_log)
+                        futures[future] = url
+
+                    # Nothing running and nothing pending: done
+                    if not futures:
+                        break
+
+                    self.update_progress(console)
+
+                    # Wait for at least one future to complete
                     done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
-                    
+
                     for future in done:
                         url = futures.pop(future)
                         try:
-                            # result is list of links
                             new_links = future.result()
-                            for link in new_links:
-                                if link not in self.visited and link not in self.queue:
-                                    # Note: linear search in queue is O(N), for large queues optimal is set+queue
-                                    # self.queue is deque.
-                                    # Checking just visited is usually enough if we accept duplicates in queue 
-                                    # but self.visited check at pop time handles them.
-                                    # To keep queue small we might want a separate 'enqueued' set.
-                                    # For now, simplistic approach: duplicates in queue are fine, handled at pop.
-                                    self.queue.append(link)
                         except Exception as e:
                             log(f"Worker exception for {url}: {e}")
-                
-                # If queue is empty and no futures, we are done
-                if not self.queue and not futures:
-                    break
-        
-        log(f"Crawl finished. Visited {len(self.visited)} pages.")
+                            new_links = None
+                        self.complete_url(url, new_links, log)
+        finally:
+            self.close()
+
+        log(self.finish_message())
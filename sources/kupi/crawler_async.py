@@ -0,0 +1,183 @@
+"""
+Kupi Async Crawler: Single event loop variant of the Kupi crawler.
+
+Overview:
+Same crawl as KupiCrawler (scope filtering, .links.txt cache, .html.gz archive), but
+network I/O runs on one asyncio event loop instead of a thread per request. This keeps
+hundreds of requests in flight on a single core, since the crawl is almost entirely
+bound by waiting on sockets.
+
+Key Features & Steps:
+1. Bounded Connections: aiohttp TCPConnector caps the number of open connections;
+   URLs are claimed from the shared SQLite frontier only while fewer than that many
+   tasks are in flight.
+2. Robustness: Retries 429/5xx and connection errors through the shared rate
+   controller, which also adapts per-host concurrency and honours Retry-After.
+3. Async Disk I/O: Compression, cache reads and writes run in the default
+   thread pool via asyncio.to_thread so the loop never blocks on disk.
+4. Shared Logic: URL normalization, file naming, link extraction, scope checks and
+   conditional revalidation are inherited from KupiCrawler, so both engines produce
+   identical archives.
+"""
+import asyncio
+import time
+
+import aiohttp
+
+from . import links
+from .crawler import KupiCrawler, DummyConsole
+from .rate_controller import AIMDRateController, ERROR_STATUSES
+
+
+class AsyncKupiCrawler(KupiCrawler):
+    def __init__(self, base_dir="data/kupi_raw", start_url=None, max_age=None, rate_controller=None, retries=5,
+                 link_backend=links.DEFAULT_BACKEND, schedule=False, time_budget=None, raw_store=None,
+                 codec=None, connections=64):
+        rate_controller = rate_controller or AIMDRateController(max_limit=connections)
+        super().__init__(base_dir=base_dir, start_url=start_url, max_age=max_age,
+                         rate_controller=rate_controller, retries=retries, link_backend=link_backend,
+                         schedule=schedule, time_budget=time_budget, raw_store=raw_store, codec=codec)
+        self.connections = connections
+
+    async def fetch(self, session, url, headers):
+        """
+        GETs a URL through the rate controller, retrying 429/5xx and connection errors.
+        Returns (status, response headers, body bytes); body is None unless status is 200.
+        """
+        host = self.rate_controller.host_of(url)
+        attempt = 0
+        while True:
+            await self.rate_controller.acquire_async(host)
+            start = time.time()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    body = await response.read() if response.status == 200 else None
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                await self.rate_controller.release_async(host)
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                continue
+
+            await self.rate_controller.release_async(host, time.time() - start, response.status,
+                                                     response.headers.get('Retry-After'))
+            if response.status in ERROR_STATUSES and attempt < self.retries:
+                attempt += 1
+                continue
+            return response.status, response.headers, body
+
+    async def process_url_async(self, session, url, log_func):
+        """
+        Async counterpart of KupiCrawler.process_url.
+        Returns a list of discovered URLs to be added to the queue,
+        or None if fetching failed and the URL should be retried.
+        """
+        stale = await asyncio.to_thread(self.is_stale, url)
+
+        # Check for cached links first to avoid HTML parsing
+        all_found_links = None
+        if not stale:
+            all_found_links = await asyncio.to_thread(self.load_cached_links, url, log_func)
+
+        if all_found_links is None:
+            content = None
+            if not stale:
+                content = await asyncio.to_thread(self.load_saved_html, url, log_func)
+
+            if content is None:
+                headers = self.get_headers()
+                if stale:
+                    log_func(f"Revalidating: {url}")
+                    headers.update(await asyncio.to_thread(self.get_conditional_headers, url))
+                else:
+                    log_func(f"Fetching: {url}")
+                try:
+                    status, response_headers, body = await self.fetch(session, url, headers)
+
+                    if status == 304:
+                        log_func(f"  Not modified, keeping archived copy.")
+                        self.not_modified_count += 1
+                        await asyncio.to_thread(self.save_validators, url, response_headers, True)
+                        await asyncio.to_thread(self.record_not_modified, url)
+                        all_found_links = await asyncio.to_thread(self.load_cached_links, url, log_func)
+                        if all_found_links is None:
+                            content = await asyncio.to_thread(self.load_saved_html, url, log_func)
+                    elif status != 200:
+                        log_func(f"  Status {status}, skipping.")
+                        return []
+                    else:
+                        content = body
+                        saved_name = await asyncio.to_thread(self.save_html, content, url)
+                        await asyncio.to_thread(self.save_validators, url, response_headers)
+                        await asyncio.to_thread(self.record_fetch, url, content)
+                        log_func(f"  Saved to {saved_name}")
+                except Exception as e:
+                    log_func(f"  Error fetching {url}: {e}")
+                    return None
+
+            # Extract links (Deep follow)
+            if all_found_links is None and content:
+                try:
+                    all_found_links = await asyncio.to_thread(self.extract_links, content, url)
+                    await asyncio.to_thread(self.save_links, all_found_links, url)
+                except Exception as e:
+                    log_func(f"  Error parsing links from {url}: {e}")
+                    return []
+
+        return self.filter_links(all_found_links)
+
+    async def crawl(self, console):
+        """
+        Runs the crawl loop: claims pending URLs from the frontier while fewer than
+        `connections` fetches are in flight, and records results as they complete.
+        """
+        def log(msg):
+            console.log(msg)
+
+        tasks = {} # task -> url
+
+        connector = aiohttp.TCPConnector(limit=self.connections, limit_per_host=self.connections)
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            try:
+                while True:
+                    for url in self.claim_urls(self.connections - len(tasks), log):
+                        self.visited.add(url)
+                        task = asyncio.create_task(self.process_url_async(session, url, log))
+                        tasks[task] = url
+
+                    if not tasks:
+                        break
+
+                    self.update_progress(console)
+
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        url = tasks.pop(task)
+                        try:
+                            new_links = task.result()
+                        except Exception as e:
+                            log(f"Worker exception for {url}: {e}")
+                            new_links = None
+                        self.complete_url(url, new_links, log)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, console=None, workers=None, fresh=False):
+        console = console or DummyConsole()
+
+        if workers:
+            self.connections = workers
+
+        self.prepare_frontier(lambda msg: console.log(msg, notice=True), fresh=fresh)
+        console.log(f"Async engine: {self.connections} connections")
+        console.update(0, "Init...")
+
+        try:
+            asyncio.run(self.crawl(console))
+        finally:
+            self.close()
+
+        console.log(self.finish_message())
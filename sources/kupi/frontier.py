@@ -0,0 +1,160 @@
+"""
+Kupi Frontier: Persistent, resumable crawl queue backed by SQLite.
+
+Overview:
+Replaces the in-memory deque + visited set. Every discovered URL is a row with a status
+(pending, in_flight, done, failed) and an attempt count, so a killed crawl resumes exactly
+where it stopped.
+
+Key Features:
+1. O(1) Dedup: URL is the primary key; enqueueing uses INSERT OR IGNORE.
+2. Priority Order: Pending URLs are claimed by priority, then insertion order. With
+   no priorities given this is breadth-first FIFO, as before.
+3. Crash Safety: WAL journal, one transaction per state change. URLs left in_flight
+   by a killed run are returned to pending by recover().
+4. Retry Accounting: Failed URLs go back to pending until max_attempts is reached.
+
+The frontier is owned by the crawler's scheduling loop (one thread); workers never
+touch it directly.
+"""
+import os
+import sqlite3
+import time
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+class Frontier:
+    def __init__(self, filepath, max_attempts=3):
+        self.filepath = filepath
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+
+        self.conn = sqlite3.connect(filepath)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                priority REAL NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(frontier)")]
+        if "priority" not in columns:
+            self.conn.execute("ALTER TABLE frontier ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+        self.conn.execute("DROP INDEX IF EXISTS frontier_status")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS frontier_claim ON frontier(status, priority DESC, id)")
+        self.conn.commit()
+
+        # Status counters kept in memory so progress reporting doesn't scan the table
+        self._counts = {PENDING: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+        for status, n in self.conn.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status"):
+            self._counts[status] = n
+
+    def recover(self):
+        """
+        Returns URLs left in_flight by an interrupted run to pending. Returns the count.
+        """
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE frontier SET status = ? WHERE status = ?", (PENDING, IN_FLIGHT)
+            )
+        self._counts[PENDING] += cur.rowcount
+        self._counts[IN_FLIGHT] -= cur.rowcount
+        return cur.rowcount
+
+    def is_finished(self):
+        """
+        True if the frontier holds no pending or in-flight work (empty or fully crawled).
+        """
+        return self._counts[PENDING] == 0 and self._counts[IN_FLIGHT] == 0
+
+    def reset(self):
+        """
+        Drops all rows to start a new crawl.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM frontier")
+        self._counts = dict.fromkeys(self._counts, 0)
+
+    def add(self, urls, priorities=None):
+        """
+        Enqueues URLs as pending; already known URLs (in any status) are ignored.
+        priorities is an optional {url: priority} mapping (higher is claimed first).
+        """
+        priorities = priorities or {}
+        now = time.time()
+        with self.conn:
+            cur = self.conn.executemany(
+                "INSERT OR IGNORE INTO frontier (url, status, priority, updated_at) VALUES (?, ?, ?, ?)",
+                ((url, PENDING, priorities.get(url, 0), now) for url in urls)
+            )
+        self._counts[PENDING] += max(cur.rowcount, 0)
+
+    def claim(self, n):
+        """
+        Marks up to n pending URLs as in_flight and returns them, highest priority (then oldest) first.
+        """
+        if n <= 0:
+            return []
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT id, url FROM frontier WHERE status = ? ORDER BY priority DESC, id LIMIT ?", (PENDING, n)
+            ).fetchall()
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE frontier SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                ((IN_FLIGHT, now, row_id) for row_id, _ in rows)
+            )
+        self._counts[PENDING] -= len(rows)
+        self._counts[IN_FLIGHT] += len(rows)
+        return [url for _, url in rows]
+
+    def mark_done(self, url, new_links=(), priorities=None):
+        """
+        Marks a URL as done and enqueues its discovered links in the same transaction.
+        """
+        priorities = priorities or {}
+        now = time.time()
+        with self.conn:
+            cur = self.conn.executemany(
+                "INSERT OR IGNORE INTO frontier (url, status, priority, updated_at) VALUES (?, ?, ?, ?)",
+                ((link, PENDING, priorities.get(link, 0), now) for link in new_links)
+            )
+            self.conn.execute(
+                "UPDATE frontier SET status = ?, updated_at = ? WHERE url = ?", (DONE, now, url)
+            )
+        self._counts[PENDING] += max(cur.rowcount, 0)
+        self._counts[IN_FLIGHT] -= 1
+        self._counts[DONE] += 1
+
+    def mark_failed(self, url):
+        """
+        Returns a URL to pending for another attempt, or marks it failed once
+        max_attempts is reached. Returns the new status.
+        """
+        with self.conn:
+            row = self.conn.execute("SELECT attempts FROM frontier WHERE url = ?", (url,)).fetchone()
+            status = FAILED if row and row[0] >= self.max_attempts else PENDING
+            self.conn.execute(
+                "UPDATE frontier SET status = ?, updated_at = ? WHERE url = ?", (status, time.time(), url)
+            )
+        self._counts[IN_FLIGHT] -= 1
+        self._counts[status] += 1
+        return status
+
+    def counts(self):
+        """
+        Returns a dict of status -> number of URLs.
+        """
+        return dict(self._counts)
+
+    def close(self):
+        self.conn.close()
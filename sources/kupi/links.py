@@ -0,0 +1,103 @@
+"""
+Kupi Link Extraction: Streaming <a href> collection without building a DOM.
+
+Overview:
+The crawler only needs link targets, so instead of a BeautifulSoup tree the page is fed
+through an event-driven parser that reacts to <a> start tags. Each href is resolved
+against the page URL, normalized and deduplicated as it is seen.
+
+Backends:
+1. lxml: libxml2's HTML parser with a target object (C speed, used when lxml is installed).
+2. html.parser: Python's stdlib HTMLParser (always available).
+"""
+import urllib.parse
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+DEFAULT_BACKEND = "lxml" if etree is not None else "html.parser"
+
+
+def normalize_url(url):
+    """
+    Standardize URL to prevent duplicates (trailing slashes, fragments).
+    """
+    parsed = urllib.parse.urlparse(url)
+    # parsed is namedtuple, use _replace
+    return parsed._replace(path=parsed.path.rstrip('/'), fragment='').geturl()
+
+
+class LinkCollector:
+    """
+    Resolves, normalizes and deduplicates hrefs in discovery order.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.links = {}  # normalized url -> None (ordered set)
+        self._seen_hrefs = set()
+
+    def add(self, href):
+        if href is None or href in self._seen_hrefs:
+            return
+        self._seen_hrefs.add(href)
+        full_url = normalize_url(urllib.parse.urljoin(self.base_url, href))
+        self.links[full_url] = None
+
+
+class _StdlibLinkParser(HTMLParser):
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href':
+                    self.collector.add(value)
+                    break
+
+
+class _LxmlLinkTarget:
+    def __init__(self, collector):
+        self.collector = collector
+
+    def start(self, tag, attrib):
+        if tag == 'a':
+            self.collector.add(attrib.get('href'))
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        return None
+
+
+def extract_links(content, base_url, backend=DEFAULT_BACKEND):
+    """
+    Returns the unique, normalized absolute URLs of all <a href> in the page.
+    content may be bytes (decoded as UTF-8) or str.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+
+    collector = LinkCollector(base_url)
+    if backend == "lxml":
+        if etree is None:
+            raise ValueError("lxml backend requested but lxml is not installed")
+        parser = etree.HTMLParser(target=_LxmlLinkTarget(collector))
+        parser.feed(content)
+        parser.close()
+    elif backend == "html.parser":
+        parser = _StdlibLinkParser(collector)
+        parser.feed(content)
+        parser.close()
+    else:
+        raise ValueError(f"Unknown link extraction backend: {backend}")
+
+    return list(collector.links)
@@ -0,0 +1,122 @@
+"""
+Kupi Merge: Deduplicates parsed Kupi items into products with their offers.
+
+Overview:
+Items with the same name are one product. Its fields take the first non-empty value
+seen; its offers are deduplicated: two offers are the same if both have a discount_id
+and the IDs match, otherwise if store name and price match. Instead of comparing each
+new offer with every offer of the product (quadratic for products with hundreds of
+offers), every product keeps hash indexes:
+- ids:       discount_ids of offers that have one
+- keys:      (store_name, price) of all offers
+- keys_noid: (store_name, price) of offers without a discount_id
+An offer with an ID is a duplicate if its ID is in ids or its key in keys_noid; an
+offer without one if its key is in keys.
+
+Tree Reduce:
+The rule is not associative (an offer dropped in one partial result could survive a
+merge in file order), so partial merges (partial=True) only drop exact repeats of an
+offer: same discount_id (or none) and same (store_name, price). Such a repeat is a
+duplicate in every context. The root merge applies the full rule, so reducing
+the partial results of chunks gives the same output as merging the chunks' items
+one after another.
+"""
+
+
+def offer_key(price):
+    return (price['store_name'], price['price'])
+
+
+class OfferIndex:
+    def __init__(self, partial=False):
+        self.partial = partial
+        self.ids = set()
+        self.keys = set()
+        self.keys_noid = set()
+        self.exact = set()
+
+    def is_duplicate(self, price):
+        discount_id = price.get('discount_id')
+        if self.partial:
+            return (discount_id or None, offer_key(price)) in self.exact
+        if discount_id:
+            return discount_id in self.ids or offer_key(price) in self.keys_noid
+        return offer_key(price) in self.keys
+
+    def add(self, price):
+        discount_id = price.get('discount_id')
+        key = offer_key(price)
+        if self.partial:
+            self.exact.add((discount_id or None, key))
+        elif discount_id:
+            self.ids.add(discount_id)
+            self.keys.add(key)
+        else:
+            self.keys.add(key)
+            self.keys_noid.add(key)
+
+
+class ProductMerger:
+    def __init__(self, partial=False):
+        self.partial = partial
+        self.products = {}  # name -> product (insertion order = first seen)
+        self.indexes = {}   # name -> OfferIndex
+        self.price_count = 0
+
+    def add(self, item):
+        """
+        Merges one parsed item (or a partially merged product) into its product.
+        """
+        name = item['name']
+        existing = self.products.get(name)
+        if existing is None:
+            existing = self.products[name] = {
+                'name': name,
+                'brand': item.get('brand'),
+                'image_url': item['image_url'],
+                'categories': item.get('categories', []),
+                'prices': []
+            }
+            self.indexes[name] = OfferIndex(self.partial)
+
+        # Merge product_url
+        if not existing.get('product_url') and item.get('product_url'):
+            existing['product_url'] = item['product_url']
+
+        # Merge brand
+        if not existing.get('brand') and item.get('brand'):
+            existing['brand'] = item['brand']
+
+        # Merge image
+        if not existing['image_url'] and item['image_url']:
+            existing['image_url'] = item['image_url']
+
+        # Merge categories (if existing is empty)
+        if not existing.get('categories') and item.get('categories'):
+            existing['categories'] = item['categories']
+
+        # Merge prices
+        index = self.indexes[name]
+        for new_price in item['prices']:
+            if not index.is_duplicate(new_price):
+                index.add(new_price)
+                existing['prices'].append(new_price)
+                self.price_count += 1
+
+    def add_all(self, items):
+        for item in items:
+            self.add(item)
+
+    def result(self):
+        return list(self.products.values())
+
+
+def reduce_items(item_lists):
+    """
+    Partial merge of consecutive parsed files (lists of items), e.g. inside a worker.
+    The returned products are items for the next merge level.
+    """
+    merger = ProductMerger(partial=True)
+    for items in item_lists:
+        merger.add_all(items)
+    return merger.result()
@@ -22,20 +22,24 @@ Key Extraction Steps:
 7. UI Metadata: Pre-calculates store, brand, and category counts to optimize 
    frontend performance.
 """
-import gzip
-import json
-from bs4 import BeautifulSoup
 import json
 import os
-import glob
 import re
 from datetime import datetime, timedelta
-import concurrent.futures
 from collections import Counter
 
+from raw_store import list_pages, read_page, source_name
+from parse_cache import ParseCache
+from html_backend import DEFAULT_BACKEND, make_soup
+from parallel_map import map_chunks
+from .merge import ProductMerger, reduce_items
+
 # Global constant for date parsing
 CURRENT_YEAR = datetime.now().year
 
+# Bump whenever parse_file_worker's output changes (invalidates the parse cache)
+PARSER_VERSION = 1
+
 # --- Top-Level Parsing Functions ---
 
 def parse_unit_price_string(text):
@@ -108,6 +112,24 @@ def parse_validity_dates(text):
     return (start_date.isoformat() if start_date else None, 
             end_date.isoformat() if end_date else None)
 
+def date_context(items, today):
+    """
+    What the parsed items depend on of the parse date (parse_validity_dates): the day
+    if an offer's validity is relative ("dnes končí", "zítra končí"), else the year
+    if any offer has a validity text (CURRENT_YEAR), else nothing (None).
+    """
+    context = None
+    for item in items:
+        for price in item.get('prices', []):
+            validity = price.get('validity')
+            if not validity:
+                continue
+            lower_text = validity.replace('\xa0', ' ').lower()
+            if "dnes končí" in lower_text or "zítra končí" in lower_text:
+                return today.isoformat()
+            context = str(today.year)
+    return context
+
 def parse_list_row_offers(soup):
     offers = []
     for discount_row in soup.select('.discount_row'):
@@ -329,17 +351,13 @@ def parse_grid_item(discount_div):
     except Exception:
         return None
 
-def parse_file_worker(filepath):
+def parse_file_worker(filepath, backend=DEFAULT_BACKEND):
     """
-    Worker function to parse a single file (picklable).
+    Worker function to parse a single file (picklable). filepath is a loose .html /
+    .html.gz path or a packed PackEntry; backend the HTML tree builder (html_backend.py).
     """
     try:
-        if filepath.endswith('.gz'):
-            with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-                content = f.read()
-        else:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+        content = read_page(filepath)
             
         # Extract product_url from comment
         product_url = None
@@ -347,9 +365,9 @@ def parse_file_worker(filepath):
         if url_match:
             product_url = url_match.group(1)
 
-        soup = BeautifulSoup(content, 'html.parser')
+        soup = make_soup(content, backend)
         
-        filename = os.path.basename(filepath)
+        filename = source_name(filepath)
 
         # Extract Categories
         categories = []
@@ -439,16 +457,25 @@ def parse_file_worker(filepath):
         return []
 
 
+def parse_batch_worker(filepaths, backend=DEFAULT_BACKEND, keep_records=False):
+    """
+    Parses consecutive files and merges their items (partial merge, kupi/merge.py).
+    Returns (per-file item lists if keep_records else None, partially merged products).
+    """
+    records = [parse_file_worker(f, backend) for f in filepaths]
+    return (records if keep_records else None), reduce_items(records)
+
+
 class KupiParser:
-    def __init__(self, data_dir="data/kupi_raw"):
+    def __init__(self, data_dir="data/kupi_raw", use_cache=True, html_backend=DEFAULT_BACKEND):
         self.data_dir = data_dir
+        self.use_cache = use_cache
+        self.html_backend = html_backend
         self.products = []
 
     def run(self, console=None, workers=None):
-        # Recursively find all html and html.gz files
-        files = glob.glob(os.path.join(self.data_dir, '**', '*.html*'), recursive=True)
-        # Filter for specifically .html or .html.gz
-        files = [f for f in files if f.endswith('.html') or f.endswith('.html.gz')]
+        # Packed pages plus all loose html and html.gz files (recursive)
+        files = list_pages(self.data_dir, recursive=True)
         
         total_files = len(files)
         
@@ -461,75 +488,46 @@ class KupiParser:
             print(f"Found {total_files} files. Starting parallel parsing...")
         
         processed_count = 0
-        product_map = {}
-        total_prices_count = 0
+        # Offers are deduplicated through per-product indexes (kupi/merge.py)
+        merger = ProductMerger()
+
+        # Unchanged files come from the parse cache. Validity dates are resolved against
+        # the parse date, so entries of such files are only reused on the same day
+        # (relative dates) or in the same year (date_context)
+        today = datetime.now().date()
+        cache = ParseCache(self.data_dir, f"{PARSER_VERSION}:{self.html_backend}",
+                           contexts=(today.isoformat(), str(today.year))) if self.use_cache else None
+        if cache:
+            cached, files = cache.split(files)
+            for parsed_items in cached:
+                merger.add_all(parsed_items)
+            processed_count = len(cached)
+            log_func = console.log if console else print
+            log_func(f"Reusing {processed_count} unchanged files from the parse cache, parsing {len(files)}")
         
-        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
-            # Submit tasks
-            future_to_file = {executor.submit(parse_file_worker, f): f for f in files}
+        # Chunks of files, largest first; each worker pre-merges its chunk (tree reduce)
+        for chunk, result in map_chunks(parse_batch_worker, files, (self.html_backend, cache is not None), workers):
+            processed_count += len(chunk)
+            if result is not None:
+                records, partial = result
+                merger.add_all(partial)
+                if cache:
+                    # Empty results too, so offer-less pages are not parsed again
+                    for f, parsed_items in zip(chunk, records):
+                        cache.put(f, parsed_items, date_context(parsed_items, today))
             
-            for future in concurrent.futures.as_completed(future_to_file):
-                processed_count += 1
-                try:
-                    parsed_items = future.result()
-                    if parsed_items:
-                        for item in parsed_items:
-                            name = item['name']
-                            if name not in product_map:
-                                product_map[name] = {
-                                    'name': name,
-                                    'brand': item.get('brand'),
-                                    'image_url': item['image_url'],
-                                    'categories': item.get('categories', []),
-                                    'prices': []
-                                }
-                            
-                            existing = product_map[name]
-                            
-                            # Merge product_url
-                            if not existing.get('product_url') and item.get('product_url'):
-                                existing['product_url'] = item['product_url']
-
-                            # Merge brand
-                            if not existing.get('brand') and item.get('brand'):
-                                existing['brand'] = item['brand']
-                            
-                            # Merge image
-                            if not existing['image_url'] and item['image_url']:
-                                existing['image_url'] = item['image_url']
-                                
-                            # Merge categories (if existing is empty)
-                            if not existing.get('categories') and item.get('categories'):
-                                existing['categories'] = item['categories']
-
-                            # Merge prices
-                            for new_price in item['prices']:
-                                is_duplicate = False
-                                for p in existing['prices']:
-                                    ids_both_present = new_price.get('discount_id') and p.get('discount_id')
-                                    
-                                    if ids_both_present:
-                                        if new_price['discount_id'] == p['discount_id']:
-                                            is_duplicate = True
-                                            break
-                                    else:
-                                        # Fallback to loose check
-                                        if (p['store_name'] == new_price['store_name'] and 
-                                            p['price'] == new_price['price']):
-                                            is_duplicate = True
-                                            break
-                                
-                                if not is_duplicate:
-                                    existing['prices'].append(new_price)
-                                    total_prices_count += 1
-                except Exception:
-                    pass
-                
-                if console:
-                    stats = f"Prod: {len(product_map)} | Price: {total_prices_count}"
-                    console.update(processed_count, stats)
+            if console:
+                stats = f"Prod: {len(merger.products)} | Price: {merger.price_count}"
+                console.update(processed_count, stats)
+
+        if cache:
+            cache.close()
+            if console:
+                console.log(cache.stats())
+            else:
+                print(cache.stats())
         
-        self.products = list(product_map.values())
+        self.products = merger.result()
         if console:
             console.log(f"Parsed {len(self.products)} unique products.")
         else:
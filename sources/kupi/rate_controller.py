@@ -0,0 +1,239 @@
+"""
+Kupi Rate Controller: Per-host concurrency control for the HTTP crawl engines.
+
+Overview:
+Replaces the fixed network semaphore. Every request takes a slot for its host before
+it is sent and reports the outcome (latency, status, Retry-After) when it completes.
+The controller decides how many requests may be in flight per host and when a host
+is cooling down.
+
+Controllers:
+1. FixedRateController: Constant limit per host (the old Semaphore(4) behaviour) plus
+   Retry-After / backoff cooldowns.
+2. AIMDRateController: Additive increase, multiplicative decrease. The limit grows by
+   ~1 per window of successful responses, and is halved on 429/5xx/connection errors
+   or when latency climbs well above the best observed baseline.
+
+Both engines share a controller: threads block in acquire(), coroutines await
+acquire_async(). Decisions are made under one lock, so a controller is safe to share.
+"""
+import asyncio
+import email.utils
+import math
+import threading
+import time
+import urllib.parse
+
+ERROR_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP-date) into seconds from now.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+        return max(0.0, dt.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_errors = 0
+        self.latency_ewma = None
+        self.latency_baseline = None
+        self.last_decrease = 0.0
+        self.requests = 0
+        self.errors = 0
+
+
+class RateController:
+    """
+    Base controller: slot accounting, cooldowns and stats. Subclasses override
+    on_success / on_error to adjust HostState.limit.
+    """
+    def __init__(self, initial_limit=4, backoff_factor=1.0, max_backoff=60.0):
+        self.initial_limit = initial_limit
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.hosts = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_cond = None
+
+    def ceiling(self):
+        """
+        Highest per-host limit this controller can reach.
+        """
+        return self.initial_limit
+
+    def clamp(self, limit):
+        """
+        Caps the limits at the number of requests the engine can actually run.
+        """
+        self.initial_limit = min(self.initial_limit, limit)
+
+    @staticmethod
+    def host_of(url):
+        return urllib.parse.urlparse(url).netloc
+
+    def _state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.initial_limit)
+        return state
+
+    def _try_acquire_locked(self, host):
+        state = self._state(host)
+        wait = state.cooldown_until - time.time()
+        if wait > 0:
+            return wait
+        if state.in_flight >= max(1, int(state.limit)):
+            return math.inf
+        state.in_flight += 1
+        state.requests += 1
+        return None
+
+    def try_acquire(self, host):
+        """
+        Takes a slot if one is free. Returns None on success, otherwise the number of
+        seconds to wait before trying again (math.inf = until a slot is released).
+        """
+        with self._lock:
+            return self._try_acquire_locked(host)
+
+    def acquire(self, host):
+        """
+        Blocks the calling thread until a slot for the host is available.
+        """
+        with self._cond:
+            while True:
+                wait = self._try_acquire_locked(host)
+                if wait is None:
+                    return
+                self._cond.wait(None if wait == math.inf else wait)
+
+    async def acquire_async(self, host):
+        """
+        Waits (without blocking the event loop) until a slot for the host is available.
+        """
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        async with self._async_cond:
+            while True:
+                wait = self.try_acquire(host)
+                if wait is None:
+                    return
+                try:
+                    await asyncio.wait_for(self._async_cond.wait(), None if wait == math.inf else wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def release(self, host, latency=None, status=None, retry_after=None):
+        """
+        Returns a slot and records the outcome. status=None means a connection error.
+        """
+        with self._cond:
+            state = self._state(host)
+            state.in_flight -= 1
+            if status is None or status in ERROR_STATUSES:
+                state.errors += 1
+                state.consecutive_errors += 1
+                delay = parse_retry_after(retry_after)
+                if delay is None:
+                    delay = self.backoff_factor * (2 ** (state.consecutive_errors - 1))
+                state.cooldown_until = max(state.cooldown_until, time.time() + min(delay, self.max_backoff))
+                self.on_error(state)
+            else:
+                state.consecutive_errors = 0
+                if latency is not None:
+                    self._record_latency(state, latency)
+                self.on_success(state, latency)
+            self._cond.notify_all()
+
+    async def release_async(self, host, latency=None, status=None, retry_after=None):
+        self.release(host, latency, status, retry_after)
+        if self._async_cond is not None:
+            async with self._async_cond:
+                self._async_cond.notify_all()
+
+    def _record_latency(self, state, latency):
+        if state.latency_ewma is None:
+            state.latency_ewma = latency
+        else:
+            state.latency_ewma = 0.8 * state.latency_ewma + 0.2 * latency
+        if state.latency_baseline is None or state.latency_ewma < state.latency_baseline:
+            state.latency_baseline = state.latency_ewma
+
+    def on_success(self, state, latency):
+        pass
+
+    def on_error(self, state):
+        pass
+
+    def stats(self):
+        """
+        Short summary of current limits for Console stats.
+        """
+        with self._lock:
+            parts = []
+            for state in self.hosts.values():
+                lat = f"{state.latency_ewma * 1000:.0f}ms" if state.latency_ewma is not None else "--"
+                part = f"Lim:{state.limit:.1f} Lat:{lat} Err:{state.errors}"
+                cooldown = state.cooldown_until - time.time()
+                if cooldown > 0:
+                    part += f" Wait:{cooldown:.0f}s"
+                parts.append(part)
+            return " ".join(parts)
+
+
+class FixedRateController(RateController):
+    """
+    Constant per-host limit.
+    """
+
+
+class AIMDRateController(RateController):
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, latency_factor=3.0,
+                 decrease_factor=0.5, backoff_factor=1.0, max_backoff=60.0):
+        super().__init__(initial_limit=initial_limit, backoff_factor=backoff_factor, max_backoff=max_backoff)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_factor = latency_factor
+        self.decrease_factor = decrease_factor
+
+    def ceiling(self):
+        return self.max_limit
+
+    def clamp(self, limit):
+        super().clamp(limit)
+        self.max_limit = min(self.max_limit, limit)
+
+    def _decrease(self, state):
+        # At most one decrease per latency window, so a burst of failures from the
+        # same in-flight batch counts as a single congestion signal
+        window = state.latency_ewma or 1.0
+        now = time.time()
+        if now - state.last_decrease < window:
+            return
+        state.last_decrease = now
+        state.limit = max(self.min_limit, state.limit * self.decrease_factor)
+
+    def on_success(self, state, latency):
+        if (latency is not None and state.latency_baseline
+                and state.latency_ewma > state.latency_baseline * self.latency_factor):
+            self._decrease(state)
+        else:
+            state.limit = min(self.max_limit, state.limit + 1.0 / state.limit)
+
+    def on_error(self, state):
+        self._decrease(state)
@@ -0,0 +1,188 @@
+"""
+Kupi Recrawl Scheduler: Decides which archived pages are worth fetching again.
+
+Overview:
+Keeps a per-URL history next to the frontier (same SQLite file): first and last fetch,
+content hash, number of observed changes and the earliest offer expiry found on the
+page. From that it estimates how often each page changes and turns it into:
+
+1. Due check: a saved page is refetched only when its earliest offer has expired or
+   the time since the last fetch exceeds the estimated change interval.
+2. Priority: pending URLs are claimed in order of urgency (never fetched first, then
+   expired offers, then pages most overdue relative to their change interval), so a
+   time budget is spent where the data actually moves.
+
+Change interval estimate: observed span / number of changes, or (when no change was
+seen yet) the observed span itself, clamped to [min_interval, max_interval].
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .parser import parse_validity_dates
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Priority tiers (higher is claimed first)
+PRIORITY_NEW = 1000.0
+PRIORITY_EXPIRED = 100.0
+
+VALIDITY_RE = re.compile(
+    r'class="[^"]*\b(?:discounts_validity|grid_discounts_validity)\b[^"]*"[^>]*>(.*?)</(?:div|span|p|td)>',
+    re.DOTALL
+)
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def content_hash(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+def extract_earliest_expiry(content, now=None):
+    """
+    Returns the earliest upcoming offer end on the page as a Unix timestamp (end of that
+    day), or None. Uses a regex over the validity elements instead of building a DOM.
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='replace')
+    now = now or time.time()
+
+    earliest = None
+    for match in VALIDITY_RE.finditer(content):
+        text = TAG_RE.sub(' ', match.group(1))
+        _, end = parse_validity_dates(text)
+        if not end:
+            continue
+        end_ts = datetime.fromisoformat(end).replace(hour=23, minute=59, second=59).timestamp()
+        # Offers that already ended don't tell us when the page will change next
+        if end_ts > now and (earliest is None or end_ts < earliest):
+            earliest = end_ts
+    return earliest
+
+
+class RecrawlScheduler:
+    def __init__(self, filepath, min_interval=6 * HOUR, default_interval=DAY, max_interval=7 * DAY):
+        self.min_interval = min_interval
+        self.default_interval = default_interval
+        self.max_interval = max_interval
+        self.fetched_count = 0
+        self.changed_count = 0
+
+        # Own connection: called from worker threads, serialized by the lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS history (
+                url TEXT PRIMARY KEY,
+                first_fetch REAL NOT NULL,
+                last_fetch REAL NOT NULL,
+                content_hash TEXT,
+                fetches INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                earliest_expiry REAL
+            )
+        """)
+        self.conn.commit()
+
+    def _get(self, url):
+        return self.conn.execute(
+            "SELECT first_fetch, last_fetch, content_hash, changes, earliest_expiry FROM history WHERE url = ?",
+            (url,)
+        ).fetchone()
+
+    def change_interval(self, first_fetch, last_fetch, changes):
+        span = last_fetch - first_fetch
+        if changes:
+            interval = span / changes
+        else:
+            interval = max(span, self.default_interval)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _urgency(self, row, now):
+        """
+        Priority for a history row (None = never fetched).
+        """
+        if row is None:
+            return PRIORITY_NEW
+        first_fetch, last_fetch, _, changes, earliest_expiry = row
+        if earliest_expiry is not None and earliest_expiry <= now and earliest_expiry > last_fetch:
+            # Offer ended since the last fetch; sooner expiry = more urgent
+            return PRIORITY_EXPIRED + min(1.0, (now - earliest_expiry) / DAY)
+        # < 1.0 means not due yet
+        return (now - last_fetch) / self.change_interval(first_fetch, last_fetch, changes)
+
+    def is_due(self, url):
+        with self._lock:
+            row = self._get(url)
+        return self._urgency(row, time.time()) >= 1.0
+
+    def priorities(self, urls):
+        """
+        Returns {url: priority} for a batch of URLs.
+        """
+        urls = list(urls)
+        rows = {}
+        with self._lock:
+            for i in range(0, len(urls), 500):
+                chunk = urls[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT url, first_fetch, last_fetch, content_hash, changes, earliest_expiry "
+                    f"FROM history WHERE url IN ({placeholders})", chunk
+                ):
+                    rows[row[0]] = row[1:]
+        now = time.time()
+        return {url: self._urgency(rows.get(url), now) for url in urls}
+
+    def record_fetch(self, url, content):
+        """
+        Records a full (200) fetch: compares the content hash and stores the earliest expiry.
+        """
+        now = time.time()
+        digest = content_hash(content)
+        expiry = extract_earliest_expiry(content, now)
+        with self._lock:
+            row = self._get(url)
+            with self.conn:
+                if row is None:
+                    self.conn.execute(
+                        "INSERT INTO history (url, first_fetch, last_fetch, content_hash, fetches, changes, earliest_expiry) "
+                        "VALUES (?, ?, ?, ?, 1, 0, ?)", (url, now, now, digest, expiry)
+                    )
+                    changed = False
+                else:
+                    # Rows created by a 304 have no hash yet; that first body isn't a change
+                    changed = row[2] is not None and row[2] != digest
+                    self.conn.execute(
+                        "UPDATE history SET last_fetch = ?, content_hash = ?, fetches = fetches + 1, "
+                        "changes = changes + ?, earliest_expiry = ? WHERE url = ?",
+                        (now, digest, int(changed), expiry, url)
+                    )
+            self.fetched_count += 1
+            self.changed_count += int(changed)
+
+    def record_not_modified(self, url):
+        """
+        Records a 304 revalidation: fetched now, content unchanged.
+        """
+        now = time.time()
+        with self._lock:
+            with self.conn:
+                # Pages archived before the scheduler existed have no history row yet
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO history (url, first_fetch, last_fetch, fetches) VALUES (?, ?, ?, 0)",
+                    (url, now, now)
+                )
+                self.conn.execute(
+                    "UPDATE history SET last_fetch = ?, fetches = fetches + 1 WHERE url = ?", (now, url)
+                )
+            self.fetched_count += 1
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,165 @@
+"""
+Kupi Stub Server: Local stand-in for kupi.cz used to benchmark the crawl engines.
+
+Serves a synthetic, deterministic site with the same URL shape the crawler scopes to:
+- /slevy                   index linking to every category
+- /slevy/<category>        category grid linking to its products (plus out-of-scope noise)
+- /sleva/<product>         product detail linking back to its category and a few siblings
+
+Every response is delayed by a fixed latency to emulate a remote server, so the
+comparison measures how well an engine overlaps waiting rather than raw parsing speed.
+Responses carry an ETag and honour If-None-Match with a 304. With `capacity` set, requests
+beyond that many concurrent ones are rejected with 429 + Retry-After, like a rate-limiting
+origin.
+"""
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubKupiSite:
+    def __init__(self, categories=20, products_per_category=50):
+        self.categories = [f"kategorie-{i}" for i in range(categories)]
+        self.products_per_category = products_per_category
+
+    def products(self, category):
+        return [f"{category}-produkt-{j}" for j in range(self.products_per_category)]
+
+    @property
+    def total_pages(self):
+        return 1 + len(self.categories) * (1 + self.products_per_category)
+
+    def render(self, path):
+        """
+        Returns the HTML body for a path, or None for a 404.
+        """
+        parts = [p for p in path.strip('/').split('/') if p]
+        if parts == ["slevy"]:
+            links = [f"/slevy/{c}" for c in self.categories]
+            return self._page("Slevy", links)
+
+        if len(parts) == 2 and parts[0] == "slevy" and parts[1] in self.categories:
+            category = parts[1]
+            links = [f"/sleva/{p}" for p in self.products(category)]
+            # Out-of-scope links the crawler must filter out
+            links += [f"/slevy/{category}/hluboko", f"/slevy/{category}?br=znacka", "/letaky"]
+            return self._page(category, links)
+
+        if len(parts) == 2 and parts[0] == "sleva":
+            category = parts[1].split("-produkt-")[0]
+            if category not in self.categories:
+                return None
+            siblings = self.products(category)[:5]
+            links = [f"/slevy/{category}", "/slevy"] + [f"/sleva/{p}#detail" for p in siblings]
+            return self._page(parts[1], links)
+
+        return None
+
+    def _page(self, title, links):
+        anchors = "\n".join(f'<li><a href="{href}">{href}</a></li>' for href in links)
+        # Padding approximates the weight of a real kupi.cz page
+        filler = "<p>" + ("lorem ipsum " * 400) + "</p>"
+        return (
+            f"<!DOCTYPE html><html><head><title>{title}</title></head>"
+            f"<body><h1>{title}</h1><ul>{anchors}</ul>{filler}</body></html>"
+        ).encode("utf-8")
+
+
+class StubKupiServer:
+    """
+    Threaded HTTP server serving a StubKupiSite on localhost in a background thread.
+    Use as a context manager; `start_url` points at the stub's /slevy index.
+    """
+    def __init__(self, site=None, latency=0.05, port=0, capacity=None, retry_after=1):
+        self.site = site or StubKupiSite()
+        self.latency = latency
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.requests = 0
+        self.not_modified = 0
+        self.rejected = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 1024
+        self._thread = None
+
+    @property
+    def start_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/slevy"
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    overloaded = stub.capacity is not None and stub.active >= stub.capacity
+                    if overloaded:
+                        stub.rejected += 1
+                    else:
+                        stub.active += 1
+
+                if overloaded:
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(stub.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                try:
+                    time.sleep(stub.latency)
+                    self.respond()
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def respond(self):
+                body = stub.site.render(self.path.split('?')[0])
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Maintenance for packed raw archives (see raw_store.py).
+"""
+import argparse
+
+from raw_store import PackStore, has_pack, open_codec, pack_directory, train_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw page pack maintenance")
+    parser.add_argument("command", choices=["pack", "compact", "stats", "train"],
+                        help="pack: move loose files into the pack, compact: drop superseded records, "
+                             "stats: show sizes, train: train a new zstd dictionary")
+    parser.add_argument("dirs", nargs="+", help="Raw data directories (e.g. data/tesco_raw)")
+    parser.add_argument("--delete", action="store_true", help="Remove loose files after packing them")
+    parser.add_argument("--compression", choices=["gzip", "zstd"], default="gzip", help="Record compression when packing")
+    parser.add_argument("--samples", type=int, default=200, help="Pages sampled for dictionary training")
+    parser.add_argument("--min-dead", type=float, default=0.0,
+                        help="compact: only rewrite when at least this fraction of the segment bytes is superseded")
+    args = parser.parse_args()
+
+    for directory in args.dirs:
+        if args.command == "pack":
+            pack_directory(directory, delete=args.delete, codec=open_codec(directory, args.compression))
+            continue
+        if args.command == "train":
+            if train_directory(directory, samples=args.samples) is None:
+                print(f"{directory}: not enough pages to train on")
+            continue
+
+        if not has_pack(directory):
+            print(f"{directory}: no pack")
+            continue
+        with PackStore(directory) as store:
+            stats = store.stats()
+            if args.command == "compact":
+                dead = 1 - stats['live_bytes'] / stats['total_bytes'] if stats['total_bytes'] else 0.0
+                if dead >= args.min_dead:
+                    reclaimed = store.compact()
+                    print(f"{directory}: reclaimed {reclaimed / 1024 / 1024:.1f} MB")
+                    stats = store.stats()
+                else:
+                    print(f"{directory}: {dead:.0%} superseded, below --min-dead, not compacting")
+            print(f"{directory}: {stats['pages']} pages in {stats['segments']} segments, "
+                  f"{stats['total_bytes'] / 1024 / 1024:.1f} MB ({stats['live_bytes'] / 1024 / 1024:.1f} MB live)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Page Writer: Background persistence of crawled pages.
+
+Overview:
+Compressing a page (gzip level 9 or zstd) and writing it used to run on the Selenium
+worker thread, leaving its browser idle meanwhile. Workers now hand the page to a
+PageWriter and go straight to the next page; writer threads compress it, write it
+(temp file + atomic rename, or the pack store) and then run the page's callback,
+which marks it in the crawler state.
+
+Key Features:
+1. Backpressure: at most `max_pending` pages wait in the queue. A worker submitting
+   to a full queue blocks until a writer catches up, so memory stays bounded when
+   the disk is slower than the browsers.
+2. Nothing Lost: close() (called in the crawlers' finally blocks, also on Ctrl-C)
+   writes every queued page before returning. Pages are marked processed only after
+   they are on disk, so a page lost to a hard kill is crawled again on resume.
+3. Inline Mode: threads=0 writes synchronously on the calling thread (the old
+   behaviour).
+4. Stats: pages and bytes written, time spent writing and the highest queue depth
+   are logged at exit.
+"""
+import os
+import queue
+import threading
+import time
+
+from raw_codec import RawCodec
+
+
+class PageWriter:
+    def __init__(self, raw_data_dir, raw_store=None, codec=None, threads=2, max_pending=32, log_func=print):
+        self.raw_data_dir = raw_data_dir
+        self.raw_store = raw_store
+        self.codec = codec or RawCodec(raw_data_dir)
+        self.log_func = log_func
+        self.lock = threading.Lock()
+        self.pages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.write_time = 0.0
+        self.max_depth = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.threads = [threading.Thread(target=self._run, name=f"page-writer-{i}", daemon=True)
+                        for i in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, key, data, url=None, on_done=None):
+        """
+        Queues a page for writing (blocks while the queue is full). key is the page
+        name without compression suffix (e.g. "product_x.html"), data the page bytes.
+        on_done(path) runs on the writer thread once the page is stored, where path is
+        the loose file path or the pack key. Returns the path the page will have.
+        """
+        path = key if self.raw_store is not None else os.path.join(self.raw_data_dir, key + self.codec.suffix)
+        if not self.threads:
+            self._write(key, data, url, on_done)
+            return path
+        self.queue.put((key, data, url, on_done))
+        with self.lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return path
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self.queue.task_done()
+
+    def _write(self, key, data, url, on_done):
+        start = time.perf_counter()
+        try:
+            if self.raw_store is not None:
+                self.raw_store.put(key, data, url)
+                path = key
+            else:
+                path = os.path.join(self.raw_data_dir, key + self.codec.suffix)
+                temp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(self.codec.compress(data))
+                os.replace(temp_path, path)
+            if on_done is not None:
+                on_done(path)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            self.log_func(f"Error writing {key}: {e}")
+            return
+        with self.lock:
+            self.pages += 1
+            self.bytes += len(data)
+            self.write_time += time.perf_counter() - start
+
+    def flush(self):
+        """
+        Waits until every queued page is written.
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Writes the remaining pages and stops the writer threads.
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def stats(self):
+        with self.lock:
+            return (f"Writer: {self.pages} pages, {self.bytes / 1024 / 1024:.1f} MB, "
+                    f"{self.write_time:.1f}s writing, max queue {self.max_depth}, {self.errors} errors")
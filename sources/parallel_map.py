@@ -0,0 +1,99 @@
+"""
+Parallel Map: Chunked, backpressured process-pool scheduling shared by the parsers.
+
+Overview:
+The parsers used to submit one future per file up front, which pickles every task
+and result separately and keeps all pending results in memory. map_chunks() instead
+sends chunks of files to the worker processes and yields each chunk's result as
+soon as it finishes, so the caller merges while the pool keeps parsing.
+
+Key Features:
+1. Chunking: up to `chunk_size` files per task (fewer for small runs, so every
+   worker gets several chunks), amortizing pickling and IPC per file.
+2. Backpressure: at most `max_pending` chunks (default 2 per worker) are in flight;
+   the next chunk is submitted only when one has been consumed, bounding memory.
+3. Largest First: files are scheduled by stored size, descending. Big pages start
+   early and the run ends on small chunks instead of a single slow straggler.
+4. Streaming: parallel_map() runs a per-file function over the chunks and yields
+   (file, result) pairs; a file whose parse raises yields None instead of failing
+   its chunk. map_chunks() runs a per-chunk function (e.g. a worker-side reduce).
+"""
+import concurrent.futures
+import functools
+import os
+
+from raw_store import source_size
+
+CHUNK_SIZE = 32
+CHUNKS_PER_WORKER = 4
+
+
+def make_chunks(sources, workers, chunk_size=CHUNK_SIZE):
+    """
+    Splits sources, largest first, into chunks of at most chunk_size.
+    """
+    ordered = sorted(sources, key=source_size, reverse=True)
+    size = max(1, min(chunk_size, -(-len(ordered) // (workers * CHUNKS_PER_WORKER))))
+    return [ordered[i:i + size] for i in range(0, len(ordered), size)]
+
+
+def map_chunks(chunk_func, sources, args=(), workers=None, chunk_size=CHUNK_SIZE, max_pending=None):
+    """
+    Runs chunk_func(chunk, *args) in a process pool for chunks of sources and yields
+    (chunk, result) in completion order, result None if the chunk raised.
+    chunk_func must be picklable (top level).
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    chunks = iter(make_chunks(sources, workers, chunk_size))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}  # future -> (submission number, chunk)
+        submitted = 0
+
+        def submit_next():
+            nonlocal submitted
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending[executor.submit(chunk_func, chunk, *args)] = (submitted, chunk)
+                submitted += 1
+
+        for _ in range(max_pending):
+            submit_next()
+
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            # Finished together: submission order (a one-worker run is deterministic)
+            for future in sorted(done, key=lambda f: pending[f][0]):
+                _, chunk = pending.pop(future)
+                submit_next()
+                try:
+                    result = future.result()
+                except Exception:
+                    result = None
+                yield chunk, result
+
+
+def map_each(func, chunk, *args):
+    """
+    Worker side of parallel_map: func(source, *args) for each source (None on error).
+    """
+    results = []
+    for source in chunk:
+        try:
+            results.append(func(source, *args))
+        except Exception:
+            results.append(None)
+    return results
+
+
+def parallel_map(func, sources, args=(), workers=None, chunk_size=CHUNK_SIZE, max_pending=None):
+    """
+    Runs func(source, *args) for every source in a process pool and yields
+    (source, result) as chunks finish, result None where func raised.
+    func must be picklable (top level).
+    """
+    for chunk, results in map_chunks(functools.partial(map_each, func), sources, args, workers, chunk_size, max_pending):
+        if results is None:
+            results = [None] * len(chunk)
+        yield from zip(chunk, results)
@@ -0,0 +1,137 @@
+"""
+Parse Cache: Per-source cache of parsed records, so only new or changed pages are parsed.
+
+Overview:
+After an incremental crawl most raw pages are unchanged, yet every parse run used to
+send all of them through the process pool. The cache (parse_cache.sqlite in the raw
+data directory) stores each page's parsed records, keyed by the page and its
+fingerprint. A parse run takes the records of unchanged pages from the cache and
+parses only the rest.
+
+Key Features:
+1. Fingerprints: a loose file is identified by path, size and mtime; a packed page by
+   its content hash from the pack index (a repacked but identical page stays cached).
+2. Versioning: each parser declares PARSER_VERSION; a cache written by another
+   version (or for other parser arguments, folded into the version string) is
+   discarded as a whole. Bump the constant whenever the parser's output changes.
+3. Date-Dependent Entries: a parser whose output for a page depends on the parse
+   date stores the entry with a valid_for tag (e.g. the day or the year); it is only
+   reused while that tag is among the run's contexts. Other entries never expire.
+4. Pruning: entries of pages that no longer exist are dropped at the end of a run.
+5. Main Process Only: the cache is read before and written after the pool, so worker
+   processes never touch SQLite.
+"""
+import json
+import os
+import sqlite3
+
+from raw_store import PackEntry
+
+CACHE_NAME = "parse_cache.sqlite"
+COMMIT_EVERY = 1000
+
+
+def cache_key(source):
+    if isinstance(source, PackEntry):
+        return "pack:" + source.key
+    return source
+
+
+def fingerprint(source):
+    if isinstance(source, PackEntry):
+        return source.hash
+    st = os.stat(source)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+class ParseCache:
+    def __init__(self, directory, version, contexts=()):
+        self.path = os.path.join(directory, CACHE_NAME)
+        self.version = str(version)
+        # valid_for tags of date-dependent entries that are current in this run
+        self.contexts = set(contexts)
+        self.hits = 0
+        self.misses = 0
+        self.seen = set()
+        # Fingerprints of pending sources as listed (a page rewritten while being
+        # parsed must not be cached under its new fingerprint)
+        self.pending = {}
+        self.uncommitted = 0
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pages)")]
+        if columns and "valid_for" not in columns:
+            # Cache from before date-dependent entries: rebuild
+            self.conn.execute("DROP TABLE pages")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                records TEXT NOT NULL,
+                valid_for TEXT
+            )
+        """)
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if not row or row[0] != self.version:
+            # Parser changed: nothing cached is valid any more
+            self.conn.execute("DELETE FROM pages")
+            self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)", (self.version,))
+        self.conn.commit()
+
+    def split(self, sources):
+        """
+        Returns (records of every cached, unchanged source as one list per source,
+        sources that need parsing).
+        """
+        fingerprints = {key: (fp, valid_for) for key, fp, valid_for
+                        in self.conn.execute("SELECT key, fingerprint, valid_for FROM pages")}
+        cached, pending = [], []
+        for source in sources:
+            key = cache_key(source)
+            self.seen.add(key)
+            try:
+                current = fingerprint(source)
+            except OSError:
+                pending.append(source)
+                continue
+            stored, valid_for = fingerprints.get(key, (None, None))
+            if stored == current and (valid_for is None or valid_for in self.contexts):
+                row = self.conn.execute("SELECT records FROM pages WHERE key = ?", (key,)).fetchone()
+                cached.append(json.loads(row[0]))
+            else:
+                self.pending[key] = current
+                pending.append(source)
+        self.hits += len(cached)
+        self.misses += len(pending)
+        return cached, pending
+
+    def put(self, source, records, valid_for=None):
+        """
+        Stores the parsed records of a source. valid_for tags records that depend on
+        the parse date (reused only in runs listing the tag in their contexts).
+        """
+        current = self.pending.pop(cache_key(source), None)
+        if current is None:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (key, fingerprint, records, valid_for) VALUES (?, ?, ?, ?)",
+            (cache_key(source), current, json.dumps(records, ensure_ascii=False), valid_for)
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= COMMIT_EVERY:
+            self.conn.commit()
+            self.uncommitted = 0
+
+    def close(self, prune=True):
+        """
+        Commits; with prune, first drops the entries of sources not seen in this run
+        (pass prune=False when the run only looked at part of the files).
+        """
+        if prune:
+            stale = [key for (key,) in self.conn.execute("SELECT key FROM pages") if key not in self.seen]
+            self.conn.executemany("DELETE FROM pages WHERE key = ?", ((key,) for key in stale))
+        self.conn.commit()
+        self.conn.close()
+
+    def stats(self):
+        return f"Parse cache: {self.hits} unchanged files reused, {self.misses} parsed"
@@ -3,18 +3,21 @@ import argparse
 
 from tesco.parser import TescoParser
 from console import Console
+from html_backend import BACKENDS, DEFAULT_BACKEND
 
 def main():
     parser = argparse.ArgumentParser(description="Tesco Parser")
     parser.add_argument("--color", action="store_true", help="Show ANSI progress bar")
     parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True, help="Reuse parsed records of unchanged files (parse_cache.sqlite in the raw data directory)")
+    parser.add_argument("--html-backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="Tree builder for BeautifulSoup (lxml is faster; see check_html_backends.py)")
     args = parser.parse_args()
 
     console = Console(total=0, use_colors=args.color)
     console.start()
     
     try:
-        parser = TescoParser(console=console)
+        parser = TescoParser(console=console, use_cache=args.cache, html_backend=args.html_backend)
         parser.run(workers=args.workers)
     finally:
         console.finish()
@@ -3,6 +3,7 @@ import argparse
 
 from wolt.parser import WoltParser, VENUES
 from console import Console
+from html_backend import BACKENDS, DEFAULT_BACKEND
 
 def run(store_name=None):
     parser = argparse.ArgumentParser(description="Wolt Parser")
@@ -12,6 +13,8 @@ def run(store_name=None):
     parser.add_argument("--output", type=str, help="Custom output JSON path")
     parser.add_argument("--workers", type=int, help="Number of parallel processes (default: CPU/2)")
     parser.add_argument("--color", action="store_true", help="Show ANSI progress bar")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=True, help="Reuse parsed records of unchanged files (parse_cache.sqlite in the raw data directory)")
+    parser.add_argument("--html-backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="Tree builder for BeautifulSoup (lxml is faster; see check_html_backends.py)")
     args = parser.parse_args()
 
     # Determine params
@@ -41,7 +44,9 @@ def run(store_name=None):
             data_dir=data_dir,
             store_name=args_store_name,
             output_path=output_path,
-            console=console
+            console=console,
+            use_cache=args.cache,
+            html_backend=args.html_backend
         )
         wolt_parser.run(workers=args.workers)
     finally:
@@ -0,0 +1,413 @@
+"""
+Raw Store: Packed, content-addressed archive for crawled pages.
+
+Overview:
+Instead of one small gzip file per page, pages are appended to a few large segment
+files (pack/segment-000001.pack) and located through an SQLite index (pack/index.sqlite)
+holding key, origin URL, segment, offset, length and the SHA-1 of the page content.
+CI caches and artifacts then move a handful of files instead of tens of thousands.
+
+Key Features:
+1. Content Addressing: put() of a page whose hash matches the stored one is a no-op.
+2. Per-Record Compression: Each record is an independent gzip or zstd frame (see
+   raw_codec.py), so a page is read back with a single seek + read (random access).
+3. Append-Only Segments: A new version is appended and the index row repointed.
+   Segments roll over at segment_size; compact() rewrites live records and drops
+   the old segments.
+4. Process-Safe Reads: entries() returns PackEntry tuples; parser worker processes
+   read them with read_entry() (plain file I/O, no SQLite connection needed).
+
+Keys are the file names of the loose layout without ".gz" (e.g. "product_64ca0b7c.html"),
+so code that dispatches on file names keeps working. A store has one writing process;
+crawler worker threads share a single PackStore.
+"""
+import collections
+import glob
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import raw_codec
+
+PACK_DIR = "pack"
+INDEX_NAME = "index.sqlite"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".pack"
+PAGE_SUFFIXES = ('.html', '.html.gz', '.html.zst')
+# Fewer pages than this are not worth training a zstd dictionary on
+MIN_TRAINING_SAMPLES = 20
+
+PackEntry = collections.namedtuple(
+    "PackEntry", ["key", "url", "segment", "offset", "length", "hash", "stored_at"]
+)
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def pack_path(directory):
+    return os.path.join(directory, PACK_DIR)
+
+
+def has_pack(directory):
+    return os.path.exists(os.path.join(pack_path(directory), INDEX_NAME))
+
+
+def strip_compression_suffix(name):
+    for suffix in raw_codec.SUFFIXES.values():
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def read_entry(entry):
+    """
+    Returns the raw bytes of a packed page.
+    """
+    with open(entry.segment, 'rb') as f:
+        f.seek(entry.offset)
+        record = f.read(entry.length)
+    # Dictionaries live in the raw data directory, one level above pack/
+    return raw_codec.decompress(record, os.path.dirname(os.path.dirname(entry.segment)))
+
+
+def read_raw(source):
+    """
+    Returns the bytes of a page given either a PackEntry or a loose file path
+    (.gz, .zst or plain).
+    """
+    if isinstance(source, PackEntry):
+        return read_entry(source)
+    return raw_codec.read_file(source)
+
+
+def read_page(source):
+    """
+    Returns the decoded HTML of a page (PackEntry or loose file path).
+    """
+    return read_raw(source).decode('utf-8')
+
+
+def source_name(source):
+    """
+    File-style name of a page source (the pack key or the loose file's base name).
+    """
+    if isinstance(source, PackEntry):
+        return source.key
+    return os.path.basename(source)
+
+
+def source_size(source):
+    """
+    Stored (compressed) size of a page source in bytes, 0 if a loose file is gone.
+    """
+    if isinstance(source, PackEntry):
+        return source.length
+    try:
+        return os.path.getsize(source)
+    except OSError:
+        return 0
+
+
+def list_pages(directory, recursive=False, suffixes=PAGE_SUFFIXES):
+    """
+    Returns all page sources in a raw data directory: packed entries plus loose files
+    that are not shadowed by a packed page with the same key.
+    """
+    sources = []
+    packed = set()
+    if has_pack(directory):
+        keys = tuple(set(strip_compression_suffix(s) for s in suffixes))
+        with PackStore(directory) as store:
+            for entry in store.entries():
+                if entry.key.endswith(keys):
+                    sources.append(entry)
+                    packed.add(entry.key)
+
+    if recursive:
+        candidates = glob.glob(os.path.join(directory, '**', '*'), recursive=True)
+    else:
+        candidates = glob.glob(os.path.join(directory, '*'))
+    for path in candidates:
+        if not path.endswith(suffixes):
+            continue
+        key = strip_compression_suffix(os.path.basename(path))
+        if key not in packed:
+            sources.append(path)
+    return sources
+
+
+def open_codec(directory, name="gzip", level=None, train=True, samples=200):
+    """
+    Returns a RawCodec for a raw data directory. For zstd without a trained dictionary,
+    one is trained on a random sample of the directory's existing pages (when train is
+    set and there are enough of them).
+    """
+    if name == "zstd" and train and raw_codec.latest_dictionary(directory) is None:
+        train_directory(directory, samples=samples)
+    return raw_codec.RawCodec(directory, name, level=level)
+
+
+def train_directory(directory, samples=200, log_func=print):
+    """
+    Trains a zstd dictionary on up to `samples` random pages of a raw data directory.
+    Returns the dictionary ID, or None if there are too few pages.
+    """
+    sources = list_pages(directory)
+    if len(sources) < MIN_TRAINING_SAMPLES:
+        return None
+    sample = random.sample(sources, min(samples, len(sources)))
+    try:
+        dict_id = raw_codec.train_dictionary(directory, [read_raw(source) for source in sample])
+    except raw_codec.zstandard.ZstdError as e:
+        log_func(f"Could not train zstd dictionary for {directory}: {e}")
+        return None
+    log_func(f"Trained zstd dictionary {dict_id} on {len(sample)} pages from {directory}")
+    return dict_id
+
+
+class PackStore:
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, codec=None):
+        self.directory = pack_path(directory)
+        self.segment_size = segment_size
+        self.codec = codec or raw_codec.RawCodec(directory, "gzip", level=6)
+        self.written = 0
+        self.unchanged = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Crawler worker threads share the store; the lock serializes appends
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.directory, INDEX_NAME), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        self._writer = None
+        self._segment_no = max(self._segment_numbers(), default=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return numbers
+
+    def _segment_name(self, number):
+        return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+    def _append(self, record):
+        """
+        Appends a record to the current segment (rolling over when full).
+        Returns (segment name, offset).
+        """
+        if self._writer is None:
+            self._writer = open(os.path.join(self.directory, self._segment_name(self._segment_no)), 'ab')
+        offset = self._writer.tell()
+        if offset and offset + len(record) > self.segment_size:
+            self._writer.close()
+            self._segment_no += 1
+            self._writer = open(os.path.join(self.directory, self._segment_name(self._segment_no)), 'ab')
+            offset = self._writer.tell()
+        self._writer.write(record)
+        # Data must be readable before the index points at it
+        self._writer.flush()
+        return self._segment_name(self._segment_no), offset
+
+    def _to_entry(self, row):
+        key, url, segment, offset, length, digest, stored_at = row
+        return PackEntry(key, url, os.path.join(self.directory, segment), offset, length, digest, stored_at)
+
+    def put(self, key, data, url=None, stored_at=None):
+        """
+        Stores a page. Returns False if the stored copy already has the same content.
+        stored_at defaults to now (pass the file mtime when migrating saved pages).
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = content_hash(data)
+
+        with self._lock:
+            row = self.conn.execute("SELECT hash FROM pages WHERE key = ?", (key,)).fetchone()
+            if row and row[0] == digest:
+                self.unchanged += 1
+                return False
+
+        # Compress outside the lock, so concurrent writers only serialize the append
+        record = self.codec.compress(data)
+        with self._lock:
+            segment, offset = self._append(record)
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO pages (key, url, segment, offset, length, hash, stored_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, url, segment, offset, len(record), digest,
+                     time.time() if stored_at is None else stored_at)
+                )
+            self.written += 1
+        return True
+
+    def entry(self, key):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT key, url, segment, offset, length, hash, stored_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def get(self, key):
+        """
+        Returns the bytes stored under key, or None.
+        """
+        entry = self.entry(key)
+        return read_entry(entry) if entry else None
+
+    def __contains__(self, key):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM pages WHERE key = ?", (key,)).fetchone() is not None
+
+    def entries(self, suffix=None):
+        """
+        Returns PackEntry tuples in storage order (sequential reads), optionally
+        limited to keys ending with suffix.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, url, segment, offset, length, hash, stored_at FROM pages ORDER BY segment, offset"
+            ).fetchall()
+        return [self._to_entry(row) for row in rows if suffix is None or row[0].endswith(suffix)]
+
+    def __iter__(self):
+        """
+        Yields (entry, bytes) for every stored page.
+        """
+        for entry in self.entries():
+            yield entry, read_entry(entry)
+
+    def stats(self):
+        """
+        Returns a dict with page count, segment count, total and live bytes.
+        """
+        with self._lock:
+            pages, live = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM pages").fetchone()
+        segments = [os.path.join(self.directory, self._segment_name(n)) for n in self._segment_numbers()]
+        return {
+            "pages": pages,
+            "segments": len(segments),
+            "total_bytes": sum(os.path.getsize(s) for s in segments),
+            "live_bytes": live,
+        }
+
+    def compact(self):
+        """
+        Rewrites live records into fresh segments and deletes the old ones, reclaiming
+        space held by superseded page versions. Returns the number of bytes reclaimed.
+        """
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            old_numbers = self._segment_numbers()
+            old_size = sum(os.path.getsize(os.path.join(self.directory, self._segment_name(n))) for n in old_numbers)
+
+            rows = self.conn.execute(
+                "SELECT key, segment, offset, length FROM pages ORDER BY segment, offset"
+            ).fetchall()
+            self._segment_no = max(old_numbers, default=0) + 1
+            moves = []
+            handles = {}
+            try:
+                for key, segment, offset, length in rows:
+                    f = handles.get(segment)
+                    if f is None:
+                        f = handles[segment] = open(os.path.join(self.directory, segment), 'rb')
+                    f.seek(offset)
+                    new_segment, new_offset = self._append(f.read(length))
+                    moves.append((new_segment, new_offset, key))
+            finally:
+                for f in handles.values():
+                    f.close()
+
+            with self.conn:
+                self.conn.executemany("UPDATE pages SET segment = ?, offset = ? WHERE key = ?", moves)
+            for n in old_numbers:
+                os.remove(os.path.join(self.directory, self._segment_name(n)))
+
+            new_size = sum(os.path.getsize(os.path.join(self.directory, self._segment_name(n)))
+                           for n in self._segment_numbers())
+        return old_size - new_size
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self.conn.close()
+
+
+def pack_directory(directory, delete=False, codec=None, log_func=print):
+    """
+    Moves loose pages, Kupi sidecar files (.html.gz, .html.zst, .html, .links.txt,
+    .meta.json) and Wolt captures (.capture.json.*) of a raw data directory into its pack. With delete=True the loose files
+    are removed once packed. Entries keep the file's mtime as stored_at and the origin
+    URL of the page's .meta.json sidecar. Returns the number of files packed.
+    """
+    patterns = ('*.html.gz', '*.html.zst', '*.html', '*.links.txt', '*.meta.json',
+                '*.capture.json.gz', '*.capture.json.zst')
+    paths = sorted(p for pattern in patterns for p in glob.glob(os.path.join(directory, pattern)))
+    if not paths:
+        return 0
+
+    # Origin URLs from the Kupi .meta.json sidecars, by page key
+    urls = {}
+    for path in paths:
+        if path.endswith('.meta.json'):
+            try:
+                with open(path, 'r') as f:
+                    url = json.load(f).get('origin_url')
+            except Exception:
+                continue
+            if url:
+                urls[os.path.basename(path)[:-len('.meta.json')]] = url
+
+    count = 0
+    with PackStore(directory, codec=codec) as store:
+        for path in paths:
+            key = strip_compression_suffix(os.path.basename(path))
+            try:
+                data = read_raw(path)
+                stored_at = os.path.getmtime(path)
+            except Exception as e:
+                log_func(f"Skipping unreadable {path}: {e}")
+                continue
+            page_key = key
+            for suffix in ('.meta.json', '.links.txt'):
+                if page_key.endswith(suffix):
+                    page_key = page_key[:-len(suffix)]
+            # Keep the save time, so --max-age freshness survives packing
+            store.put(key, data, urls.get(page_key), stored_at=stored_at)
+            count += 1
+            if delete:
+                os.remove(path)
+    log_func(f"Packed {count} files from {directory}")
+    return count
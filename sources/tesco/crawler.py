@@ -1,17 +1,22 @@
 """
 Tesco Crawler: Parallel Selenium-based crawler.
 Navigates exclusively by clicking. Supports multi-window parallelism and resume.
+In listing mode, products are captured from the category pages' Apollo state and only
+incomplete ones are opened (see listing.py). In fragment mode, only the parts of a page
+the parser reads are saved (see fragments.py).
 """
-import os
+import hashlib
 import time
-import gzip
 import urllib.parse
 import json
 import threading
 
 
-from . import crawler_category
-from .crawler_product import extract_product_data, wait_for_product_page_ready
+from crawl_state import JournaledState
+from . import crawler_category, listing
+from .crawler_product import extract_product_data, extract_product_fragment, wait_for_product_page_ready
+from drivers import record_page
+from page_writer import PageWriter
 
 
 # Categories to crawl
@@ -31,88 +36,39 @@ CATEGORIES = [
     "Domov a zábava"
 ]
 
-class CrawlerState:
+class CrawlerState(JournaledState):
+    """
+    Processed products, per-unit page checkpoints and the category hierarchy,
+    journaled to tesco_state.json(.journal) (see crawl_state.py).
+    """
     def __init__(self, filepath="data/tesco_raw/tesco_state.json"):
-        self.filepath = filepath
-        self.lock = threading.Lock()
-        self.data = self.load()
+        super().__init__(filepath, sets=("processed_products",), maps=("checkpoints",))
 
-    def load(self):
-        """
-        Loads the crawler state from the JSON file, preserving only processed products and the category tree structure.
-        """
-        default = {
-            "processed_products": [],
-            "tree": {} # Hierarchy
-        }
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r') as f:
-                    data = json.load(f)
-                    # Only preserve products and tree
-                    default["processed_products"] = data.get("processed_products", [])
-                    default["tree"] = data.get("tree", {})
-            except: pass
-        return default
-
-    def save(self):
+    def mark_product(self, href, breadcrumbs=None):
         """
-        Persists the current state (processed products and hierarchy tree) to disk atomically.
+        Marks a product URL as processed and updates the category tree with its breadcrumbs.
         """
-        with self.lock:
-            # Atomic-ish persistence: reload from disk to ensure we don't lose
-            # changes from other parallel workers/processes
-            on_disk = {}
-            if os.path.exists(self.filepath):
-                try:
-                    with open(self.filepath, 'r') as f:
-                         on_disk = json.load(f)
-                except: pass
-            
-            # Merge processed_products list
-            disk_prods = on_disk.get("processed_products", [])
-            merged_products = list(set(self.data["processed_products"]) | set(disk_prods))
-            self.data["processed_products"] = merged_products
-            
-            # Merge Tree
-            disk_tree = on_disk.get("tree", {})
-            def merge_trees(d1, d2):
-                for k, v in d2.items():
-                    if k in d1 and isinstance(d1[k], dict) and isinstance(v, dict):
-                        merge_trees(d1[k], v)
-                    else:
-                        d1[k] = v
-            merge_trees(self.data["tree"], disk_tree)
-            
-            # Only save products and tree
-            to_save = {
-                "processed_products": self.data["processed_products"],
-                "tree": self.data["tree"]
-            }
-            
-            temp_path = self.filepath + ".tmp"
-            with open(temp_path, 'w') as f:
-                json.dump(to_save, f, indent=2)
-            os.replace(temp_path, self.filepath)
+        self.add("processed_products", href)
+        self.add_path(breadcrumbs)
 
-    def mark_product(self, href, breadcrumbs=None):
+    def checkpoint(self, unit):
         """
-        Marks a product URL as processed and updates the category tree with its breadcrumbs.
+        Returns the last page reached in a work unit as {"page", "url"}, or None.
         """
-        with self.lock:
-            if href not in self.data["processed_products"]:
-                self.data["processed_products"].append(href)
-            
-            if breadcrumbs:
-                curr = self.data["tree"]
-                for b in breadcrumbs:
-                    if b not in curr:
-                        curr[b] = {}
-                    curr = curr[b]
+        return self.data["checkpoints"].get(checkpoint_key(unit))
 
+    def save_checkpoint(self, unit, page, url):
+        self.set_item("checkpoints", checkpoint_key(unit), {"page": page, "url": url})
+        self.save()
 
+    def clear_checkpoint(self, unit):
+        self.set_item("checkpoints", checkpoint_key(unit), None)
+        self.save()
 
 
+def checkpoint_key(unit):
+    # Splitting a category keeps the first page, so the key survives the split
+    return f"{unit.category}|{unit.first_page}"
 
 
 class GlobalCounter:
@@ -132,12 +88,19 @@ class GlobalCounter:
 
 
 class TescoWorker:
-    def __init__(self, state, console=None, base_dir="data/tesco_raw", driver_pool=None, global_counter=None):
+    def __init__(self, state, console=None, base_dir="data/tesco_raw", driver_pool=None, global_counter=None, raw_store=None, codec=None, listing=False, queue=None,
+                 fragments=False, writer=None):
         self.start_url = "https://nakup.itesco.cz/groceries/cs-CZ/"
         self.state = state
         self.console = console
         self.base_dir = base_dir
+        # Pages are written by the shared background writer (inline without one)
+        self.writer = writer or PageWriter(base_dir, raw_store, codec, threads=0, log_func=self.log)
         self.global_counter = global_counter
+        self.listing = listing
+        self.fragments = fragments
+        self.queue = queue
+        self.unit = None
         self.driver_pool = driver_pool
         self.driver = driver_pool.acquire()
 
@@ -152,30 +115,47 @@ class TescoWorker:
         else:
             print(msg)
 
-    def crawl_category(self, cat_name, limit=0):
+    def crawl_category(self, unit, limit=0):
         """
-        Crawls a single category, navigating through pagination and visiting individual product pages
-        to extract data. returns True if successful, False if a retry is needed.
+        Crawls a work unit (a category or a page range of one), navigating through pagination
+        and visiting individual product pages to extract data. The first unit of a category is
+        split into page ranges for other workers. returns True if successful, False if a retry
+        is needed (self.unit is then the unit to retry).
         """
+        self.unit = unit
         if self.global_counter and self.global_counter.is_reached():
              return True
 
-        self.log(f"Worker starting category: {cat_name}", notice=True)
+        cat_name = unit.category
+        tag = unit.label
+
+        self.log(f"Worker starting category: {tag}", notice=True)
         if not crawler_category.navigate_to_category(self.driver, cat_name, self.log):
             return False
 
-        page_num = 1
-        # Always start from page 1
-
+        page_num = unit.first_page
+        checkpoint = self.state.checkpoint(unit)
+        if checkpoint and checkpoint["page"] > page_num:
+            # Resume where the previous attempt stopped instead of clicking through every page
+            page_num = checkpoint["page"]
+            self.log(f"[{tag}] Resuming at page {page_num}")
+            self.driver.get(checkpoint["url"])
+            if not crawler_category.wait_for_category_page_ready(self.driver, self.log):
+                self.log(f"[{tag}] Failed to load page {page_num}")
+                return False
+        elif page_num > 1 and not crawler_category.go_to_page(self.driver, page_num, self.log):
+            self.log(f"[{tag}] Failed to load page {page_num}")
+            return False
+        split_checked = False
 
         while True:
             # Check global limit
             if self.global_counter and self.global_counter.is_reached():
-                 self.log(f"[{cat_name}] Global limit reached. Stopping.")
+                 self.log(f"[{tag}] Global limit reached. Stopping.")
                  return True
 
             if "Access Denied" in self.driver.page_source:
-                self.log(f"[{cat_name}] Access Denied. Cooling down...")
+                self.log(f"[{tag}] Access Denied. Cooling down...")
                 time.sleep(60)
                 self.driver.refresh()
                 continue
@@ -185,17 +165,32 @@ class TescoWorker:
                  # If we found no products on page 1, might be empty category or error.
                  # If page > 1, it might be end of list, but usually next_page check handles that.
                  # If we are here, something might be wrong with loading.
-                 if page_num == 1:
-                     self.log(f"[{cat_name}] No products found on page 1. Potentially failed load.")
+                 if page_num == unit.first_page:
+                     self.log(f"[{tag}] No products found on page {page_num}. Potentially failed load.")
                      return False
                  break
 
-            self.log(f"[{cat_name}] Page {page_num}: Found {len(hrefs)} products")
+            self.log(f"[{tag}] Page {page_num}: Found {len(hrefs)} products")
+            self.state.save_checkpoint(unit, page_num, self.driver.current_url)
+
+            if self.queue and not split_checked and unit.first_page == 1 and unit.last_page is None:
+                split_checked = True
+                total_pages = crawler_category.get_page_count(self.driver, len(hrefs))
+                unit = self.unit = self.queue.split(unit, total_pages)
+                if unit.last_page is not None:
+                    tag = unit.label
+                    self.log(f"[{tag}] Split {cat_name} ({total_pages} pages) into units of {self.queue.pages_per_unit} pages")
+
+            if self.listing:
+                hrefs, limit_reached = self.capture_listing(cat_name, page_num, hrefs)
+                if limit_reached:
+                    self.log(f"[{tag}] Global limit reached. Stopping.")
+                    return True
             
             products_in_cat = 0
             for idx, href in enumerate(hrefs):
                 if limit > 0 and products_in_cat >= limit:
-                   self.log(f"[{cat_name}] Reached limit of {limit} products.")
+                   self.log(f"[{tag}] Reached limit of {limit} products.")
                    return True
 
                 if href in self.state.data["processed_products"]:
@@ -204,7 +199,7 @@ class TescoWorker:
                 try:
                     if crawler_category.click_product_link(self.driver, href):
                         if not wait_for_product_page_ready(self.driver, self.log):
-                            self.log(f"[{cat_name}/{page_num}] Failed to load product page for {href}")
+                            self.log(f"[{tag}/{page_num}] Failed to load product page for {href}")
                             # If product page fails, we might want to restart category or continue. 
                             # User said "if a category OR product page do not load properly... interrupted" implies restart.
                             return False
@@ -215,40 +210,33 @@ class TescoWorker:
                         # Extract breadcrumbs (also included in preparsed_data for convenience)
                         breadcrumbs = preparsed_data.get('breadcrumbs', [])
                         
-                        # Save with preparsed data
-                        filename = self.save_html(self.driver.page_source, self.driver.current_url, preparsed_data)
+                        # Save with preparsed data; marked processed once written
+                        self.save_html(self.page_content(), self.driver.current_url, preparsed_data,
+                                       on_done=lambda path, href=href, breadcrumbs=breadcrumbs:
+                                           self.state.mark_product(href, breadcrumbs=breadcrumbs))
                         
                         # Logging
                         product_id = href.split('/')[-1]
                         prod_name = preparsed_data.get('name', 'Unknown')
 
 
-                        self.log(f"[{cat_name}/{page_num}] {prod_name}")
+                        self.log(f"[{tag}/{page_num}] {prod_name}")
 
-                        self.state.mark_product(href, breadcrumbs=breadcrumbs)
                         products_in_cat += 1
-                        
-                        if self.console:
-                            total_prod = len(self.state.data["processed_products"])
-                            
-                            # Dynamically update total if we exceed it
-                            if hasattr(self.console, 'total') and total_prod >= self.console.total:
-                                self.console.total = total_prod + 500
-                                
-                            self.console.update(total_prod, stats=f"Cats: --/{len(CATEGORIES)}")
+                        self.update_progress()
                         
                         # Increment global counter
                         if self.global_counter:
                             if not self.global_counter.increment():
-                                self.log(f"[{cat_name}] Global limit reached. Stopping.")
+                                self.log(f"[{tag}] Global limit reached. Stopping.")
                                 return True
 
                         self.driver.back()
                         if not crawler_category.wait_for_category_page_ready(self.driver, self.log):
-                             self.log(f"[{cat_name}] Failed to reload category listing")
+                             self.log(f"[{tag}] Failed to reload category listing")
                              return False
                 except Exception as e:
-                    self.log(f"[{cat_name}/{page_num}] Product error: {e}")
+                    self.log(f"[{tag}/{page_num}] Product error: {e}")
                     # If error is severe enough, return False to restart
                     return False
             
@@ -258,47 +246,135 @@ class TescoWorker:
             # Save progress after finishing page
             self.state.save()
 
+            if unit.last_page is not None and page_num >= unit.last_page:
+                self.log(f"[{tag}] End of page range. Completing unit.")
+                break
+
             if crawler_category.click_next_page(self.driver):
-                self.log(f"[{cat_name}] Moving to page {page_num + 1}...")
+                self.log(f"[{tag}] Moving to page {page_num + 1}...")
                 
                 # Wait for load using specific elements
                 if not crawler_category.wait_for_category_page_ready(self.driver, self.log):
-                    self.log(f"[{cat_name}] Failed to load next page content") 
+                    self.log(f"[{tag}] Failed to load next page content") 
                     return False
                 
                 page_num += 1
                 self.state.save()
             else:
-                self.log(f"[{cat_name}] No next page found. Completing category.")
-                if self.console:
-                    total_prod = len(self.state.data["processed_products"])
-                    self.console.update(total_prod, stats=f"Cats: --/{len(CATEGORIES)}")
+                self.log(f"[{tag}] No next page found. Completing category.")
+                self.update_progress()
                 self.state.save()
                 break
 
-        self.log(f"Worker finished category: {cat_name}")
+        self.state.clear_checkpoint(unit)
+        self.log(f"Worker finished: {tag}")
         return True
 
-    def save_html(self, content, url, preparsed_data=None):
+    def update_progress(self):
         """
-        Compresses and saves the HTML content to a gzipped file, including metadata in a header comment.
+        Shows the number of processed products in the console.
+        """
+        if self.console:
+            total_prod = len(self.state.data["processed_products"])
+
+            # Dynamically update total if we exceed it
+            if hasattr(self.console, 'total') and total_prod >= self.console.total:
+                self.console.total = total_prod + 500
+
+            stats = self.queue.stats() if self.queue else f"Cats: --/{len(CATEGORIES)}"
+            self.console.update(total_prod, stats=stats)
+
+    def capture_listing(self, cat_name, page_num, hrefs):
+        """
+        Listing mode: saves the current category page together with the Apollo entities
+        of its fully described products and marks those processed.
+        Returns (hrefs that still need a detail page visit, global limit reached).
+        """
+        pending = [h for h in hrefs if h not in self.state.data["processed_products"]]
+        if not pending:
+            return [], False
+
+        state = listing.extract_listing_state(self.driver)
+        products, entities, incomplete = listing.split_listing(state, pending)
+        for product in products:
+            product["breadcrumbs"] = listing.listing_breadcrumbs(entities[product["key"]], cat_name)
+
+        if products:
+            # The metadata carries everything the parser needs; a fragment listing has no body
+            content = "" if self.fragments else self.driver.page_source
+            self.save_listing(content, self.driver.current_url, cat_name, page_num, products, entities,
+                              on_done=lambda path: self.mark_listing(products))
+
+        self.log(f"[{cat_name}/{page_num}] Listing: {len(products)} products captured, {len(incomplete)} need detail pages")
+
+        for product in products:
+            if self.global_counter and not self.global_counter.increment():
+                self.update_progress()
+                return incomplete, True
+        self.update_progress()
+        return incomplete, False
+
+    def mark_listing(self, products):
+        for product in products:
+            self.state.mark_product(product["product_url"], breadcrumbs=product["breadcrumbs"])
+
+    def save_listing(self, content, url, cat_name, page_num, products, entities, on_done=None):
+        """
+        Saves a category page in listing mode. The metadata carries the listed products
+        and their Apollo entities, so the parser needs no DOM.
+
+        Only the page's pending products are saved, so the name includes a hash of
+        their keys: a later capture of the same page (other products pending, or the
+        products shifted) adds a file instead of replacing the earlier one.
+        """
+        parsed = urllib.parse.urlparse(url)
+        digest = hashlib.sha1("\n".join(sorted(p["key"] for p in products)).encode('utf-8')).hexdigest()[:12]
+        name = "listing_" + parsed.path.strip('/').replace('/', '_') + f"__page-{page_num}__{digest}"
+
+        meta = {
+            "origin_url": url,
+            "listing": {
+                "category": cat_name,
+                "page": page_num,
+                "products": products,
+                "apollo": entities
+            }
+        }
+        return self.write_page(name, meta, content, url, on_done)
+
+    def page_content(self):
+        """
+        The current page to save: its fragments in fragment mode, else the full source.
+        """
+        if self.fragments:
+            return extract_product_fragment(self.driver)
+        return self.driver.page_source
+
+    def save_html(self, content, url, preparsed_data=None, on_done=None):
+        """
+        Queues the HTML content for saving to a .html.gz / .html.zst file (or the pack
+        store), including metadata in a header comment. on_done(path) runs once written.
         """
         parsed = urllib.parse.urlparse(url)
         name = parsed.path.strip('/').replace('/', '_')
-        filepath = os.path.join(self.base_dir, name + ".html.gz")
         
         meta = {
             "origin_url": url,
             "preparsed": preparsed_data or {}
         }
+        return self.write_page(name, meta, content, url, on_done)
+
+    def write_page(self, name, meta, content, url, on_done=None):
+        """
+        Hands a page with its metadata header to the writer (pack store or loose file).
+        """
+        record_page(self.driver)
+        if self.fragments:
+            meta["fragment"] = True
+
         # Save meta as a JSON comment at the top
-        comment = f"<!-- META_JSON: {json.dumps(meta, ensure_ascii=False)} -->\n".encode('utf-8')
-        
-        temp_path = filepath + ".tmp"
-        with gzip.open(temp_path, 'wb') as f:
-            f.write(comment + content.encode('utf-8'))
-        os.replace(temp_path, filepath)
-        return filepath
+        comment = f"<!-- META_JSON: {json.dumps(meta, ensure_ascii=False)} -->\n"
+        return self.writer.submit(name + ".html", (comment + content).encode('utf-8'), url, on_done)
 
     def quit(self):
         """
@@ -306,30 +382,41 @@ class TescoWorker:
         """
         self.driver_pool.release(self.driver)
 
-def run_worker(cat_name, state, console, driver_pool, global_counter, index, limit):
+def run_worker(queue, state, console, driver_pool, global_counter, index, limit, raw_store=None, codec=None, listing=False,
+               fragments=False, writer=None):
     """
-    Worker entry point that manages the lifecycle of a single category crawl, including
-    restarts on failure.
+    Worker entry point: takes work units from the shared queue until none are left,
+    restarting a unit in a new window when it fails.
     """
     # Reduced stagger
     time.sleep(index * 1)
-    
+
     while True:
-        if global_counter and global_counter.is_reached():
-             break
+        unit = queue.get()
+        if unit is None:
+            break
 
-        worker = TescoWorker(state, console=console, driver_pool=driver_pool, global_counter=global_counter)
-        try:
-            success = worker.crawl_category(cat_name, limit=limit)
-            if success:
+        while True:
+            if global_counter and global_counter.is_reached():
+                queue.close()
                 break
-            else:
-                console.log(f"[{cat_name}] Task failed or interrupted. Restarting category from scratch in new window...")
-        except Exception as e:
-            console.log(f"[{cat_name}] Critical worker error: {e}. Restarting...")
-        finally:
-            worker.quit()
-        
-        time.sleep(5) # Cooldown before restart
-
 
+            worker = TescoWorker(state, console=console, driver_pool=driver_pool, global_counter=global_counter,
+                                 raw_store=raw_store, codec=codec, listing=listing, queue=queue,
+                                 fragments=fragments, writer=writer)
+            try:
+                success = worker.crawl_category(unit, limit=limit)
+                if success:
+                    break
+                else:
+                    console.log(f"[{unit.label}] Task failed or interrupted. Restarting unit in new window...")
+            except Exception as e:
+                console.log(f"[{unit.label}] Critical worker error: {e}. Restarting...")
+            finally:
+                # The unit may have been split while crawling
+                unit = worker.unit or unit
+                worker.quit()
+
+            time.sleep(5) # Cooldown before restart
+
+        queue.done(unit)
@@ -1,8 +1,11 @@
-import time
+import math
+import re
+import urllib.parse
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from . import crawler_global
+from waits import wait_for_element, wait_for_settled
 
 START_URL = "https://nakup.itesco.cz/groceries/cs-CZ/"
 
@@ -14,7 +17,7 @@ def click_btn(driver, selector, timeout=10):
         wait = WebDriverWait(driver, timeout)
         btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", btn)
-        time.sleep(0.3)
+        wait_for_settled(driver, "tesco.click_btn.scroll", quiet_ms=100)
         btn.click()
         return True
     except: return False
@@ -46,7 +49,7 @@ def navigate_to_category(driver, cat_name, log_func=print):
     and drills down to the specified category.
     """
     driver.get(START_URL)
-    time.sleep(1)
+    wait_for_settled(driver, "tesco.start_page")
     
     # Reject cookies if prompt is displayed
     if not click_btn(driver, 'button#onetrust-reject-all-handler', timeout=3):
@@ -72,7 +75,8 @@ def navigate_to_category(driver, cat_name, log_func=print):
         log_func(f"[{cat_name}] Could not click All Departments menu")
         return False
 
-    time.sleep(2.0) # Wait for animation/render
+    # Wait for the menu to render its items
+    wait_for_element(driver, ".ddsweb-local-navigation__submenu-item", "tesco.menu_open")
 
     try:
         # Try to find the link with Wait - Use partial link text to safely handle whitespace
@@ -90,14 +94,14 @@ def navigate_to_category(driver, cat_name, log_func=print):
             cat_link = wait.until(EC.visibility_of_element_located((By.PARTIAL_LINK_TEXT, cat_name)))
 
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", cat_link)
-        time.sleep(0.5)
+        wait_for_settled(driver, "tesco.menu_scroll", quiet_ms=100)
         # Click the item (submenu trigger) - prefer button inside if exists
         try:
             btn_in_link = cat_link.find_element(By.TAG_NAME, "button")
             driver.execute_script("arguments[0].click();", btn_in_link)
         except:
             driver.execute_script("arguments[0].click();", cat_link)
-        time.sleep(1.0)
+        wait_for_settled(driver, "tesco.submenu_open", require_change=True)
         
         # Now find the target "Show all" link scoped to this menu item
         target_link = None
@@ -127,7 +131,7 @@ def navigate_to_category(driver, cat_name, log_func=print):
         if target_link:
             log_func(f"[{cat_name}] Clicking sub-link: {target_link.text}")
             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", target_link)
-            time.sleep(0.2)
+            wait_for_settled(driver, "tesco.sublink_scroll", quiet_ms=100)
             driver.execute_script("arguments[0].click();", target_link)
         else:
             log_func(f"[{cat_name}] Could not find navigation link (All/Name) after opening menu.")
@@ -166,7 +170,7 @@ def click_product_link(driver, href):
         
         if target:
             driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", target)
-            time.sleep(0.1)
+            wait_for_settled(driver, "tesco.product_link_scroll", quiet_ms=50)
             target.click()
             return True
     except:
@@ -184,7 +188,40 @@ def click_next_page(driver):
 
     if next_btn and next_btn.is_displayed() and "disabled" not in next_btn.get_attribute("class"):
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_btn)
-        time.sleep(0.5)
+        wait_for_settled(driver, "tesco.next_page_scroll", quiet_ms=100)
         driver.execute_script("arguments[0].click();", next_btn)
         return True
     return False
+
+def get_page_count(driver, page_size):
+    """
+    Estimates the number of listing pages from the pagination result count
+    (e.g. "1-24 z 1 234 položek") and the number of products on the current page.
+    Returns 0 if unknown.
+    """
+    try:
+        text = driver.find_element(By.CSS_SELECTOR, '[data-testid="pagination-result-count"]').text
+    except:
+        return 0
+    # Thousands may be separated by (non-breaking) spaces
+    numbers = [int(re.sub(r'\D', '', n)) for n in re.findall(r'\d[\d\s\xa0]*', text) if re.sub(r'\D', '', n)]
+    if not numbers or page_size <= 0:
+        return 0
+    return math.ceil(max(numbers) / page_size)
+
+def page_url(url, page):
+    """
+    Returns the listing URL of the given page number.
+    """
+    parsed = urllib.parse.urlparse(url)
+    query = dict(urllib.parse.parse_qsl(parsed.query))
+    query["page"] = str(page)
+    return urllib.parse.urlunparse(parsed._replace(query=urllib.parse.urlencode(query)))
+
+def go_to_page(driver, page, log_func=print):
+    """
+    Opens the given page of the current category listing. Pagination links are only
+    rendered around the current page, so far pages are loaded by URL.
+    """
+    driver.get(page_url(driver.current_url, page))
+    return wait_for_category_page_ready(driver, log_func)
@@ -3,6 +3,26 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import json
 from . import crawler_global
+from fragments import extract_fragments, json_script, script_text
+from .listing import collect_refs
+from .parser import extract_apollo_state
+
+# Everything parse_product_file reads from a product page (besides the Apollo cache)
+FRAGMENT_SELECTORS = (
+    'script[type="application/ld+json"]',
+    '.pdp-tile',
+    'h1',
+    'a.ddsweb-breadcrumb__list-item-link',
+    'button[id*="brand-details-panel"]',
+    '.gyT8MW_priceText',
+    '.ddsweb-price__subtext',
+    'img.product-image, .ddsweb-responsive-image__image',
+)
+
+BRAND_PANEL_ID_SCRIPT = """
+var button = document.querySelector('button[id*="brand-details-panel"]');
+return button ? button.getAttribute('aria-controls') : null;
+"""
 
 def wait_for_product_page_ready(driver, log_func=print):
     """
@@ -103,3 +123,23 @@ def extract_product_data(driver):
     except: pass
     
     return data
+
+def extract_product_fragment(driver):
+    """
+    Fragment mode: returns the product page reduced to what the parser reads. The
+    Apollo cache is trimmed to the page's product entity and the entities it references.
+    """
+    selectors = list(FRAGMENT_SELECTORS)
+    panel_id = driver.execute_script(BRAND_PANEL_ID_SCRIPT)
+    if panel_id:
+        selectors.append(f'[id="{panel_id}"]')
+    html = extract_fragments(driver, selectors)
+
+    state = extract_apollo_state(script_text(driver, '"apolloCache":') or "")
+    product_key = next((k for k in state if k.startswith("ProductType:")), None) if state else None
+    if product_key:
+        entities = {product_key: state[product_key]}
+        collect_refs(state, state[product_key], entities)
+        apollo = json.dumps({"apolloCache": entities}, ensure_ascii=False, separators=(',', ':'))
+        html = json_script(apollo) + "\n" + html
+    return html
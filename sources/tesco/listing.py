@@ -0,0 +1,108 @@
+"""
+Tesco Listing Capture: Reads product data straight from category listing pages.
+
+Overview:
+Category pages are hydrated from the same Apollo cache as product pages, with a
+ProductType entity for every tile. In listing mode the crawler takes title, price,
+unit price, promotions and image from those entities and saves one listing file per
+page, instead of opening every product. Products whose entity is missing or
+incomplete are still visited on their detail page.
+
+Apollo state source: the live Apollo client (covers pages reached by clicking "next")
+if the page exposes it, otherwise the apolloCache embedded in the page source.
+"""
+import json
+import re
+
+from .parser import extract_apollo_state
+
+# Returns the live Apollo cache as JSON, or null when the client isn't exposed
+LIVE_STATE_SCRIPT = """
+var client = window.__APOLLO_CLIENT__ || window.apolloClient;
+if (client && client.cache && client.cache.extract) {
+    return JSON.stringify(client.cache.extract());
+}
+return null;
+"""
+
+PRODUCT_ID_RE = re.compile(r'/products/(\d+)')
+
+
+def product_id_from_href(href):
+    m = PRODUCT_ID_RE.search(href or "")
+    return m.group(1) if m else None
+
+
+def extract_listing_state(driver):
+    """
+    Returns the Apollo state of the current listing page (dict), or None.
+    """
+    try:
+        live = driver.execute_script(LIVE_STATE_SCRIPT)
+        if live:
+            return json.loads(live)
+    except Exception:
+        pass
+    return extract_apollo_state(driver.page_source)
+
+
+def is_complete(entity):
+    """
+    True if the entity has everything the parser needs: title, price and image.
+    """
+    if not entity or not entity.get('title') or not entity.get('defaultImageUrl'):
+        return False
+    price = entity.get('price')
+    return isinstance(price, dict) and price.get('actual') is not None
+
+
+def collect_refs(state, entity, out):
+    """
+    Copies the entities referenced by `entity` (promotions, brand, ...) into out.
+    """
+    values = list(entity.values())
+    while values:
+        value = values.pop()
+        if isinstance(value, dict):
+            ref = value.get('__ref')
+            if ref:
+                if ref not in out and ref in state:
+                    out[ref] = state[ref]
+                    values.extend(state[ref].values())
+            else:
+                values.extend(value.values())
+        elif isinstance(value, list):
+            values.extend(value)
+
+
+def split_listing(state, hrefs):
+    """
+    Splits the product links of a listing page into those fully described by the
+    Apollo state and those that still need a detail page visit.
+    Returns (products, entities, incomplete): products is a list of
+    {"product_url", "key"}, entities the ProductType and referenced objects.
+    """
+    products = []
+    entities = {}
+    incomplete = []
+    for href in hrefs:
+        product_id = product_id_from_href(href)
+        key = f"ProductType:{product_id}"
+        entity = state.get(key) if state and product_id else None
+        if not is_complete(entity):
+            incomplete.append(href)
+            continue
+        products.append({"product_url": href, "key": key})
+        entities[key] = entity
+        collect_refs(state, entity, entities)
+    return products, entities, incomplete
+
+
+def listing_breadcrumbs(entity, cat_name):
+    """
+    Category path of a listed product from its Apollo taxonomy fields, or the
+    crawled top-level category.
+    """
+    names = [entity.get(field) for field in ('superDepartmentName', 'departmentName', 'aisleName', 'shelfName')]
+    names = [n for n in names if n]
+    return names or [cat_name]
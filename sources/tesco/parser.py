@@ -1,25 +1,41 @@
 """
 Tesco Parser: Extracts data from rendered Tesco product pages using Apollo Cache.
+Listing files (crawler listing mode) carry the Apollo entities of every product on a
+category page and yield one product each. Fragment files (crawler fragment mode) hold
+only the parts of a product page read here and parse like full pages.
+
+Embedded JSON (META_JSON, apolloCache, JSON-LD) is decoded straight from the HTML
+text. The BeautifulSoup DOM is built only when a field is still missing or the page
+contains Clubcard price text; the run logs how often each fallback fired.
 """
-import gzip
+import html
 import json
-from bs4 import BeautifulSoup
 import os
-import glob
 import re
 from datetime import datetime
 from collections import Counter
-import concurrent.futures
+
+from raw_store import list_pages, read_page
+from parse_cache import ParseCache
+from html_backend import DEFAULT_BACKEND, make_soup
+from parallel_map import parallel_map
+
+# Bump whenever parse_product_file's output changes (invalidates the parse cache)
+PARSER_VERSION = 1
 
 # --- Top-Level Parsing Functions (Must be picklable) ---
 
-def extract_json_ld(soup):
-    """Extract product data from JSON-LD scripts."""
-    scripts = soup.find_all('script', type='application/ld+json')
-    for script in scripts:
-        if not script.string: continue
+SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+JSON_LD_TYPE_RE = re.compile(r'\btype\s*=\s*(["\']?)application/ld\+json\1(?![^\s/>])', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s*')
+
+def extract_json_ld(content):
+    """Extract product data from JSON-LD scripts (read from the HTML text, no DOM)."""
+    for m in SCRIPT_RE.finditer(content):
+        text = m.group(2)
+        if not text or not JSON_LD_TYPE_RE.search(m.group(1)): continue
         try:
-            data = json.loads(script.string)
+            data = json.loads(text)
             # Normalise to list
             items = data if isinstance(data, list) else [data]
             
@@ -34,58 +50,199 @@ def extract_json_ld(soup):
         except: continue
     return None
 
+META_PREFIX = '<!-- META_JSON: '
+
 def extract_preparsed_data(content):
     """Extract data injected by crawler."""
     try:
-        # Look for <!-- META_JSON: { ... } --> at the beginning
-        m = re.search(r'<!-- META_JSON: (\{.*?\}) -->', content[:2000]) # Limit search to start
-        if m:
-            return json.loads(m.group(1))
+        # Look for <!-- META_JSON: { ... } --> at the beginning. Decode exactly one
+        # object, since listing metadata is large and may contain " -->"
+        start = content.find(META_PREFIX, 0, 200)
+        if start != -1:
+            meta, _ = json.JSONDecoder().raw_decode(content, start + len(META_PREFIX))
+            return meta
     except: pass
     return None
 
 def extract_apollo_state(content):
     """Extract the apolloCache object from the HTML."""
-    # Find the start of apolloCache
     start_marker = '"apolloCache":'
     start_idx = content.find(start_marker)
     if start_idx == -1:
         return None
-    
-    # We start looking after the marker
-    start_idx += len(start_marker)
-    
-    # Find the matching closing brace for the object
-    brace_count = 0
-    end_idx = -1
-    for i in range(start_idx, len(content)):
-        if content[i] == '{':
-            brace_count += 1
-        elif content[i] == '}':
-            brace_count -= 1
-            if brace_count == 0:
-                end_idx = i + 1
-                break
-    
-    if end_idx != -1:
-        try:
-            state_str = content[start_idx:end_idx]
-            return json.loads(state_str)
-        except Exception as e:
-            # print(f"JSON parsing error: {e}")
-            pass
-    return None
 
-def parse_product_file(filepath):
+    # Decode exactly one JSON value after the marker (C scanner, no brace matching)
+    m = WHITESPACE_RE.match(content, start_idx + len(start_marker))
+    try:
+        state, _ = json.JSONDecoder().raw_decode(content, m.end())
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+CLUBCARD_RE = re.compile(r'(\d+[,.]\d{2})[\s\xa0]*Kč[\s\xa0]*s[\s\xa0]*Clubcard', re.IGNORECASE)
+
+def parse_apollo_product(p_data, state, product_url, categories):
+    """
+    Maps a ProductType entity (and the objects it references) to a product dict.
+    Used for listing files; mirrors the Apollo branch of parse_product_file.
+    """
+    brand = p_data.get('brandName')
+    if not brand:
+        brand_ref = p_data.get('brand')
+        if isinstance(brand_ref, dict) and '__ref' in brand_ref:
+            brand_obj = state.get(brand_ref['__ref'])
+            brand = brand_obj.get('name') if brand_obj else None
+
+    price_info = p_data.get('price') or {}
+    uom = price_info.get('unitOfMeasure')
+    offer = {
+        'store_name': 'Tesco',
+        'price': price_info.get('actual'),
+        'unit_price': price_info.get('unitPrice'),
+        'unit': uom,
+        'package_size': None,
+        'condition': None
+    }
+    if p_data.get('displayType') == "QuantityOrWeight" and p_data.get('averageWeight'):
+        offer['package_size'] = f"~{p_data['averageWeight']} {uom}"
+    prices = [offer]
+
+    # Promotions: Clubcard flag, and the Clubcard price from the promotion text
+    for promo_ref in p_data.get('promotions') or []:
+        promo_obj = state.get(promo_ref.get('__ref')) if isinstance(promo_ref, dict) else None
+        if not promo_obj:
+            continue
+        m = CLUBCARD_RE.search(promo_obj.get('description') or '')
+        if m:
+            cc_price = float(m.group(1).replace(',', '.'))
+            prices.append({
+                'store_name': 'Tesco',
+                'price': cc_price,
+                'unit_price': cc_price,
+                'unit': 'kus',
+                'package_size': None,
+                'condition': 'Clubcard'
+            })
+            break
+        if promo_obj.get('isClubcard'):
+            offer['condition'] = 'Clubcard'
+            break
+
+    return {
+        'name': p_data.get('title') or "Unknown",
+        'brand': brand,
+        'product_url': product_url,
+        'image_url': p_data.get('defaultImageUrl'),
+        'categories': categories,
+        'prices': prices,
+    }
+
+def parse_listing(meta):
     """
-    Worker function to parse a single file.
-    Returns a list of parsed product dicts for that file.
+    Returns the products of a listing file (crawler listing mode).
     """
+    listing = meta['listing']
+    state = listing.get('apollo', {})
+    items = []
+    for product in listing.get('products', []):
+        p_data = state.get(product['key'])
+        if p_data:
+            categories = product.get('breadcrumbs') or [listing.get('category')]
+            items.append(parse_apollo_product(p_data, state, product['product_url'], categories))
+    return items
+
+# The Clubcard text search needs the DOM; this pattern over the raw HTML (entities
+# not decoded yet) matches whenever one of its text nodes can, so pages without a
+# match skip the DOM
+_SP = r'(?:\s|\xa0|&nbsp;|&#160;|&#xa0;)*'
+CLUBCARD_RAW_RE = re.compile(r'\d+[,.]\d{2}' + _SP + r'K(?:č|&#269;|&#x10d;|&ccaron;)' + _SP + r's' + _SP + r'Clubcard',
+                             re.IGNORECASE)
+UNIT_PRICE_RE = re.compile(r'([\d,.\s]+)[\s\xa0]*Kč[\s\xa0]*/[\s\xa0]*(\w+)')
+TAG_RE = re.compile(r'<[^>]*>')
+
+def element_text_by_class(content, class_name):
+    """
+    Text of the first element with the class, as get_text(strip=True) would return it,
+    read from the HTML text. Returns (found, text), or None if the markup is too
+    complex to read without a DOM (nested same-name tags, comments, scripts).
+    """
+    m = re.search(r'<([a-zA-Z][\w-]*)\b[^>]*\bclass\s*=\s*(["\'])[^"\']*?(?<![\w-])' + re.escape(class_name) +
+                  r'(?![\w-])[^>]*>', content)
+    if not m:
+        return False, None
+    tag = m.group(1)
+    end = re.search(r'</' + re.escape(tag) + r'\s*>', content[m.end():], re.IGNORECASE)
+    if not end:
+        return None
+    inner = content[m.end():m.end() + end.start()]
+    if re.search(r'<' + re.escape(tag) + r'\b', inner, re.IGNORECASE) or '<!--' in inner or '<script' in inner.lower():
+        return None
+    parts = (html.unescape(part).strip() for part in TAG_RE.split(inner))
+    return True, "".join(part for part in parts if part)
+
+class LazyPage:
+    """
+    A page whose DOM is built on first use. stats counts the DOM builds and the
+    fallbacks per field ("<field>:json_ld", "<field>:dom").
+    """
+    def __init__(self, content, backend, stats):
+        self.content = content
+        self.backend = backend
+        self.stats = stats
+        self._soup = None
+        self._json_ld = None
+        self._json_ld_read = False
+        self._subtext = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            self.stats['dom'] += 1
+            self._soup = make_soup(self.content, self.backend)
+        return self._soup
+
+    @property
+    def json_ld(self):
+        if not self._json_ld_read:
+            self._json_ld = extract_json_ld(self.content)
+            self._json_ld_read = True
+        return self._json_ld
+
+    def price_subtext(self):
+        """
+        Text of the first .ddsweb-price__subtext element, or None if there is none.
+        """
+        if self._subtext is None:
+            result = element_text_by_class(self.content, 'ddsweb-price__subtext')
+            if result is None:
+                self.stats['unit:dom'] += 1
+                elem = self.soup.select_one('.ddsweb-price__subtext')
+                result = (elem is not None, elem.get_text(strip=True) if elem else None)
+            self._subtext = result
+        return self._subtext[1]
+
+    def fallback(self, field, source):
+        self.stats[f"{field}:{source}"] += 1
+
+def parse_product_file(filepath, backend=DEFAULT_BACKEND, stats=None):
+    """
+    Worker function to parse a single file (loose path or packed PackEntry) with the
+    given HTML backend (html_backend.py). Returns a list of parsed product dicts for that file.
+
+    Fields come from the crawler's preparsed metadata and the Apollo cache first; the
+    DOM is only built when one is still missing (counted in stats, a Counter).
+    """
+    stats = stats if stats is not None else Counter()
     try:
-        with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-            content = f.read()
+        content = read_page(filepath)
     except Exception:
         return []
+
+    meta_json = None
+    if content.startswith(META_PREFIX):
+        meta_json = extract_preparsed_data(content)
+        if meta_json and meta_json.get('listing'):
+            return parse_listing(meta_json)
     
     state = extract_apollo_state(content)
     if not state:
@@ -93,7 +250,8 @@ def parse_product_file(filepath):
 
     # Preparsed Data (Crawler Injected)
     preparsed = {}
-    meta_json = extract_preparsed_data(content)
+    if meta_json is None:
+        meta_json = extract_preparsed_data(content)
     if meta_json and 'preparsed' in meta_json:
         preparsed = meta_json['preparsed']
     
@@ -103,28 +261,31 @@ def parse_product_file(filepath):
     product_key = next((k for k in state if k.startswith("ProductType:")), None)
     p_data = state.get(product_key) if product_key else {}
     
-    soup = BeautifulSoup(content, 'html.parser')
-    json_ld = extract_json_ld(soup)
+    page = LazyPage(content, backend, stats)
     
     # 1. Name
     name = preparsed.get('name')
     if not name: name = p_data.get('title')
-    if not name and json_ld:
-        name = json_ld.get('name')
+    if not name and page.json_ld:
+        page.fallback('name', 'json_ld')
+        name = page.json_ld.get('name')
     if not name:
-        name_elem = soup.select_one('h1.ddsweb-heading, h1')
+        page.fallback('name', 'dom')
+        name_elem = page.soup.select_one('h1.ddsweb-heading, h1')
         name = name_elem.get_text(strip=True) if name_elem else "Unknown"
 
     # 2. Brand
     brand = preparsed.get('brand')
     if not brand: brand = p_data.get('brandName')
-    if not brand and json_ld:
+    if not brand and page.json_ld:
         # json_ld brand can be string or object
-        b_val = json_ld.get('brand')
+        b_val = page.json_ld.get('brand')
         if isinstance(b_val, dict):
             brand = b_val.get('name')
         elif isinstance(b_val, str):
             brand = b_val
+        if brand:
+            page.fallback('brand', 'json_ld')
     
     if not brand:
         brand_ref = p_data.get('brand')
@@ -134,36 +295,41 @@ def parse_product_file(filepath):
     
     if not brand:
         # Fallback to DOM
-        brand_header = soup.select_one('button[id*="brand-details-panel"]')
+        page.fallback('brand', 'dom')
+        brand_header = page.soup.select_one('button[id*="brand-details-panel"]')
         if brand_header:
             panel_id = brand_header.get('aria-controls')
             if panel_id:
-                panel = soup.find(id=panel_id)
+                panel = page.soup.find(id=panel_id)
                 if panel:
                     brand = panel.get_text(strip=True)[:100]
     
     # 3. Image
     image_url = preparsed.get('image_url')
     if not image_url: image_url = p_data.get('defaultImageUrl')
-    if not image_url and json_ld:
-        imgs = json_ld.get('image')
+    if not image_url and page.json_ld:
+        imgs = page.json_ld.get('image')
         if isinstance(imgs, list) and len(imgs) > 0:
             image_url = imgs[0]
         elif isinstance(imgs, str):
             image_url = imgs
+        if image_url:
+            page.fallback('image', 'json_ld')
             
     if not image_url:
         image_url = p_data.get('image')
     
     if not image_url:
-        img_elem = soup.select_one('img.product-image, .ddsweb-responsive-image__image')
+        page.fallback('image', 'dom')
+        img_elem = page.soup.select_one('img.product-image, .ddsweb-responsive-image__image')
         if img_elem:
             image_url = img_elem.get('src')
     
     # 4. Categories
     categories = preparsed.get('breadcrumbs', [])
     if not categories:
-        bc_links = soup.select('a.ddsweb-breadcrumb__list-item-link')
+        page.fallback('categories', 'dom')
+        bc_links = page.soup.select('a.ddsweb-breadcrumb__list-item-link')
         for link in bc_links:
             text = link.get_text(strip=True)
             if text and text not in ["Domů", "Potraviny", "Tesco Groceries"]:
@@ -216,9 +382,10 @@ def parse_product_file(filepath):
                     offer['condition'] = 'Clubcard'
             
             prices.append(offer)
-        elif json_ld:
+        elif page.json_ld:
             # Fallback to JSON-LD prices
-            offers = json_ld.get('offers')
+            page.fallback('price', 'json_ld')
+            offers = page.json_ld.get('offers')
             if isinstance(offers, dict):
                 try:
                     price_val = float(offers.get('price', 0))
@@ -234,7 +401,8 @@ def parse_product_file(filepath):
                 except: pass
         else:
             # Fallback for prices via DOM
-            price_elem = soup.select_one('.gyT8MW_priceText')
+            page.fallback('price', 'dom')
+            price_elem = page.soup.select_one('.gyT8MW_priceText')
             if price_elem:
                 try:
                     # Main Price (e.g. "1,34 Kč")
@@ -246,10 +414,9 @@ def parse_product_file(filepath):
                     
                     # Unit Price (e.g. "9,90 Kč/kg")
                     # Look for the subtext element
-                    unit_elem = soup.select_one('.ddsweb-price__subtext')
-                    if unit_elem:
-                        unit_txt = unit_elem.get_text(strip=True)
-                        m = re.search(r'([\d,.\s]+)[\s\xa0]*Kč[\s\xa0]*/[\s\xa0]*(\w+)', unit_txt)
+                    unit_txt = page.price_subtext()
+                    if unit_txt is not None:
+                        m = UNIT_PRICE_RE.search(unit_txt)
                         if m:
                             up_str = m.group(1).replace(',', '.').replace(' ', '').strip()
                             unit_price_val = float(up_str)
@@ -265,57 +432,58 @@ def parse_product_file(filepath):
                     })
                 except: pass
     
-    # Refine Unit from DOM (Always Run for standard prices with default unit)
+    # Refine Unit from the price subtext (Always Run for standard prices with default unit)
     for p in prices:
         if p.get('condition') is None and p.get('unit') == 'kus':
             try:
-                unit_elem = soup.select_one('.ddsweb-price__subtext')
-                if unit_elem:
-                    unit_txt = unit_elem.get_text(strip=True)
-                    m_up = re.search(r'([\d,.\s]+)[\s\xa0]*Kč[\s\xa0]*/[\s\xa0]*(\w+)', unit_txt)
+                unit_txt = page.price_subtext()
+                if unit_txt is not None:
+                    m_up = UNIT_PRICE_RE.search(unit_txt)
                     if m_up:
                             up_str = m_up.group(1).replace(',', '.').replace(' ', '').strip()
                             p['unit_price'] = float(up_str)
                             p['unit'] = m_up.group(2)
             except: pass
 
-    # Check for Clubcard Price via DOM (Text Search) - Always Run
-    try:
-        # Strategy: Find elements with text matching the pattern
-        clubcard_elems = soup.find_all(string=re.compile(r"s Clubcard", re.IGNORECASE))
-        for c_text in clubcard_elems:
-            # Pattern: "19,90 Kč s Clubcard"
-            m = re.search(r'(\d+[,.]\d{2})[\s\xa0]*Kč[\s\xa0]*s[\s\xa0]*Clubcard', c_text, re.IGNORECASE)
-            if m:
-                val_str = m.group(1).replace(',', '.').replace(' ', '').strip()
-                cc_price = float(val_str)
-                
-                cc_unit_price = cc_price
-                cc_unit = 'kus'
-                
-                # Try to find unit price in siblings
-                parent = c_text.parent
-                if parent:
-                    for sib in parent.next_siblings:
-                        if hasattr(sib, 'get_text'):
-                            sib_txt = sib.get_text(strip=True)
-                            m_up = re.search(r'([\d,.\s]+)\s*Kč\s*/\s*(\w+)', sib_txt)
-                            if m_up:
-                                cc_up_str = m_up.group(1).replace(',', '.').replace(' ', '').strip()
-                                cc_unit_price = float(cc_up_str)
-                                cc_unit = m_up.group(2)
-                                break
-                
-                prices.append({
-                    'store_name': 'Tesco',
-                    'price': cc_price,
-                    'unit_price': cc_unit_price,
-                    'unit': cc_unit,
-                    'package_size': None,
-                    'condition': 'Clubcard'
-                })
-                break 
-    except: pass
+    # Check for Clubcard Price via DOM (Text Search) - Always Run, on pages that can match
+    if CLUBCARD_RAW_RE.search(content):
+        page.fallback('clubcard', 'dom')
+        try:
+            # Strategy: Find elements with text matching the pattern
+            clubcard_elems = page.soup.find_all(string=re.compile(r"s Clubcard", re.IGNORECASE))
+            for c_text in clubcard_elems:
+                # Pattern: "19,90 Kč s Clubcard"
+                m = CLUBCARD_RE.search(c_text)
+                if m:
+                    val_str = m.group(1).replace(',', '.').replace(' ', '').strip()
+                    cc_price = float(val_str)
+                    
+                    cc_unit_price = cc_price
+                    cc_unit = 'kus'
+                    
+                    # Try to find unit price in siblings
+                    parent = c_text.parent
+                    if parent:
+                        for sib in parent.next_siblings:
+                            if hasattr(sib, 'get_text'):
+                                sib_txt = sib.get_text(strip=True)
+                                m_up = re.search(r'([\d,.\s]+)\s*Kč\s*/\s*(\w+)', sib_txt)
+                                if m_up:
+                                    cc_up_str = m_up.group(1).replace(',', '.').replace(' ', '').strip()
+                                    cc_unit_price = float(cc_up_str)
+                                    cc_unit = m_up.group(2)
+                                    break
+                    
+                    prices.append({
+                        'store_name': 'Tesco',
+                        'price': cc_price,
+                        'unit_price': cc_unit_price,
+                        'unit': cc_unit,
+                        'package_size': None,
+                        'condition': 'Clubcard'
+                    })
+                    break 
+        except: pass
 
     return [{
         'name': name,
@@ -326,14 +494,23 @@ def parse_product_file(filepath):
         'prices': prices,
     }]
 
+def parse_product_file_stats(filepath, backend=DEFAULT_BACKEND):
+    """
+    parse_product_file plus its DOM fallback counts, for the process pool.
+    """
+    stats = Counter()
+    return parse_product_file(filepath, backend, stats), dict(stats)
+
 
 class TescoParser:
-    def __init__(self, data_dir="data/tesco_raw", console=None):
+    def __init__(self, data_dir="data/tesco_raw", console=None, use_cache=True, html_backend=DEFAULT_BACKEND):
         self.data_dir = data_dir
         self.console = console
+        self.use_cache = use_cache
+        self.html_backend = html_backend
 
     def run(self, workers=None):
-        files = glob.glob(os.path.join(self.data_dir, '*.html.gz'))
+        files = list_pages(self.data_dir)
         total_files = len(files)
         
         if self.console:
@@ -349,23 +526,45 @@ class TescoParser:
         if self.console and self.console.total == 0:
              self.console.total = total_files
 
-        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
-            # Submit all files
-            future_to_file = {executor.submit(parse_product_file, f): f for f in files}
+        def merge(items):
+            for item in items:
+                name = item['name']
+                if name not in product_map:
+                    product_map[name] = item
+
+        # Unchanged files come from the parse cache, only the rest are parsed
+        cache = ParseCache(self.data_dir, f"{PARSER_VERSION}:{self.html_backend}") if self.use_cache else None
+        done = 0
+        if cache:
+            cached, files = cache.split(files)
+            for items in cached:
+                merge(items)
+            done = len(cached)
+            log_func(f"Reusing {done} unchanged files from the parse cache, parsing {len(files)}")
+
+        # How often each field needed JSON-LD or the DOM, and how many files built a DOM
+        fallbacks = Counter()
+
+        # Chunks of files, largest first, results streamed back as chunks finish
+        for i, (f, result) in enumerate(parallel_map(parse_product_file_stats, files, (self.html_backend,), workers)):
+            if result is not None:
+                items, file_fallbacks = result
+                merge(items)
+                fallbacks.update(file_fallbacks)
+                if cache:
+                    cache.put(f, items)
             
-            for i, future in enumerate(concurrent.futures.as_completed(future_to_file)):
-                try:
-                    items = future.result()
-                    for item in items:
-                        name = item['name']
-                        if name not in product_map:
-                            product_map[name] = item
-                except Exception as e:
-                    # log_func(f"Error parsing file: {e}")
-                    pass
-                
-                if self.console:
-                    self.console.update(i + 1, f"Parsed: {len(product_map)}")
+            if self.console:
+                self.console.update(done + i + 1, f"Parsed: {len(product_map)}")
+
+        if cache:
+            cache.close()
+            log_func(cache.stats())
+
+        dom_count = fallbacks.pop('dom', 0)
+        log_func(f"DOM built for {dom_count} of {len(files)} parsed files")
+        if fallbacks:
+            log_func("Fallbacks: " + ", ".join(f"{key} {count}" for key, count in fallbacks.most_common()))
 
         # Metadata Aggregation
         brands = Counter()
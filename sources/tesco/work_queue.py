@@ -0,0 +1,86 @@
+"""
+Tesco Work Queue: Fine-grained crawl units shared by all workers.
+
+Overview:
+The crawl starts with one unit per top-level category. The worker that opens a
+category reads its product count from the listing, and splits the category into page
+ranges of `pages_per_unit` pages. It keeps the first range and queues the rest. Idle
+workers take the next queued unit, so a large category is crawled by several windows
+at once instead of by the single worker that happened to draw it.
+"""
+import threading
+from collections import deque, namedtuple
+
+
+class WorkUnit(namedtuple("WorkUnit", ["category", "first_page", "last_page"])):
+    """
+    Pages first_page..last_page of a category listing. last_page None means the
+    category hasn't been split yet (crawl until there is no next page).
+    """
+    __slots__ = ()
+
+    @property
+    def label(self):
+        if self.last_page is None:
+            return self.category if self.first_page == 1 else f"{self.category} p{self.first_page}+"
+        return f"{self.category} p{self.first_page}-{self.last_page}"
+
+
+class WorkQueue:
+    def __init__(self, categories, pages_per_unit=5):
+        self.pages_per_unit = pages_per_unit
+        self.units = deque(WorkUnit(cat, 1, None) for cat in categories)
+        self.total = len(self.units)
+        self.done_count = 0
+        self.in_progress = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def get(self):
+        """
+        Returns the next unit, waiting while other workers may still split theirs.
+        Returns None when all units are done (or the queue was closed).
+        """
+        with self.cond:
+            while not self.units and self.in_progress and not self.closed:
+                self.cond.wait()
+            if not self.units or self.closed:
+                return None
+            self.in_progress += 1
+            return self.units.popleft()
+
+    def split(self, unit, total_pages):
+        """
+        Splits an unsplit unit into page ranges once the category's page count is known.
+        Queues all ranges but the first and returns the first (the caller's new unit).
+        """
+        if unit.last_page is not None or unit.first_page != 1 or total_pages <= self.pages_per_unit:
+            return unit
+        step = self.pages_per_unit
+        ranges = [WorkUnit(unit.category, first, min(first + step - 1, total_pages))
+                  for first in range(unit.first_page, total_pages + 1, step)]
+        # The last range stays open-ended, in case the category grew since counting
+        ranges[-1] = ranges[-1]._replace(last_page=None)
+        with self.cond:
+            self.units.extend(ranges[1:])
+            self.total += len(ranges) - 1
+            self.cond.notify_all()
+        return ranges[0]
+
+    def done(self, unit):
+        with self.cond:
+            self.in_progress -= 1
+            self.done_count += 1
+            self.cond.notify_all()
+
+    def close(self):
+        """
+        Stops handing out units (e.g. when the global product limit is reached).
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return f"Units: {self.done_count}/{self.total}"
@@ -0,0 +1,175 @@
+"""
+Waits: Event-driven waits for Selenium navigation (instead of fixed sleeps).
+
+Overview:
+Each wait runs one execute_async_script that resolves inside the page as soon as the
+condition holds, so a click that re-renders in 40 ms costs 40 ms rather than a fixed
+0.5 s sleep.
+
+Key Features:
+1. DOM Settled: a MutationObserver plus fetch/XHR in-flight counters (installed once
+   per document) resolve when no mutation happened for `quiet_ms` and no request is
+   pending. `require_change` additionally waits for the first mutation after the call.
+2. Element Present/Absent: resolves on the mutation that makes a selector match (or
+   stop matching), e.g. a menu opening or a modal closing.
+3. Timeouts: every wait gives up after `timeout` seconds (default DEFAULT_TIMEOUT,
+   set_default_timeout() / --wait-timeout) and returns False; callers carry on the
+   same way they did after a sleep.
+4. Timings: wait_stats records the duration of every wait per label; the crawlers
+   log the summary at exit to show which waits are slow or time out.
+"""
+import threading
+import time
+
+DEFAULT_TIMEOUT = 5.0
+
+# Installs the mutation/request tracker once per document, then polls until the DOM
+# has been quiet for quietMs with no fetch/XHR in flight
+SETTLED_SCRIPT = """
+var quietMs = arguments[0], requireChange = arguments[1], timeoutMs = arguments[2];
+var done = arguments[arguments.length - 1];
+var w = window.__slevyWait;
+if (!w) {
+    w = window.__slevyWait = {lastMutation: performance.now(), pending: 0};
+    new MutationObserver(function () { w.lastMutation = performance.now(); }).observe(document, {
+        childList: true, subtree: true, characterData: true,
+        attributes: true, attributeFilter: ['class', 'hidden', 'open', 'aria-expanded', 'aria-hidden']
+    });
+    var settle = function () { w.pending--; w.lastMutation = performance.now(); };
+    if (window.fetch) {
+        var origFetch = window.fetch;
+        window.fetch = function () {
+            w.pending++;
+            var p = origFetch.apply(this, arguments);
+            p.then(settle, settle);
+            return p;
+        };
+    }
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        w.pending++;
+        this.addEventListener('loadend', settle);
+        return origSend.apply(this, arguments);
+    };
+}
+var start = performance.now();
+(function check() {
+    var now = performance.now();
+    if (w.pending <= 0 && now - w.lastMutation >= quietMs && (!requireChange || w.lastMutation > start)) {
+        return done(true);
+    }
+    if (now - start >= timeoutMs) {
+        return done(false);
+    }
+    setTimeout(check, 25);
+})();
+"""
+
+# Resolves when the selector matches (present=true) or stops matching (present=false)
+ELEMENT_SCRIPT = """
+var selector = arguments[0], visible = arguments[1], present = arguments[2], timeoutMs = arguments[3];
+var done = arguments[arguments.length - 1];
+var finished = false, timer = null;
+function matches() {
+    var els = document.querySelectorAll(selector);
+    for (var i = 0; i < els.length; i++) {
+        if (!visible || els[i].getClientRects().length) return true;
+    }
+    return false;
+}
+var observer = new MutationObserver(check);
+function finish(ok) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    done(ok);
+}
+function check() {
+    if (matches() === present) finish(true);
+}
+observer.observe(document, {childList: true, subtree: true, attributes: true});
+timer = setTimeout(function () { finish(false); }, timeoutMs);
+check();
+"""
+
+
+def set_default_timeout(seconds):
+    global DEFAULT_TIMEOUT
+    DEFAULT_TIMEOUT = seconds
+
+
+class WaitStats:
+    """
+    Durations of all waits, grouped by label.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.labels = {}  # label -> [count, total seconds, max seconds, timeouts]
+
+    def record(self, label, elapsed, ok):
+        with self.lock:
+            entry = self.labels.setdefault(label, [0, 0.0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+            if not ok:
+                entry[3] += 1
+
+    def summary(self):
+        """
+        One line per label, the most total time first.
+        """
+        with self.lock:
+            items = sorted(self.labels.items(), key=lambda item: -item[1][1])
+            if not items:
+                return "Waits: none recorded"
+            lines = ["Waits (label: count, total, avg, max, timeouts):"]
+            for label, (count, total, longest, timeouts) in items:
+                lines.append(f"  {label}: {count}x, {total:.1f}s total, {total / count * 1000:.0f} ms avg, "
+                             f"{longest * 1000:.0f} ms max, {timeouts} timeouts")
+            return "\n".join(lines)
+
+wait_stats = WaitStats()
+
+
+def _run(driver, label, timeout, script, *args):
+    """
+    Runs a wait script (its last argument is the timeout in ms) and records its duration.
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    # The script timeout must outlast the in-page timeout
+    if getattr(driver, "wait_script_timeout", None) != timeout:
+        driver.set_script_timeout(timeout + 2)
+        driver.wait_script_timeout = timeout
+    start = time.perf_counter()
+    try:
+        ok = bool(driver.execute_async_script(script, *args, int(timeout * 1000)))
+    except Exception:
+        # Navigation while waiting, or a script timeout
+        ok = False
+    wait_stats.record(label, time.perf_counter() - start, ok)
+    return ok
+
+
+def wait_for_settled(driver, label, quiet_ms=150, timeout=None, require_change=False):
+    """
+    Waits until the DOM has not changed for quiet_ms and no fetch/XHR is in flight.
+    With require_change, the DOM must also change at least once after the call
+    (e.g. after a click that expands a menu).
+    """
+    return _run(driver, label, timeout, SETTLED_SCRIPT, quiet_ms, require_change)
+
+
+def wait_for_element(driver, selector, label, visible=True, timeout=None):
+    """
+    Waits until an element matching the CSS selector exists (and is rendered, if visible).
+    """
+    return _run(driver, label, timeout, ELEMENT_SCRIPT, selector, visible, True)
+
+
+def wait_for_absent(driver, selector, label, timeout=None):
+    """
+    Waits until no rendered element matches the CSS selector (e.g. a closed modal).
+    """
+    return _run(driver, label, timeout, ELEMENT_SCRIPT, selector, True, False)
@@ -0,0 +1,125 @@
+"""
+Wolt Network Capture: Records the venue API's JSON responses instead of product HTML.
+
+Overview:
+The venue front-end loads item, price and category data as JSON from the Wolt APIs
+while a category page is scrolled. In capture mode the worker only scrolls: the
+responses are picked from Chrome's performance log (Network.responseReceived /
+loadingFinished) and their bodies fetched with CDP Network.getResponseBody. All
+responses of a category are saved as one `category_<slug>.capture.json` file, which
+parser_capture.py turns into products. No product modal is opened.
+
+Requires Chrome (the performance log is enabled by drivers.create_driver).
+"""
+import base64
+import json
+import os
+import time
+import urllib.parse
+
+from drivers import drain_network_log
+from raw_codec import RawCodec
+from waits import wait_for_settled
+from .parser_capture import CAPTURE_SUFFIX, iter_items
+
+API_HOSTS = ("consumer-api.wolt.com", "restaurant-api.wolt.com")
+
+SCROLL_SCRIPT = """
+window.scrollTo(0, document.body.scrollHeight);
+return document.body.scrollHeight;
+"""
+
+
+def is_api_response(response):
+    host = urllib.parse.urlparse(response.get("url", "")).hostname or ""
+    return host in API_HOSTS and "json" in response.get("mimeType", "")
+
+
+class ResponseCollector:
+    """
+    Collects API response bodies from a driver's performance log, latest per URL.
+    Creating it discards the events logged so far (e.g. the previous category's).
+    """
+    def __init__(self, driver):
+        self.driver = driver
+        self.pending = {}  # requestId -> url
+        self.bodies = {}   # url -> parsed JSON
+        driver.execute_cdp_cmd("Network.enable", {})
+        drain_network_log(driver)
+
+    def poll(self):
+        """
+        Reads new log events; returns the number of response bodies collected.
+        """
+        collected = 0
+        for method, params in drain_network_log(self.driver):
+            if method == "Network.responseReceived" and is_api_response(params.get("response", {})):
+                self.pending[params["requestId"]] = params["response"]["url"]
+            elif method == "Network.loadingFinished" and params.get("requestId") in self.pending:
+                url = self.pending.pop(params["requestId"])
+                try:
+                    result = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                    body = result["body"]
+                    if result.get("base64Encoded"):
+                        body = base64.b64decode(body).decode("utf-8")
+                    self.bodies[url] = json.loads(body)
+                    collected += 1
+                except Exception:
+                    # Body evicted from the browser's buffer, or not JSON after all
+                    continue
+        return collected
+
+    def responses(self):
+        return [{"url": url, "body": body} for url, body in self.bodies.items()]
+
+    def item_count(self):
+        return len({item["id"] for body in self.bodies.values() for item in iter_items(body)})
+
+
+def scroll_and_capture(driver, collector, log_func=print, max_scrolls=50):
+    """
+    Scrolls the category page to the end, collecting API responses. Stops when the
+    page stops growing and no new responses arrive.
+    """
+    collector.poll()
+    last_height = 0
+    for scroll_count in range(max_scrolls):
+        height = driver.execute_script(SCROLL_SCRIPT)
+        wait_for_settled(driver, "wolt.capture_scroll")
+        new_responses = collector.poll()
+        log_func(f"Scroll {scroll_count + 1}: {len(collector.bodies)} API responses, {collector.item_count()} items")
+        if height == last_height and not new_responses:
+            break
+        last_height = height
+    else:
+        log_func(f"Reached maximum scroll limit ({max_scrolls})")
+
+
+def capture_key(cat_url):
+    slug = urllib.parse.urlparse(cat_url).path.rstrip('/').split('/')[-1]
+    return f"category_{slug}{CAPTURE_SUFFIX}"
+
+
+def save_capture(collector, cat_url, raw_data_dir, category_info=None, raw_store=None, codec=None):
+    """
+    Saves the collected responses of a category. Returns the file path (pack key when packed).
+    """
+    key = capture_key(cat_url)
+    data = json.dumps({
+        "origin_url": cat_url,
+        "category": category_info or [],
+        "captured_at": time.time(),
+        "responses": collector.responses()
+    }, ensure_ascii=False).encode('utf-8')
+
+    if raw_store is not None:
+        raw_store.put(key, data, cat_url)
+        return key
+
+    codec = codec or RawCodec(raw_data_dir)
+    filepath = os.path.join(raw_data_dir, key + codec.suffix)
+    temp_path = filepath + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(codec.compress(data))
+    os.replace(temp_path, filepath)
+    return filepath
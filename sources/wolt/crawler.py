@@ -1,14 +1,16 @@
 """
 Albert Wolt Crawler: Parallel Selenium-based crawler for Albert Vinohradská on Wolt.
 Navigates through categories and products, handling infinite scroll pagination.
+In capture mode, categories are only scrolled and the venue API responses saved
+instead of product pages (see capture.py).
 """
 import os
 import time
-import json
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
-from . import crawler_category
+from crawl_state import JournaledState
+from . import capture, crawler_category
 
 
 
@@ -34,84 +36,34 @@ VENUES = {
 }
 
 
-class CrawlerState:
+class CrawlerState(JournaledState):
+    """
+    Discovered categories, the category tree and the product index (itemid ->
+    last capture time, card price and modal content hash), journaled to
+    crawler_state.json(.journal) (see crawl_state.py).
+    """
     def __init__(self, filepath):
-        self.filepath = filepath
-        self.lock = threading.Lock()
-        self.data = self.load()
+        super().__init__(filepath, sets=("categories",), maps=("products",))
 
-    def load(self):
-        """
-        Loads the crawler state from the JSON file.
-        """
-        default = {
-            "categories": [],
-            "tree": {}
-        }
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r') as f:
-                    data = json.load(f)
-                    default["categories"] = data.get("categories", [])
-                    default["tree"] = data.get("tree", {})
-            except:
-                pass
-        return default
-
-    def save(self):
+    def product(self, item_id):
+        return self.data["products"].get(item_id)
+
+    def mark_product(self, item_id, price, content_hash, captured_at=None):
         """
-        Persists the current state to disk atomically.
+        Records a product capture (captured_at defaults to now).
         """
-        with self.lock:
-            # Reload from disk to merge changes
-            on_disk = {}
-            if os.path.exists(self.filepath):
-                try:
-                    with open(self.filepath, 'r') as f:
-                        on_disk = json.load(f)
-                except:
-                    pass
-            
-            # Merge categories
-            disk_cats = on_disk.get("categories", [])
-            merged_cats = list(set(self.data["categories"]) | set(disk_cats))
-            self.data["categories"] = merged_cats
-            
-            # Merge tree
-            disk_tree = on_disk.get("tree", {})
-            def merge_trees(d1, d2):
-                for k, v in d2.items():
-                    if k in d1 and isinstance(d1[k], dict) and isinstance(v, dict):
-                        merge_trees(d1[k], v)
-                    else:
-                        d1[k] = v
-            merge_trees(self.data["tree"], disk_tree)
-            
-            # Save
-            to_save = {
-                "categories": self.data["categories"],
-                "tree": self.data["tree"]
-            }
-            
-            temp_path = self.filepath + ".tmp"
-            with open(temp_path, 'w') as f:
-                json.dump(to_save, f, indent=2)
-            os.replace(temp_path, self.filepath)
+        self.set_item("products", item_id, {
+            "captured_at": captured_at if captured_at is not None else time.time(),
+            "price": price,
+            "hash": content_hash
+        })
 
     def mark_category(self, category_url, cat_names=None):
         """
         Marks a category as discovered and builds the category tree.
         """
-        with self.lock:
-            if category_url not in self.data["categories"]:
-                self.data["categories"].append(category_url)
-            
-            if cat_names:
-                curr = self.data["tree"]
-                for name in cat_names:
-                    if name not in curr:
-                        curr[name] = {}
-                    curr = curr[name]
+        self.add("categories", category_url)
+        self.add_path(cat_names)
 
 
 class GlobalCounter:
@@ -131,12 +83,19 @@ class GlobalCounter:
 
 
 class WoltWorker:
-    def __init__(self, state, start_url, raw_data_dir, driver_pool, global_counter, console=None):
+    def __init__(self, state, start_url, raw_data_dir, driver_pool, global_counter, console=None, raw_store=None, codec=None,
+                 capture=False, max_age=None, fragments=False, writer=None):
         self.start_url = start_url
         self.state = state
         self.console = console
         self.base_dir = raw_data_dir
+        self.raw_store = raw_store
+        self.codec = codec
         self.global_counter = global_counter
+        self.capture = capture
+        self.max_age = max_age
+        self.fragments = fragments
+        self.writer = writer
         self.driver_pool = driver_pool
         self.driver = driver_pool.acquire()
 
@@ -160,6 +119,9 @@ class WoltWorker:
             return True
 
         log_func(f"Worker starting category: {' > '.join(cat_names)}", notice=True)
+
+        if self.capture:
+            return self.capture_category(cat_names, cat_url, log_func)
         
         # Navigate to category
         if not crawler_category.navigate_to_category(self.driver, cat_url, log_func):
@@ -171,7 +133,13 @@ class WoltWorker:
             cat_names, 
             log_func, 
             self.global_counter, 
-            console=self.console
+            console=self.console,
+            raw_store=self.raw_store,
+            codec=self.codec,
+            state=self.state,
+            max_age=self.max_age,
+            fragments=self.fragments,
+            writer=self.writer
         )     
         log_func(f"Found {len(products)} total products")
             
@@ -180,6 +148,32 @@ class WoltWorker:
         log_func(f"Worker finished category")
         return True
 
+    def capture_category(self, cat_names, cat_url, log_func):
+        """
+        Capture mode: scrolls the category and saves the venue API responses it triggers.
+        """
+        collector = capture.ResponseCollector(self.driver)
+        if not crawler_category.navigate_to_category(self.driver, cat_url, log_func):
+            return False
+
+        capture.scroll_and_capture(self.driver, collector, log_func)
+        if not collector.bodies:
+            log_func("No API responses captured")
+            return False
+
+        path = capture.save_capture(collector, cat_url, self.base_dir, cat_names, self.raw_store, self.codec)
+        items = collector.item_count()
+        log_func(f"Captured {items} items from {len(collector.bodies)} responses: {path}")
+        if self.console:
+            self.console.increment(items)
+        for _ in range(items):
+            if not self.global_counter.increment():
+                break
+
+        self.state.save()
+        log_func(f"Worker finished category")
+        return True
+
     def quit(self):
         """
         Releases the browser driver instance back to the pool.
@@ -187,7 +181,8 @@ class WoltWorker:
         self.driver_pool.release(self.driver)
 
 
-def run_worker(cat_info, state, start_url, raw_data_dir, console, driver_pool, global_counter, index, limit):
+def run_worker(cat_info, state, start_url, raw_data_dir, console, driver_pool, global_counter, index, limit, raw_store=None, codec=None,
+               capture=False, max_age=None, fragments=False, writer=None):
     """
     Worker entry point for crawling a single category with restart on failure.
     """
@@ -207,7 +202,9 @@ def run_worker(cat_info, state, start_url, raw_data_dir, console, driver_pool, g
         if global_counter.is_reached():
              break
 
-        worker = WoltWorker(state, start_url, raw_data_dir, driver_pool, global_counter, console=console)
+        worker = WoltWorker(state, start_url, raw_data_dir, driver_pool, global_counter, console=console,
+                            raw_store=raw_store, codec=codec, capture=capture, max_age=max_age,
+                            fragments=fragments, writer=writer)
         try:
             success = worker.crawl_category(cat_names, cat_url, log_func, limit=limit)
             if success:
@@ -227,7 +224,9 @@ def run_worker(cat_info, state, start_url, raw_data_dir, console, driver_pool, g
 
 
 class WoltCrawler:
-    def __init__(self, start_url, raw_data_dir, driver_factory, workers=2, limit=0, console=None):
+    def __init__(self, start_url, raw_data_dir, driver_factory, workers=2, limit=0, console=None, raw_store="files",
+                 compression="gzip", driver_max_pages=0, driver_max_rss_mb=0, capture=False,
+                 max_age=None, fragments=False, writer_threads=2):
         self.start_url = start_url
         self.raw_data_dir = raw_data_dir
         self.workers = workers
@@ -235,9 +234,16 @@ class WoltCrawler:
         self.limit = limit
         self.console = console  # Console passed from main
         self.global_counter = GlobalCounter(limit)
+        self.capture = capture
+        # Seconds after which an indexed product is captured again (None = never)
+        self.max_age = max_age
+        self.fragments = fragments
         
         from drivers import DriverPool
-        self.pool = DriverPool(driver_factory)
+        from raw_store import PackStore, open_codec
+        from page_writer import PageWriter
+        self.pool = DriverPool(driver_factory, max_size=workers, max_pages=driver_max_pages,
+                               max_rss_mb=driver_max_rss_mb)
         
         # Ensure output dir exists
         os.makedirs(self.raw_data_dir, exist_ok=True)
@@ -245,6 +251,14 @@ class WoltCrawler:
         state_path = os.path.join(self.raw_data_dir, "crawler_state.json")
         self.state = CrawlerState(state_path)
 
+        # "files" = one .html.gz per product, "pack" = segment packs (raw_store.py)
+        # compression: "gzip" or "zstd" with a dictionary trained on this store's pages
+        self.codec = open_codec(self.raw_data_dir, compression)
+        self.raw_store = PackStore(self.raw_data_dir, codec=self.codec) if raw_store == "pack" else None
+        # Compresses and writes product pages in the background (0 threads = inline)
+        self.writer = PageWriter(self.raw_data_dir, self.raw_store, self.codec, threads=writer_threads,
+                                 log_func=console.log if console else print)
+
     def run(self):
         """
         Discovers categories, scans for total count, and spawns worker threads.
@@ -253,6 +267,10 @@ class WoltCrawler:
         log_func = self.console.log if self.console else print
         log_func(f"Discovering categories for {self.start_url}...")
         
+        # Start the workers' browsers while discovery runs in the first one
+        prewarm = threading.Thread(target=self.pool.prewarm, args=(self.workers - 1,), daemon=True)
+        prewarm.start()
+
         # We can use the pool for discovery too
         temp_driver = self.pool.acquire()
         try:
@@ -276,11 +294,18 @@ class WoltCrawler:
             with ThreadPoolExecutor(max_workers=self.workers) as executor:
                 # We map using the pool instead of factory now
                 executor.map(
-                    lambda x: run_worker(x[1], self.state, self.start_url, self.raw_data_dir, self.console, self.pool, self.global_counter, x[0], self.limit),
+                    lambda x: run_worker(x[1], self.state, self.start_url, self.raw_data_dir, self.console, self.pool, self.global_counter, x[0], self.limit, self.raw_store, self.codec, self.capture, self.max_age, self.fragments, self.writer),
                     enumerate(categories)
                 )
         finally:
+            log_func(self.pool.stats())
             self.pool.quit_all()
+            # Queued pages are written (and indexed) before the state is compacted
+            self.writer.close()
+            log_func(self.writer.stats())
+            self.state.close()
+            if self.raw_store is not None:
+                self.raw_store.close()
 
 
 
@@ -1,16 +1,20 @@
 """
 Category navigation and pagination for Albert Wolt crawler.
 """
-import time
-import gzip
+import hashlib
 import os
 import re
+import time
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from . import crawler_global
 from . import crawler_product
+from drivers import record_page
+from fragments import extract_fragments
+from waits import wait_for_absent, wait_for_settled
+from page_writer import PageWriter
 
 
 def get_filename_from_url(url):
@@ -35,9 +39,55 @@ def get_filename_from_url(url):
         return f"product_{url_hash}.html.gz"
 
 
-def save_html_to_file(html_content, url, raw_data_dir, category_info=None, log_func=print):
+def get_item_id(url):
+    match = re.search(r'itemid-([a-zA-Z0-9]+)', url)
+    return match.group(1) if match else url
+
+
+def product_saved_at(url, raw_data_dir, raw_store=None):
+    """
+    Time the product page was saved (.html.gz, .html.zst or in the pack), or None.
+    """
+    key = get_filename_from_url(url)[:-len(".gz")]
+    if raw_store is not None:
+        entry = raw_store.entry(key)
+        if entry is not None:
+            return entry.stored_at
+    for suffix in (".gz", ".zst"):
+        path = os.path.join(raw_data_dir, key + suffix)
+        if os.path.exists(path):
+            return os.path.getmtime(path)
+    return None
+
+
+def is_product_saved(url, raw_data_dir, raw_store=None):
+    """
+    True if the product page was already saved (.html.gz, .html.zst or in the pack).
+    """
+    return product_saved_at(url, raw_data_dir, raw_store) is not None
+
+
+def is_fresh(entry, card_price, max_age):
+    """
+    True if an indexed product needs no new capture: captured within max_age seconds
+    (None = never stale) and its card price is unchanged.
+    """
+    if entry is None:
+        return False
+    if max_age is not None and time.time() - entry["captured_at"] > max_age:
+        return False
+    return card_price is None or entry.get("price") is None or entry["price"] == card_price
+
+
+# Everything parse_product_file reads: the product modal and the active category links
+FRAGMENT_SELECTORS = ('[data-test-id="product-modal"]', '[data-test-id="navigation-bar-active-link"]')
+
+
+def save_html_to_file(html_content, url, raw_data_dir, category_info=None, log_func=print, raw_store=None, codec=None,
+                      fragment=False, writer=None, on_done=None):
     """
-    Saves HTML content to a gzipped file in the raw_data_dir directory with metadata.
+    Saves HTML content to a compressed file in the raw_data_dir directory with metadata.
+    With a writer, the page is queued and written in the background.
     
     Args:
         html_content: HTML string to save
@@ -45,17 +95,21 @@ def save_html_to_file(html_content, url, raw_data_dir, category_info=None, log_f
         raw_data_dir: Directory to save the file in
         category_info: List of category breadcrumbs (e.g., ['OVOCE A ZELENINA', 'OVOCE'])
         log_func: Logging function
+        raw_store: Optional PackStore; the page is appended to it instead of a loose file
+        codec: RawCodec for loose files (default: gzip, .html.gz)
+        fragment: html_content holds only the page's fragments (see fragments.py)
+        writer: Shared PageWriter (default: write on this thread)
+        on_done: Called with the path once the page is written
     
     Returns:
-        str: Path to saved file, or None if failed
+        str: Path to saved file (pack key when packed), or None if failed
     """
     try:
         # Create directory if it doesn't exist
         os.makedirs(raw_data_dir, exist_ok=True)
         
         # Get filename from URL
-        filename = get_filename_from_url(url)
-        filepath = os.path.join(raw_data_dir, filename)
+        key = get_filename_from_url(url)[:-len(".gz")]
         
         # Prepare metadata
         import json
@@ -63,19 +117,16 @@ def save_html_to_file(html_content, url, raw_data_dir, category_info=None, log_f
             "origin_url": url,
             "category": category_info or []
         }
+        if fragment:
+            meta["fragment"] = True
         
         # Create JSON comment header (similar to Tesco crawler)
         comment = f"<!-- META_JSON: {json.dumps(meta, ensure_ascii=False)} -->\n"
-        
-        # Save as gzipped HTML with metadata header
-        temp_path = filepath + ".tmp"
-        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
-            f.write(comment)
-            f.write(html_content)
-        
-        os.replace(temp_path, filepath)
-        log_func(f"Saved HTML to: {filepath}")
-        return filepath
+
+        writer = writer or PageWriter(raw_data_dir, raw_store, codec, threads=0, log_func=log_func)
+        path = writer.submit(key, (comment + html_content).encode('utf-8'), url, on_done)
+        log_func(f"Saving HTML to: {path}")
+        return path
         
     except Exception as e:
         log_func(f"Error saving HTML: {e}")
@@ -100,7 +151,7 @@ def wait_for_category_page_ready(driver, log_func=print):
             log_func("Detected error page during category load")
             return False
         
-        time.sleep(0.5)
+        wait_for_settled(driver, "wolt.category_page")
         return True
     except:
         log_func("Timeout waiting for category content to load")
@@ -154,7 +205,7 @@ def discover_categories(driver, start_url, log_func=print):
     try:
         # Navigate to main page
         driver.get(start_url)
-        time.sleep(1)
+        wait_for_settled(driver, "wolt.start_page")
 
         crawler_global.close_all_overlays(driver, log_func)
         
@@ -182,10 +233,10 @@ def discover_categories(driver, start_url, log_func=print):
                 
                 # Scroll into view and click to expand
                 driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", root_link)
-                time.sleep(0.2)
                 
                 crawler_global.safe_click(driver, root_link)
-                time.sleep(0.5)  # Wait for subcategories to appear in DOM
+                # Wait for subcategories to appear in DOM
+                wait_for_settled(driver, "wolt.expand_root_category", require_change=True)
                 
                 # Find all leaf categories (without icons)
                 leaf_selector = 'a[data-test-id^="navigation-bar-"][href*="/items/"]:not(:has(img))'
@@ -238,96 +289,137 @@ def discover_categories(driver, start_url, log_func=print):
 
 
 
+# Returns the product cards rendered since the previous call (per document): href,
+# availability badge and card price text, plus the number of cards in the grid
+COLLECT_CARDS_SCRIPT = """
+if (arguments[0] || !window.__slevySeenCards) { window.__slevySeenCards = new Set(); }
+var seen = window.__slevySeenCards;
+var cards = document.querySelectorAll('a[data-test-id="CardLinkButton"]');
+var fresh = [];
+for (var i = 0; i < cards.length; i++) {
+    var link = cards[i];
+    var href = link.href;
+    if (!href || seen.has(href)) continue;
+    seen.add(href);
+    var card = link.parentElement || link;
+    var available = true;
+    var badges = card.querySelectorAll('[data-variant="primaryNeutral"]');
+    for (var j = 0; j < badges.length; j++) {
+        var text = badges[j].textContent;
+        if (text.indexOf('Není k dispozici') !== -1 || text.indexOf('Vyprodáno') !== -1) available = false;
+    }
+    var ownText = link.textContent;
+    if (ownText.indexOf('Není k dispozici') !== -1 || ownText.indexOf('Vyprodáno') !== -1) available = false;
+    var priceEl = card.querySelector('[data-test-id*="price" i], [data-testid*="price" i]');
+    var price = priceEl ? priceEl.textContent : null;
+    if (!price) {
+        var m = (card.innerText || '').match(/\\d[\\d\\s]*,\\d{2}\\s*Kč/);
+        price = m ? m[0] : null;
+    }
+    fresh.push({href: href, available: available, price: price ? price.trim() : null});
+}
+return {fresh: fresh, total: cards.length};
+"""
+
+SCROLL_TO_LAST_CARD_SCRIPT = """
+var cards = document.querySelectorAll('a[data-test-id="CardLinkButton"]');
+if (cards.length) cards[cards.length - 1].scrollIntoView({block: 'center'});
+"""
+
+
+def find_card_link(driver, href):
+    """
+    Returns the card link element of a product href (for clicking), or None.
+    """
+    try:
+        href_suffix = href.split('/')[-1]
+        link = driver.find_element(By.CSS_SELECTOR, f'a[data-test-id="CardLinkButton"][href$="{href_suffix}"]')
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", link)
+        return link
+    except Exception:
+        return None
+
+
 def iterate_category_products(driver, log_func, callback, max_scrolls=50):
     """
     Generic iteration logic for a category page.
-    Scrolls, finds new products, and invokes callback for each.
+    Scrolls, and invokes callback for each newly rendered product card. Cards are
+    collected in the page (one script call per scroll), so each scroll costs the
+    same regardless of how many cards are already loaded.
     
     Args:
         driver: Selenium WebDriver
         log_func: Logging function
-        callback: Function(driver, product_element, product_url) -> None
+        callback: Function(driver, card) -> None; card is {"href", "available", "price"}
         max_scrolls: Limit scrolls
     """
-    scroll_count = 0
-    processed_urls = set()
+    seen = set()
     
-    while scroll_count < max_scrolls:
-        # Get current product links
-        products = driver.find_elements(By.CSS_SELECTOR, 'a[data-test-id="CardLinkButton"]')
-        
-        current_batch_urls = []
-        for p in products:
-            try:
-                h = p.get_attribute('href')
-                if h:
-                    current_batch_urls.append(h)
-            except:
-                continue
+    for scroll_count in range(max_scrolls):
+        result = driver.execute_script(COLLECT_CARDS_SCRIPT, scroll_count == 0)
+        fresh = [card for card in result["fresh"] if card["href"] not in seen]
 
-        log_func(f"Scroll {scroll_count + 1}: Found {len(products)} product links visible")
+        log_func(f"Scroll {scroll_count + 1}: {len(fresh)} new of {result['total']} product links")
 
-        found_new = False
-        
-        # Process each product by URL
-        for href in current_batch_urls:
-            # Skip if already processed
-            if not href or href in processed_urls:
-                continue
-            
-            processed_urls.add(href)
-            found_new = True
+        # Check if new products loaded
+        if not fresh:
+            log_func(f"No new products after {scroll_count + 1} scrolls. Finished loading.")
+            break
 
-            # Re-acquire element
+        for card in fresh:
+            seen.add(card["href"])
             try:
-                href_suffix = href.split('/')[-1]
-                link = driver.find_element(By.CSS_SELECTOR, f'a[data-test-id="CardLinkButton"][href$="{href_suffix}"]')
-                # Focus
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", link)
-            except Exception:
-                log_func(f"Could not find element for {href}, skipping...")
-                continue
-            
-            # Invoke Callback
-            try:
-                callback(driver, link, href)
+                callback(driver, card)
             except Exception as e:
-                log_func(f"Error in callback for {href}: {e}")
+                log_func(f"Error in callback for {card['href']}: {e}")
                 continue
 
-        # Check if new products loaded
-        if not found_new:
-            log_func(f"No new products after {scroll_count + 1} scrolls. Finished loading.")
-            break
-        
-        scroll_count += 1
-    
-    if scroll_count >= max_scrolls:
+        # Bring the end of the grid into view to load the next batch
+        driver.execute_script(SCROLL_TO_LAST_CARD_SCRIPT)
+        wait_for_settled(driver, "wolt.infinite_scroll")
+    else:
         log_func(f"Reached maximum scroll limit ({max_scrolls})")
 
 
-def scroll_and_load_all_products(driver, raw_data_dir, category_info=None, log_func=print, global_counter=None, max_scrolls=50, console=None):
+def scroll_and_load_all_products(driver, raw_data_dir, category_info=None, log_func=print, global_counter=None, max_scrolls=50, console=None, raw_store=None, codec=None,
+                                 state=None, max_age=None, fragments=False, writer=None):
     """
-    Full crawl: visits each product, saves HTML.
+    Full crawl: visits each new, changed or stale product, saves HTML.
+    state is the crawler's CrawlerState (product index); max_age in seconds.
+    With fragments, only the product modal is saved instead of the full page.
+    Pages go to writer (PageWriter); the product index is updated once one is written.
     """
     product_data_list = []
     
-    def save_callback(d, element, href):
+    def save_callback(d, card):
+        href = card["href"]
+        item_id = get_item_id(href)
         # Check global limit
         if global_counter and global_counter.is_reached():
              return
 
-        # Skip if already saved (optimization)
-        filename = get_filename_from_url(href)
-        filepath = os.path.join(raw_data_dir, filename)
-        if os.path.exists(filepath):
-            log_func(f"Skipping (already saved): {href}")
+        entry = state.product(item_id) if state is not None else None
+        if entry is None:
+            # Saved before the index existed: index it with the page's save time
+            saved_at = product_saved_at(href, raw_data_dir, raw_store)
+            if saved_at is not None:
+                entry = {"captured_at": saved_at, "price": None, "hash": None}
+                if state is not None:
+                    state.mark_product(item_id, None, None, captured_at=saved_at)
+
+        if is_fresh(entry, card["price"], max_age):
+            log_func(f"Skipping (fresh): {href}")
             return
 
-        # Check availability
-        if not crawler_global.check_item_availability(element):
+        # Check availability (badge read by the in-page collector)
+        if not card["available"]:
             log_func(f"Skipping (not available): {href}")
             return
+
+        element = find_card_link(d, href)
+        if element is None:
+            log_func(f"Could not find element for {href}, skipping...")
+            return
         
         # Check limit increment
         if global_counter and not global_counter.increment():
@@ -343,10 +435,24 @@ def scroll_and_load_all_products(driver, raw_data_dir, category_info=None, log_f
                 return
 
             if crawler_product.wait_for_product_page_ready(d, log_func):
-                html_content = d.page_source
-                saved_path = save_html_to_file(html_content, href, raw_data_dir, category_info, log_func)
+                fragment_html = extract_fragments(d, FRAGMENT_SELECTORS)
+                html_content = fragment_html if fragments else d.page_source
+
+                def index_product(path, modal_html=fragment_html or html_content, price=card["price"]):
+                    # Runs on the writer thread
+                    if state is None:
+                        return
+                    content_hash = hashlib.sha1(modal_html.encode('utf-8')).hexdigest()
+                    if entry is not None and entry.get("hash") == content_hash:
+                        log_func(f"Unchanged since last capture: {href}")
+                    state.mark_product(item_id, price, content_hash)
+                    state.save()
+
+                saved_path = save_html_to_file(html_content, href, raw_data_dir, category_info, log_func, raw_store, codec,
+                                               fragment=fragments, writer=writer, on_done=index_product)
                 
                 if saved_path:
+                    record_page(d)
                     product_data_list.append({'product_url': href, 'saved_file': saved_path})
                     log_func(f"Saved product HTML: {href}")
                     if console:
@@ -365,7 +471,7 @@ def scroll_and_load_all_products(driver, raw_data_dir, category_info=None, log_f
                     )
                 except:
                     pass
-                time.sleep(0.3)
+                wait_for_settled(d, "wolt.modal_closed", quiet_ms=100)
             except:
                 pass
                 
@@ -374,7 +480,7 @@ def scroll_and_load_all_products(driver, raw_data_dir, category_info=None, log_f
             # Recovery
             try:
                 d.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
-                time.sleep(0.5)
+                wait_for_absent(d, '[role="dialog"]', "wolt.error_modal_closed")
             except:
                 pass
 
@@ -389,7 +495,7 @@ def click_product_link(driver, href):
         for link in links:
             if link.get_attribute('href') == href:
                 crawler_global.safe_click(driver, link)
-                time.sleep(0.5)
+                wait_for_settled(driver, "wolt.product_link_click")
                 return True
         return False
     except:
@@ -1,10 +1,10 @@
 """
 Global utilities for Albert Wolt crawler.
 """
-import time
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from waits import wait_for_absent, wait_for_element, wait_for_settled
 
 
 def check_error_page(driver):
@@ -23,8 +23,8 @@ def close_modal(driver, log_func=print):
     Tries multiple strategies to find and close the modal.
     """
     try:
-        # Wait a bit for modal to appear
-        time.sleep(1)
+        # Wait for the modal to appear
+        wait_for_element(driver, '[role="dialog"]', "wolt.modal_appear", timeout=1)
         
         # Strategy 1: Close button with aria-label
         try:
@@ -33,7 +33,7 @@ def close_modal(driver, log_func=print):
             )
             close_btn.click()
             log_func("Closed modal via aria-label")
-            time.sleep(0.5)
+            wait_for_absent(driver, '[role="dialog"]', "wolt.modal_close")
             return True
         except:
             pass
@@ -53,7 +53,7 @@ def close_modal(driver, log_func=print):
                     if btn.is_displayed():
                         btn.click()
                         log_func(f"Closed modal via selector: {selector}")
-                        time.sleep(0.5)
+                        wait_for_absent(driver, '[role="dialog"]', "wolt.modal_close")
                         return True
                 except:
                     continue
@@ -65,7 +65,7 @@ def close_modal(driver, log_func=print):
             from selenium.webdriver.common.keys import Keys
             driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
             log_func("Closed modal via ESC key")
-            time.sleep(0.5)
+            wait_for_absent(driver, '[role="dialog"]', "wolt.modal_close")
             return True
         except:
             pass
@@ -121,14 +121,14 @@ def handle_unavailable_dialog(driver, log_func=print):
                     ok_button = dialog.find_element(By.XPATH, ".//button[contains(., 'OK') or contains(., 'díky')]")
                     ok_button.click()
                     log_func("Closed unavailability dialog via button")
-                    time.sleep(0.5)
+                    wait_for_absent(driver, '[role="dialog"]', "wolt.unavailable_dialog_close")
                     return True
                 except:
                     # Fallback to ESC
                     from selenium.webdriver.common.keys import Keys
                     driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
                     log_func("Closed unavailability dialog via ESC")
-                    time.sleep(0.5)
+                    wait_for_absent(driver, '[role="dialog"]', "wolt.unavailable_dialog_close")
                     return True
         return False
     except Exception as e:
@@ -172,7 +172,7 @@ def close_all_overlays(driver, log_func=print):
             cookie_btn.click()
             log_func("Closed cookie consent via data-test-id='allow-button'")
             cookie_closed = True
-            time.sleep(0.5)
+            wait_for_absent(driver, 'button[data-test-id="allow-button"]', "wolt.cookie_close")
         except:
             pass
         
@@ -185,7 +185,7 @@ def close_all_overlays(driver, log_func=print):
                         btn.click()
                         log_func("Closed cookie consent via 'Povolit' button text")
                         cookie_closed = True
-                        time.sleep(0.5)
+                        wait_for_settled(driver, "wolt.cookie_close", quiet_ms=100)
                         break
             except:
                 pass
@@ -198,7 +198,7 @@ def close_all_overlays(driver, log_func=print):
                     decline_btn.click()
                     log_func("Closed cookie consent via data-test-id='decline-button'")
                     cookie_closed = True
-                    time.sleep(0.5)
+                    wait_for_absent(driver, 'button[data-test-id="decline-button"]', "wolt.cookie_close")
             except:
                 pass
         
@@ -217,7 +217,7 @@ def close_all_overlays(driver, log_func=print):
             close_btn.click()
             log_func("Closed location modal via aria-label='Zavřít'")
             location_closed = True
-            time.sleep(0.5)
+            wait_for_absent(driver, '[role="dialog"]', "wolt.location_modal_close")
         except:
             pass
         
@@ -237,7 +237,7 @@ def close_all_overlays(driver, log_func=print):
                             btn.click()
                             log_func(f"Closed location modal via selector: {selector}")
                             location_closed = True
-                            time.sleep(0.5)
+                            wait_for_absent(driver, '[role="dialog"]', "wolt.location_modal_close")
                             break
                     except:
                         continue
@@ -250,7 +250,7 @@ def close_all_overlays(driver, log_func=print):
                 driver.find_element(By.TAG_NAME, 'body').send_keys(Keys.ESCAPE)
                 log_func("Closed location modal via ESC key")
                 location_closed = True
-                time.sleep(0.5)
+                wait_for_absent(driver, '[role="dialog"]', "wolt.location_modal_close")
             except:
                 pass
         
@@ -276,7 +276,7 @@ def safe_click(driver, element, log_func=print):
     """
     try:
         driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
-        time.sleep(0.3)
+        wait_for_settled(driver, "wolt.click_scroll", quiet_ms=100)
         element.click()
         return True
     except Exception as e:
@@ -1,19 +1,38 @@
 #!/usr/bin/env python3
 """
-Albert Parser: Extracts product data from gzipped HTML files.
+Albert Parser: Extracts product data from gzipped HTML files and from captured
+venue API responses (*.capture.json, crawler capture mode).
 """
 from datetime import datetime
 from collections import Counter
 import os
-import glob
 import json
 
+from raw_store import list_pages, source_name
+from parse_cache import ParseCache
+from html_backend import DEFAULT_BACKEND
+from parallel_map import parallel_map
+
 try:
     from .parser_product import parse_product_file
+    from .parser_capture import CAPTURE_SUFFIX, CAPTURE_SUFFIXES, parse_capture_file
 except ImportError:
     from parser_product import parse_product_file
+    from parser_capture import CAPTURE_SUFFIX, CAPTURE_SUFFIXES, parse_capture_file
+
+# Bump whenever the output of parse_product_file or parse_capture_file changes
+# (invalidates the parse cache)
+PARSER_VERSION = 1
 
 
+def parse_file(source, store_name, backend=DEFAULT_BACKEND):
+    """
+    Parses a product page (with the given HTML backend) or a capture file.
+    """
+    if CAPTURE_SUFFIX in source_name(source):
+        return parse_capture_file(source, store_name)
+    return parse_product_file(source, store_name, backend)
+
 
 VENUES = {
     "albert": {
@@ -35,24 +54,26 @@ VENUES = {
 
 
 class WoltParser:
-    def __init__(self, data_dir, store_name, output_path, console=None):
+    def __init__(self, data_dir, store_name, output_path, console=None, use_cache=True, html_backend=DEFAULT_BACKEND):
         self.data_dir = data_dir
         self.store_name = store_name
         self.output_path = output_path
         self.console = console
+        self.use_cache = use_cache
+        self.html_backend = html_backend
         self.products = []
 
     # Methods moved to parser_product.py
 
 
     def run(self, workers=None, limit=None):
-        import concurrent.futures
         import multiprocessing
 
         if workers is None:
             workers = max(1, multiprocessing.cpu_count() // 2)
 
-        files = glob.glob(os.path.join(self.data_dir, '*.html.gz'))
+        all_files = list_pages(self.data_dir) + list_pages(self.data_dir, suffixes=CAPTURE_SUFFIXES)
+        files = all_files
         if limit:
             files = files[:limit]
             
@@ -62,29 +83,43 @@ class WoltParser:
         else:
              log_func = print
 
-        log_func(f"Found {len(glob.glob(os.path.join(self.data_dir, '*.html.gz')))} total files in {self.data_dir}, processing {total_files} (using {workers} workers)")
+        log_func(f"Found {len(all_files)} total files in {self.data_dir}, processing {total_files} (using {workers} workers)")
         
         product_map = {}
         
         if self.console and self.console.total == 0:
              self.console.total = total_files
 
-        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
-            # Submit all files for parsing
-            future_to_file = {executor.submit(parse_product_file, f, self.store_name): f for f in files}
-            
-            for i, future in enumerate(concurrent.futures.as_completed(future_to_file)):
-                try:
-                    items = future.result()
-                    for item in items:
-                        # Use URL as unique key if available
-                        key = item['product_url'] or item['name']
-                        if key not in product_map:
-                            product_map[key] = item
-                except Exception as e:
-                    pass
-                if self.console:
-                    self.console.update(i + 1, f"Parsed: {len(product_map)}")
+        def merge(items):
+            for item in items:
+                # Use URL as unique key if available
+                key = item['product_url'] or item['name']
+                if key not in product_map:
+                    product_map[key] = item
+
+        # Unchanged files come from the parse cache (store name is part of the output)
+        cache = ParseCache(self.data_dir, f"{PARSER_VERSION}:{self.store_name}:{self.html_backend}") if self.use_cache else None
+        done = 0
+        if cache:
+            cached, files = cache.split(files)
+            for items in cached:
+                merge(items)
+            done = len(cached)
+            log_func(f"Reusing {done} unchanged files from the parse cache, parsing {len(files)}")
+
+        # Chunks of files, largest first, results streamed back as chunks finish
+        for i, (f, items) in enumerate(parallel_map(parse_file, files, (self.store_name, self.html_backend), workers)):
+            if items is not None:
+                merge(items)
+                if cache:
+                    cache.put(f, items)
+            if self.console:
+                self.console.update(done + i + 1, f"Parsed: {len(product_map)}")
+
+        if cache:
+            # A limited run saw only part of the files; keep the others' entries
+            cache.close(prune=not limit)
+            log_func(cache.stats())
 
         # Metadata Aggregation
         brands = Counter()
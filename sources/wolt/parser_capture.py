@@ -0,0 +1,116 @@
+"""
+Wolt Capture Parser: Products from captured venue API responses (capture mode).
+
+A capture file holds the JSON responses the venue front-end received while a category
+was scrolled (see capture.py): {"origin_url", "category", "captured_at", "responses":
+[{"url", "body"}]}. Items are found anywhere in the bodies as objects with an id, a
+name and a price in minor units (haléře).
+"""
+import json
+import re
+
+from raw_store import read_page
+
+CAPTURE_SUFFIX = ".capture.json"
+CAPTURE_SUFFIXES = (CAPTURE_SUFFIX, CAPTURE_SUFFIX + ".gz", CAPTURE_SUFFIX + ".zst")
+
+
+def is_item(obj):
+    if not obj.get("id") or not obj.get("name"):
+        return False
+    price = obj.get("price", obj.get("baseprice"))
+    return isinstance(price, (int, float)) and not isinstance(price, bool)
+
+
+def iter_items(body):
+    """
+    Yields every item object in a response body (any nesting).
+    """
+    stack = [body]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            if is_item(value):
+                yield value
+                continue
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(reversed(value))
+
+
+def minor_to_price(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return round(value / 100, 2)
+    return None
+
+
+def venue_url(origin_url):
+    """
+    Venue URL of a category URL (".../venue/<slug>/items/<category>").
+    """
+    return re.sub(r'/items/.*$', '', origin_url or "")
+
+
+def parse_item(item, store_name, categories, base_url):
+    price = minor_to_price(item.get("price", item.get("baseprice")))
+    original_price = minor_to_price(item.get("original_price"))
+
+    unit_price = unit = None
+    up = item.get("unit_price")
+    if isinstance(up, dict):
+        unit_price = minor_to_price(up.get("price"))
+        unit = up.get("unit")
+    else:
+        unit_price = minor_to_price(up)
+
+    conditions_list = []
+    if original_price and original_price != price:
+        conditions_list.append("Sleva")
+    for tag in item.get("tags") or []:
+        tag_text = tag.get("name") if isinstance(tag, dict) else tag
+        if isinstance(tag_text, str) and tag_text and tag_text not in conditions_list:
+            conditions_list.append(tag_text)
+
+    image_url = None
+    images = item.get("images")
+    if isinstance(images, list) and images:
+        first = images[0]
+        image_url = first.get("url") if isinstance(first, dict) else first
+    if not image_url and isinstance(item.get("image"), str):
+        image_url = item["image"]
+
+    return {
+        'name': item["name"],
+        'brand': None,  # Enriched in post-processing
+        'product_url': f"{base_url}/itemid-{item['id']}" if base_url else None,
+        'image_url': image_url,
+        'categories': list(categories),
+        'prices': [{
+            'store_name': store_name,
+            'price': price,
+            'original_price': original_price if original_price != price else None,
+            'unit_price': unit_price,
+            'unit': unit,
+            'package_size': item.get("unit_info"),
+            'condition': ", ".join(conditions_list) if conditions_list else None
+        }],
+        'description': item.get("description") or None
+    }
+
+
+def parse_capture_file(source, store_name):
+    """
+    Returns the products of a capture file (loose path or PackEntry), one per item id.
+    """
+    try:
+        capture = json.loads(read_page(source))
+    except Exception:
+        return []
+
+    base_url = venue_url(capture.get("origin_url"))
+    categories = capture.get("category") or []
+    items = {}
+    for response in capture.get("responses", []):
+        for item in iter_items(response.get("body")):
+            items[item["id"]] = parse_item(item, store_name, categories, base_url)
+    return list(items.values())
@@ -1,7 +1,7 @@
-import gzip
 import json
 import re
-from bs4 import BeautifulSoup
+from raw_store import read_page
+from html_backend import DEFAULT_BACKEND, make_soup
 
 def parse_price(price_text):
     if not price_text or price_text == "N/A":
@@ -28,15 +28,15 @@ def extract_preparsed_data(content):
         pass
     return None
 
-def parse_product_file(filepath, store_name):
+def parse_product_file(filepath, store_name, backend=DEFAULT_BACKEND):
     try:
-        with gzip.open(filepath, 'rt', encoding='utf-8') as f:
-            content = f.read()
+        # Loose .html.gz path or packed PackEntry
+        content = read_page(filepath)
     except Exception as e:
         return []
 
     meta = extract_preparsed_data(content) or {}
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content, backend)
     modal = soup.select_one('[data-test-id="product-modal"]')
     if not modal: return []
 